@@ -3,6 +3,13 @@ import numpy as np
 import cv2
 import matplotlib.pyplot as plt
 
+from calibration import calibration_for_recording
+from frame_loader import iter_frames, list_frame_paths, load_roi_stacks
+from frame_timing import check_frame_timing, frame_times, load_frame_metadata
+from lsci_engine import calculate_roi_contrast_series, calculate_running_temporal_lsci
+from lsci_map_io import save_contrast_series, save_lsci_map
+from registration import load_registered_roi_stacks
+
 
 def detect_roi_coordinates(frame_path):
     """
@@ -48,11 +55,9 @@ def load_frames_from_folder(folder_path):
         list: List of 2D arrays representing the frames.
     """
     frames = []
-    for filename in sorted(os.listdir(folder_path)):
-        if filename.endswith(".png"):
-            frame_path = os.path.join(folder_path, filename)
-            frame = cv2.imread(frame_path, cv2.IMREAD_GRAYSCALE)
-            frames.append(frame)
+    for frame_path in list_frame_paths(folder_path):
+        frame = cv2.imread(frame_path, cv2.IMREAD_GRAYSCALE)
+        frames.append(frame)
     return frames
 
 
@@ -66,34 +71,12 @@ def calculate_temporal_lsci(sequence, window_size=0):
 
     Returns:
         np.ndarray: Average LSCI map across all frames.
-    """
-    num_frames = len(sequence)
-    height, width = sequence[0].shape
-
-    # Convert the sequence into a 3D array for convenience: shape = (num_frames, height, width)
-    stack = np.stack(sequence, axis=0)  # shape: (T, H, W)
-
-    # We’ll compute an LSCI map for each valid temporal window, then average or pick one time point.
-    half_window = window_size // 2
-
-    # Output container for each time index t where we can apply the window
-    lsci_results = []
-
-    for t in range(half_window, num_frames - half_window):
-        # Extract frames from t - half_window to t + half_window
-        local_stack = stack[t - half_window: t + half_window + 1, :, :]
 
-        # Compute standard deviation and mean across the temporal dimension
-        local_std = np.std(local_stack, axis=0)
-        local_mean = np.mean(local_stack, axis=0) + 1e-6  # small constant to avoid division by zero
-
-        K = local_std / local_mean
-        lsci_results.append(K)
-
-    # For demonstration, we can take the average of these LSCI maps across all valid t
-    lsci_map = np.mean(lsci_results, axis=0)
-
-    return lsci_map
+    Raises:
+        ValueError: If the sequence is shorter than the temporal window.
+    """
+    # Running sums of x and x^2 keep the cost independent of the window size
+    return calculate_running_temporal_lsci(sequence, window_size)
 
 
 def visualize_and_save_lsci_map(lsci_map, output_path, title="LSCI Visualization"):
@@ -117,22 +100,34 @@ def visualize_and_save_lsci_map(lsci_map, output_path, title="LSCI Visualization
 # Main script
 if __name__ == "__main__":
     # Folder containing PNG frames
-    folder_path = r"BASLER\Basler_16_53_05_Heat_Cold"  # Folder path to frames taken
+    folder_path = r"BASLER\Basler_16_53_05_Heat_Cold"  # Folder path to frames taken (or a .lsci recording container)
     reference_frame_path = r"ROI_refrences\BASLER_initial_roi.png"  # Path to the reference frame
 
     # Detect ROI coordinates from the reference frame
     rois = detect_roi_coordinates(reference_frame_path)
-    blue_roi = rois["blue"]
-    red_roi = rois["red"]
 
-    # Load all frames from the folder
-    image_sequence = load_frames_from_folder(folder_path)
+    # Check the frame timing for gaps and dropped frames before computing contrast
+    check_frame_timing(folder_path)
+
+    # Dark/flat correction stored by calibration.py for the camera and settings of the recording
+    calibrate = False
+    calibration = None
+    if calibrate:
+        # PNG folders carry no header: camera, exposure_time and gain have to be passed here
+        calibration = calibration_for_recording(folder_path, camera="BASLER", exposure_time=6500, gain=32)
+        print("Dark/flat calibration applied." if calibration is not None else "No calibration for this recording.")
+
+    # Load only the blue and red ROIs; a .lsci recording container is memory-mapped instead of decoded
+    register_motion = False  # Register every frame on the first one (phase correlation) before computing contrast
+    if register_motion:
+        roi_stacks, shifts = load_registered_roi_stacks(folder_path, rois, calibration=calibration)
+        print(f"Motion registration: max shift {np.abs(shifts).max():.1f} px")
+    else:
+        roi_stacks = load_roi_stacks(folder_path, rois, calibration=calibration)
 
     # Calculate temporal LSCI maps for blue and red ROIs
-    blue_sequence = [frame[blue_roi["y"]:blue_roi["y"] + blue_roi["h"], blue_roi["x"]:blue_roi["x"] + blue_roi["w"]]
-                     for frame in image_sequence]
-    red_sequence = [frame[red_roi["y"]:red_roi["y"] + red_roi["h"], red_roi["x"]:red_roi["x"] + red_roi["w"]]
-                    for frame in image_sequence]
+    blue_sequence = roi_stacks["blue"]
+    red_sequence = roi_stacks["red"]
 
     blue_lsci_map = calculate_temporal_lsci(blue_sequence, window_size=5)
     red_lsci_map = calculate_temporal_lsci(red_sequence, window_size=5)
@@ -144,4 +139,20 @@ if __name__ == "__main__":
     visualize_and_save_lsci_map(blue_lsci_map, blue_output, title="Blue ROI Temporal LSCI Map")
     visualize_and_save_lsci_map(red_lsci_map, red_output, title="Red ROI Temporal LSCI Map")
 
+    # Save the raw float32 K maps with their ROI and window for perfusion.py
+    for name, lsci_map, output in (("blue", blue_lsci_map, blue_output), ("red", red_lsci_map, red_output)):
+        save_lsci_map(lsci_map, os.path.splitext(output)[0], roi=rois[name], mode="temporal", window_size=5,
+                      source=folder_path)
+
     print(f"LSCI maps saved as {blue_output} and {red_output}.")
+
+    # Optionally, stream the recording once more and keep the per-ROI K time course (constant memory)
+    time_series = False
+    if time_series:
+        metadata, camera_tick_frequency = load_frame_metadata(folder_path)
+        # Seconds since the first frame (camera, else host timestamps), or frame indices without complete metadata
+        timestamps = None if metadata is None else frame_times(metadata, camera_tick_frequency)[0]
+        series = calculate_roi_contrast_series(iter_frames(folder_path, calibration), rois, window_size=5,
+                                               timestamps=timestamps)
+        series_output = save_contrast_series("LSCI_outputs/initial_nofilter_basler", series)
+        print(f"ROI contrast time series saved as {series_output}.")
@@ -1,8 +1,13 @@
 import os
-import numpy as np
 import cv2
 import matplotlib.pyplot as plt
 
+from frame_loader import list_frame_paths, load_roi_stacks
+from frame_timing import check_frame_timing
+from lsci_cache import LSCICache, calculate_lsci_sweep_cached, load_roi_stacks_cached
+from lsci_engine import calculate_running_temporal_lsci, calculate_roi_stacks_lsci_sweep
+from lsci_map_io import save_lsci_map
+
 
 def detect_roi_coordinates(frame_path):
     """
@@ -48,11 +53,9 @@ def load_frames_from_folder(folder_path):
         list: List of 2D arrays representing the frames.
     """
     frames = []
-    for filename in sorted(os.listdir(folder_path)):
-        if filename.endswith(".png"):
-            frame_path = os.path.join(folder_path, filename)
-            frame = cv2.imread(frame_path, cv2.IMREAD_GRAYSCALE)
-            frames.append(frame)
+    for frame_path in list_frame_paths(folder_path):
+        frame = cv2.imread(frame_path, cv2.IMREAD_GRAYSCALE)
+        frames.append(frame)
     return frames
 
 
@@ -66,34 +69,12 @@ def calculate_temporal_lsci(sequence, window_size=5):
 
     Returns:
         np.ndarray: Average LSCI map across all frames.
-    """
-    num_frames = len(sequence)
-    height, width = sequence[0].shape
-
-    # Convert the sequence into a 3D array for convenience: shape = (num_frames, height, width)
-    stack = np.stack(sequence, axis=0)  # shape: (T, H, W)
-
-    # We’ll compute an LSCI map for each valid temporal window, then average or pick one time point.
-    half_window = window_size // 2
-
-    # Output container for each time index t where we can apply the window
-    lsci_results = []
-
-    for t in range(half_window, num_frames - half_window):
-        # Extract frames from t - half_window to t + half_window
-        local_stack = stack[t - half_window: t + half_window + 1, :, :]
-
-        # Compute standard deviation and mean across the temporal dimension
-        local_std = np.std(local_stack, axis=0)
-        local_mean = np.mean(local_stack, axis=0) + 1e-6  # small constant to avoid division by zero
 
-        K = local_std / local_mean
-        lsci_results.append(K)
-
-    # For demonstration, we can take the average of these LSCI maps across all valid t
-    lsci_map = np.mean(lsci_results, axis=0)
-
-    return lsci_map
+    Raises:
+        ValueError: If the sequence is shorter than the temporal window.
+    """
+    # Running sums of x and x^2 keep the cost independent of the window size
+    return calculate_running_temporal_lsci(sequence, window_size)
 
 
 def visualize_and_save_lsci_map(lsci_map, output_path, title="LSCI Visualization"):
@@ -137,22 +118,23 @@ def plot_comparison(baseline_image, filtered_images, window_sizes, output_path):
 # Main script
 if __name__ == "__main__":
     # Folder containing PNG frames
-    folder_path = r"IDS\recorded_frames_COLD_left_HOT_right_final"  # Folder path to frames taken
+    folder_path = r"IDS\recorded_frames_COLD_left_HOT_right_final"  # Folder path to frames taken (or a .lsci recording container)
     reference_frame_path = r"ROI_refrences\IDS_final_roi.png"  # Path to the reference frame
 
-    # Detect ROI coordinates from the reference frame
-    rois = detect_roi_coordinates(reference_frame_path)
-    blue_roi = rois["blue"]
-    red_roi = rois["red"]
+    # Reuse decoded ROI stacks and K maps of earlier runs with the same frames, ROIs and parameters
+    use_cache = True
 
-    # Load all frames from the folder
-    image_sequence = load_frames_from_folder(folder_path)
+    # Check the frame timing for gaps and dropped frames before computing contrast
+    check_frame_timing(folder_path)
 
-    # Calculate temporal LSCI maps for blue and red ROIs
-    blue_sequence = [frame[blue_roi["y"]:blue_roi["y"] + blue_roi["h"], blue_roi["x"]:blue_roi["x"] + blue_roi["w"]]
-                     for frame in image_sequence]
-    red_sequence = [frame[red_roi["y"]:red_roi["y"] + red_roi["h"], red_roi["x"]:red_roi["x"] + red_roi["w"]]
-                    for frame in image_sequence]
+    # Detect ROI coordinates from the reference frame and load only the blue and red ROIs;
+    # a .lsci recording container is memory-mapped instead of decoded
+    if use_cache:
+        cache = LSCICache()
+        rois, roi_stacks = load_roi_stacks_cached(cache, folder_path, reference_frame_path)
+    else:
+        rois = detect_roi_coordinates(reference_frame_path)
+        roi_stacks = load_roi_stacks(folder_path, rois)
 
     # Define a range of window sizes for temporal filtering
     window_sizes = [3, 5, 7, 9]
@@ -161,18 +143,15 @@ if __name__ == "__main__":
     output_dir = r"Temporal Filtering\LSCI_outputs_temporal_filtering_initial_IDS"
     os.makedirs(output_dir, exist_ok=True)
 
-    blue_filtered_images = []
-    red_filtered_images = []
-
-    for window_size in window_sizes:
-        # Calculate LSCI maps for each window size
-        blue_lsci_map = calculate_temporal_lsci(blue_sequence, window_size=window_size)
-        red_lsci_map = calculate_temporal_lsci(red_sequence, window_size=window_size)
-
-        # Collect filtered images for plotting
-        blue_filtered_images.append(blue_lsci_map)
-        red_filtered_images.append(red_lsci_map)
+    # Calculate LSCI maps for both ROIs and every window size in a single pass over the frames
+    if use_cache:
+        lsci_maps = calculate_lsci_sweep_cached(cache, folder_path, reference_frame_path, roi_stacks, window_sizes)
+    else:
+        lsci_maps = calculate_roi_stacks_lsci_sweep(roi_stacks, window_sizes)
+    blue_filtered_images = [lsci_maps["blue"][window_size] for window_size in window_sizes]
+    red_filtered_images = [lsci_maps["red"][window_size] for window_size in window_sizes]
 
+    for window_size, blue_lsci_map, red_lsci_map in zip(window_sizes, blue_filtered_images, red_filtered_images):
         # Define output paths
         blue_output = os.path.join(output_dir, f"blue_output_window_{window_size}.png")
         red_output = os.path.join(output_dir, f"red_output_window_{window_size}.png")
@@ -181,16 +160,26 @@ if __name__ == "__main__":
         visualize_and_save_lsci_map(blue_lsci_map, blue_output, title=f"Blue ROI Temporal LSCI Map (Window Size {window_size})")
         visualize_and_save_lsci_map(red_lsci_map, red_output, title=f"Red ROI Temporal LSCI Map (Window Size {window_size})")
 
+        # Save the raw float32 K maps with their ROI and window for perfusion.py
+        save_lsci_map(blue_lsci_map, os.path.splitext(blue_output)[0], roi=rois["blue"], mode="temporal",
+                      window_size=window_size, source=folder_path)
+        save_lsci_map(red_lsci_map, os.path.splitext(red_output)[0], roi=rois["red"], mode="temporal",
+                      window_size=window_size, source=folder_path)
+
+    # The first frame of each ROI serves as the unfiltered baseline
+    blue_baseline = roi_stacks["blue"][0]
+    red_baseline = roi_stacks["red"][0]
+
     # Optionally, visualize the baseline sequence for comparison
     baseline_blue_output = os.path.join(output_dir, "blue_output_baseline.png")
     baseline_red_output = os.path.join(output_dir, "red_output_baseline.png")
-    visualize_and_save_lsci_map(blue_sequence[0], baseline_blue_output, title="Blue ROI Baseline Sequence")
-    visualize_and_save_lsci_map(red_sequence[0], baseline_red_output, title="Red ROI Baseline Sequence")
+    visualize_and_save_lsci_map(blue_baseline, baseline_blue_output, title="Blue ROI Baseline Sequence")
+    visualize_and_save_lsci_map(red_baseline, baseline_red_output, title="Red ROI Baseline Sequence")
 
     # Plot comparison for blue ROI
     comparison_output_path_blue = os.path.join(output_dir, "blue_comparison.png")
-    plot_comparison(blue_sequence[0], blue_filtered_images, window_sizes, comparison_output_path_blue)
+    plot_comparison(blue_baseline, blue_filtered_images, window_sizes, comparison_output_path_blue)
 
     # Plot comparison for red ROI
     comparison_output_path_red = os.path.join(output_dir, "red_comparison.png")
-    plot_comparison(red_sequence[0], red_filtered_images, window_sizes, comparison_output_path_red)
+    plot_comparison(red_baseline, red_filtered_images, window_sizes, comparison_output_path_red)
@@ -0,0 +1,177 @@
+import os
+import csv
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from frame_loader import load_roi_stacks
+from lsci_cache import LSCICache, calculate_lsci_sweep_cached, load_roi_stacks_cached
+from lsci_engine import calculate_flow_index, calculate_roi_stacks_lsci_sweep
+from lsci_map_io import save_lsci_map
+from LSCI_convertion import detect_roi_coordinates
+from perfusion import calculate_perfusion_batch
+
+DEFAULT_WINDOW_SIZES = (5,)
+RESULT_COLUMNS = ["recording", "camera", "roi", "window_size", "mean", "total", "std", "flow_index_mean",
+                  "flow_index_std"]
+
+
+def load_manifest(manifest_path):
+    """
+    Load a batch manifest.
+
+    The manifest is a JSON list with one entry per recording:
+    {"folder": ..., "reference": ..., "camera": ..., "window_sizes": [...], "name": ...}.
+    "window_sizes" defaults to DEFAULT_WINDOW_SIZES and "name" to "<camera>_<folder name>".
+
+    Parameters:
+        manifest_path (str): Path to the JSON manifest.
+
+    Returns:
+        list: Manifest entries with defaults filled in.
+
+    Raises:
+        ValueError: If an entry misses "folder" or "reference", or two entries share a name.
+    """
+    with open(manifest_path) as json_file:
+        entries = json.load(json_file)
+
+    manifest = []
+    for index, entry in enumerate(entries):
+        missing = [key for key in ("folder", "reference") if key not in entry]
+        if missing:
+            raise ValueError(f"Manifest entry {index} misses {', '.join(missing)}.")
+        camera = entry.get("camera", "")
+        folder_name = os.path.basename(os.path.normpath(entry["folder"]))
+        name = entry.get("name") or "_".join(filter(None, [camera, folder_name]))
+        manifest.append({
+            "name": name,
+            "folder": entry["folder"],
+            "reference": entry["reference"],
+            "camera": camera,
+            "window_sizes": list(entry.get("window_sizes", DEFAULT_WINDOW_SIZES)),
+        })
+
+    names = [entry["name"] for entry in manifest]
+    if len(set(names)) != len(names):
+        raise ValueError("Manifest entries need unique names.")
+    return manifest
+
+
+def process_recording(entry, output_dir, use_cache=True):
+    """
+    Compute the temporal LSCI maps and perfusion metrics of one manifest entry.
+
+    Runs in a worker process; only this recording's ROI stacks are held in memory.
+
+    Parameters:
+        entry (dict): Manifest entry from load_manifest.
+        output_dir (str): Folder the raw K maps are saved to (in the "maps" subfolder).
+        use_cache (bool): Reuse cached ROI stacks and K maps (see lsci_cache.py).
+
+    Returns:
+        list: One result row (dict with RESULT_COLUMNS and "map") per ROI and window size.
+    """
+    folder_path, reference_frame_path = entry["folder"], entry["reference"]
+    if use_cache:
+        cache = LSCICache()
+        rois, roi_stacks = load_roi_stacks_cached(cache, folder_path, reference_frame_path)
+        lsci_maps = calculate_lsci_sweep_cached(cache, folder_path, reference_frame_path, roi_stacks,
+                                                entry["window_sizes"])
+    else:
+        rois = detect_roi_coordinates(reference_frame_path)
+        roi_stacks = load_roi_stacks(folder_path, rois)
+        lsci_maps = calculate_roi_stacks_lsci_sweep(roi_stacks, entry["window_sizes"])
+
+    keys = [(name, window_size) for name, maps in lsci_maps.items() for window_size in maps]
+    maps = [lsci_maps[name][window_size] for name, window_size in keys]
+    metrics = calculate_perfusion_batch(maps)
+    flow_metrics = calculate_perfusion_batch([calculate_flow_index(lsci_map) for lsci_map in maps])
+
+    rows = []
+    maps_dir = os.path.join(output_dir, "maps")
+    os.makedirs(maps_dir, exist_ok=True)
+    for (name, window_size), lsci_map, row, flow_row in zip(keys, maps, metrics, flow_metrics):
+        map_path = save_lsci_map(lsci_map, os.path.join(maps_dir, f"{entry['name']}_{name}_window_{window_size}"),
+                                 roi=rois[name], mode="temporal", window_size=window_size, source=folder_path,
+                                 camera=entry["camera"])
+        rows.append({
+            "recording": entry["name"],
+            "camera": entry["camera"],
+            "roi": name,
+            "window_size": window_size,
+            "mean": float(row["mean"]),
+            "total": float(row["total"]),
+            "std": float(row["std"]),
+            "flow_index_mean": float(flow_row["mean"]),
+            "flow_index_std": float(flow_row["std"]),
+            "map": os.path.basename(map_path),
+        })
+    return rows
+
+
+def run_batch(manifest, output_dir, max_concurrent_recordings=2, use_cache=True):
+    """
+    Process all recordings of a manifest in a process pool.
+
+    Every worker holds the ROI stacks of one recording, so max_concurrent_recordings caps
+    the peak memory as well as the parallelism. Writes results.csv (one row per recording,
+    ROI and window size) and perfusion_metrics.json (metrics by map file) to output_dir.
+
+    Parameters:
+        manifest (list): Entries from load_manifest.
+        output_dir (str): Output folder.
+        max_concurrent_recordings (int): Number of worker processes.
+        use_cache (bool): Reuse cached ROI stacks and K maps.
+
+    Returns:
+        tuple: (rows, failures) with the result rows in manifest order and {name: error message}.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    results, failures = {}, {}
+    with ProcessPoolExecutor(max_workers=max_concurrent_recordings) as executor:
+        futures = {executor.submit(process_recording, entry, output_dir, use_cache): entry["name"]
+                   for entry in manifest}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+                print(f"Processed {name}.")
+            except Exception as e:
+                failures[name] = str(e)
+                print(f"Failed to process {name}: {e}")
+
+    rows = [row for entry in manifest for row in results.get(entry["name"], [])]
+
+    with open(os.path.join(output_dir, "results.csv"), "w", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=RESULT_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+    perfusion_metrics_dict = {
+        row["map"]: {key: row[key] for key in RESULT_COLUMNS}
+        for row in rows
+    }
+    with open(os.path.join(output_dir, "perfusion_metrics.json"), "w") as json_file:
+        json.dump(perfusion_metrics_dict, json_file, indent=4)
+
+    return rows, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process many recordings listed in a manifest.")
+    parser.add_argument("manifest", help="JSON list of {folder, reference, camera, window_sizes}")
+    parser.add_argument("--output", default="batch_outputs", help="Output folder")
+    parser.add_argument("--workers", type=int, default=2,
+                        help="Recordings processed at the same time (caps the memory use)")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the LSCI result cache")
+    args = parser.parse_args()
+
+    rows, failures = run_batch(load_manifest(args.manifest), args.output, args.workers, not args.no_cache)
+    print(f"{len(rows)} results written to {os.path.join(args.output, 'results.csv')}, "
+          f"{len(failures)} recordings failed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+import cv2
+
+from frame_loader import load_frame_stack_from_folder
+from LSCI_convertion import load_frames_from_folder
+
+
+def write_synthetic_frames(folder_path, num_frames, height, width, seed=0):
+    """
+    Write a synthetic speckle recording as PNG frames.
+
+    Parameters:
+        folder_path (str): Folder to write the frames into.
+        num_frames (int): Number of frames to write.
+        height (int): Frame height in pixels.
+        width (int): Frame width in pixels.
+        seed (int): Seed for the random number generator.
+    """
+    rng = np.random.default_rng(seed)
+    for i in range(num_frames):
+        # Exponentially distributed intensities give fully developed speckle
+        frame = np.clip(rng.exponential(80.0, size=(height, width)), 0, 255).astype(np.uint8)
+        cv2.imwrite(os.path.join(folder_path, f"frame_{i:04d}.png"), frame)
+
+
+def time_loader(load, repeats):
+    """
+    Time a loader and return the best wall-clock time over several repeats.
+
+    Parameters:
+        load (callable): Function loading the whole recording.
+        repeats (int): Number of repetitions.
+
+    Returns:
+        float: Best time in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        load()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare serial and parallel PNG frame loading.")
+    parser.add_argument("--frames", type=int, default=300, help="Number of synthetic frames")
+    parser.add_argument("--height", type=int, default=768, help="Frame height (Basler default)")
+    parser.add_argument("--width", type=int, default=1000, help="Frame width (Basler default)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, 8], help="Worker counts to test")
+    parser.add_argument("--repeats", type=int, default=3, help="Repetitions per loader")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder_path:
+        print(f"Writing {args.frames} synthetic {args.width}x{args.height} frames...")
+        write_synthetic_frames(folder_path, args.frames, args.height, args.width)
+
+        serial_time = time_loader(lambda: load_frames_from_folder(folder_path), args.repeats)
+        print(f"serial load_frames_from_folder: {serial_time:.3f} s ({args.frames / serial_time:.1f} frames/s)")
+
+        for num_workers in args.workers:
+            parallel_time = time_loader(
+                lambda: load_frame_stack_from_folder(folder_path, num_workers=num_workers), args.repeats
+            )
+            print(
+                f"parallel load_frame_stack_from_folder ({num_workers} workers): {parallel_time:.3f} s "
+                f"({args.frames / parallel_time:.1f} frames/s, {serial_time / parallel_time:.2f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+from datetime import datetime
+import numpy as np
+import cv2
+
+from benchmark_loading import write_synthetic_frames
+from flow_quantification import EXPOSURE_TIMES, correlation_time_map
+from frame_loader import load_frame_stack_from_folder, load_roi_stacks
+from lsci_engine import calculate_flow_index, calculate_roi_stacks_lsci_sweep, calculate_running_temporal_lsci
+from LSCI_convertion import detect_roi_coordinates
+from perfusion import calculate_perfusion, calculate_perfusion_batch
+from recording_container import RecordingWriter
+from synthetic_speckle import SpeckleGenerator
+
+# Production recording sizes: (frames, height, width, ROI reference of the camera)
+PROFILES = {
+    "basler": (3000, 768, 1000, os.path.join("ROI_refrences", "BASLER_initial_roi.png")),
+    "ids": (1500, 1000, 1000, os.path.join("ROI_refrences", "IDS_final_roi.png")),
+}
+
+
+def write_synthetic_recording(path, num_frames, height, width, pool_size=16, seed=0):
+    """
+    Write a synthetic speckle recording container without holding it in memory.
+
+    A pool of consecutive SpeckleGenerator frames is cycled, which keeps generation fast
+    while the contrast engines still see realistic speckle statistics.
+
+    Parameters:
+        path (str): Path of the recording container.
+        num_frames (int): Number of frames to write.
+        height (int): Frame height in pixels.
+        width (int): Frame width in pixels.
+        pool_size (int): Number of distinct frames.
+        seed (int): Seed for the random number generator.
+    """
+    pool = SpeckleGenerator(height, width, seed=seed).frames(pool_size)
+    with RecordingWriter(path, height, width) as writer:
+        for i in range(num_frames):
+            writer.write_frame(pool[i % pool_size])
+
+
+def measure(stage):
+    """
+    Run a benchmark stage and measure its wall-clock time and peak traced memory.
+
+    NumPy reports its array allocations to tracemalloc, so the peak covers the buffers
+    allocated by the stage (memory-mapped files are not counted).
+
+    Parameters:
+        stage (callable): Function running the stage.
+
+    Returns:
+        tuple: (result of the stage, seconds, peak memory in MB).
+    """
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        result = stage()
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak / 1024 ** 2
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_profile(profile, num_frames, height, width, reference_frame_path, window_sizes, png_frames,
+                      perfusion_maps, work_dir):
+    """
+    Time the load, contrast and perfusion stages on one synthetic recording.
+
+    Parameters:
+        profile (str): Profile name stored with the results.
+        num_frames (int): Number of frames of the recording.
+        height (int): Frame height in pixels.
+        width (int): Frame width in pixels.
+        reference_frame_path (str): ROI reference image of the camera.
+        window_sizes (list): Temporal window sizes to benchmark.
+        png_frames (int): Number of frames used for the PNG decoding benchmark (0 skips it).
+        perfusion_maps (int): Number of K maps in the perfusion benchmark.
+        work_dir (str): Folder for the synthetic data.
+
+    Returns:
+        list: One result dict per stage.
+    """
+    results = []
+
+    def record(stage, seconds, peak_mb, frames=None, window_size=None, **extra):
+        result = {"profile": profile, "stage": stage, "window_size": window_size, "frames": frames,
+                  "height": height, "width": width, "seconds": seconds,
+                  "frames_per_second": frames / seconds if frames and seconds > 0 else None,
+                  "peak_memory_mb": peak_mb, **extra}
+        results.append(result)
+        print(f"{profile:>8} {stage:<22} window={str(window_size):<4} {seconds:8.3f} s  {peak_mb:9.1f} MB")
+
+    print(f"Writing a synthetic {profile} recording ({num_frames} x {height} x {width})...")
+    recording_path = os.path.join(work_dir, f"{profile}.lsci")
+    write_synthetic_recording(recording_path, num_frames, height, width)
+
+    if png_frames:
+        png_folder = os.path.join(work_dir, f"{profile}_png")
+        os.makedirs(png_folder, exist_ok=True)
+        write_synthetic_frames(png_folder, png_frames, height, width)
+        _, seconds, peak_mb = measure(lambda: load_frame_stack_from_folder(png_folder))
+        record("load_png", seconds, peak_mb, png_frames)
+
+    # Full frames: the container is memory-mapped, so the first pass also reads it from disk
+    rois = detect_roi_coordinates(reference_frame_path)
+    frames = load_roi_stacks(recording_path, {"full": {"x": 0, "y": 0, "w": width, "h": height}})["full"]
+    lsci_maps = []
+    for window_size in window_sizes:
+        lsci_map, seconds, peak_mb = measure(lambda: calculate_running_temporal_lsci(frames, window_size))
+        record("contrast_full", seconds, peak_mb, num_frames, window_size)
+        lsci_maps.append(lsci_map)
+
+    # ROI crops, copied into memory like a decoded PNG recording
+    roi_stacks, seconds, peak_mb = measure(
+        lambda: {name: np.ascontiguousarray(stack) for name, stack in load_roi_stacks(recording_path, rois).items()}
+    )
+    record("load_roi_stacks", seconds, peak_mb, num_frames)
+    for window_size in window_sizes:
+        _, seconds, peak_mb = measure(lambda: calculate_roi_stacks_lsci_sweep(roi_stacks, [window_size]))
+        record("contrast_roi", seconds, peak_mb, num_frames, window_size)
+    _, seconds, peak_mb = measure(lambda: calculate_roi_stacks_lsci_sweep(roi_stacks, window_sizes))
+    record("contrast_roi_sweep", seconds, peak_mb, num_frames, None, window_sizes=list(window_sizes))
+    del roi_stacks
+
+    # Perfusion over many K maps, batched and one map at a time
+    maps = [lsci_maps[i % len(lsci_maps)] for i in range(perfusion_maps)]
+    _, seconds, peak_mb = measure(lambda: calculate_perfusion_batch(maps))
+    record("perfusion_batch", seconds, peak_mb, maps=perfusion_maps)
+    _, seconds, peak_mb = measure(lambda: calculate_perfusion_batch(maps, rois))
+    record("perfusion_batch_rois", seconds, peak_mb, maps=perfusion_maps)
+    _, seconds, peak_mb = measure(lambda: [calculate_perfusion(lsci_map) for lsci_map in maps])
+    record("perfusion_per_map", seconds, peak_mb, maps=perfusion_maps)
+    _, seconds, peak_mb = measure(lambda: [calculate_flow_index(lsci_map) for lsci_map in maps])
+    record("flow_index", seconds, peak_mb, maps=perfusion_maps)
+    exposure_time = EXPOSURE_TIMES.get(profile.upper(), EXPOSURE_TIMES["BASLER"])
+    _, seconds, peak_mb = measure(lambda: [correlation_time_map(lsci_map, exposure_time) for lsci_map in maps])
+    record("correlation_time", seconds, peak_mb, maps=perfusion_maps)
+
+    os.remove(recording_path)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the LSCI load, contrast and perfusion stages.")
+    parser.add_argument("--profiles", nargs="+", choices=sorted(PROFILES), default=sorted(PROFILES))
+    parser.add_argument("--frame-scale", type=float, default=1.0,
+                        help="Scale the number of frames of the profiles (e.g. 0.1 for a quick run)")
+    parser.add_argument("--window-sizes", type=int, nargs="+", default=[3, 5, 7, 9])
+    parser.add_argument("--png-frames", type=int, default=100, help="Frames for the PNG decoding stage (0 skips it)")
+    parser.add_argument("--perfusion-maps", type=int, default=200, help="K maps in the perfusion stage")
+    parser.add_argument("--output", default="benchmark_results.json", help="Machine-readable results")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for profile in args.profiles:
+            num_frames, height, width, reference_frame_path = PROFILES[profile]
+            num_frames = max(int(num_frames * args.frame_scale), max(args.window_sizes))
+            results += benchmark_profile(profile, num_frames, height, width, reference_frame_path,
+                                         args.window_sizes, args.png_frames, args.perfusion_maps, work_dir)
+
+    report = {
+        "commit": git_commit(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    with open(args.output, "w") as json_file:
+        json.dump(report, json_file, indent=4)
+    print(f"Results written to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
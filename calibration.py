@@ -0,0 +1,423 @@
+import os
+import json
+import argparse
+from datetime import datetime
+from functools import lru_cache
+import numpy as np
+
+from acquisition import BaslerCamera, IDSCamera, SimulatedCamera
+from frame_loader import iter_frames, list_frame_paths, read_frame
+from lsci_engine import crop_roi
+from recording_container import RECORDING_EXTENSION, read_recording_header
+
+DEFAULT_CALIBRATION_DIR = "calibration"
+CALIBRATION_EXTENSION = ".npz"
+# Flat-field pixels below this fraction of the mean response are treated as dead (gain 1)
+MIN_FLAT_RESPONSE = 0.01
+# Infix of the files save_calibration writes before renaming them into place
+TEMPORARY_MARKER = ".tmp"
+
+
+class FrameCalibration:
+    """
+    Dark-frame and flat-field correction of raw frames: (frame - dark) * gain.
+
+    The correction is folded into a single multiply-add, frame * gain + offset with
+    offset = -dark * gain precomputed, so applying it reads every raw pixel once and writes the
+    float32 result straight into the caller's buffer. Without a flat field only the dark offset
+    is subtracted. Note that a per-pixel gain cancels in the temporal K of that pixel; the dark
+    offset does not, and it biases K most in the dim regions.
+
+    Parameters:
+        dark (np.ndarray): (H, W) mean dark frame.
+        gain (np.ndarray): Optional (H, W) flat-field gain, normalized to a mean of 1.
+        settings (dict): Camera and settings the maps were recorded with.
+    """
+
+    def __init__(self, dark, gain=None, settings=None):
+        self.dark = np.asarray(dark, dtype=np.float32)
+        self.gain = None if gain is None else np.asarray(gain, dtype=np.float32)
+        self.offset = -self.dark if self.gain is None else -self.dark * self.gain
+        self.settings = settings or {}
+
+    @property
+    def shape(self):
+        return self.dark.shape
+
+    def check_shape(self, frame_shape):
+        """
+        Make sure frames of the given shape belong to these maps.
+
+        Parameters:
+            frame_shape (tuple): Shape of a frame or of an (n, H, W) chunk.
+
+        Raises:
+            ValueError: If the frame size differs from the maps.
+        """
+        if tuple(frame_shape[-2:]) != self.shape:
+            raise ValueError(f"Calibration maps of {self.shape[1]}x{self.shape[0]} pixels do not match frames of "
+                             f"{frame_shape[-1]}x{frame_shape[-2]} pixels; the calibration belongs to a different "
+                             f"sensor size or ROI.")
+
+    def crop(self, roi):
+        """
+        Calibration of a ROI, for frames that are cropped before they are corrected.
+
+        Parameters:
+            roi (dict): ROI with x, y, w and h.
+
+        Returns:
+            FrameCalibration: Calibration with the cropped maps.
+
+        Raises:
+            ValueError: If the ROI does not lie inside the maps.
+        """
+        height, width = self.shape
+        if roi["x"] < 0 or roi["y"] < 0 or roi["x"] + roi["w"] > width or roi["y"] + roi["h"] > height:
+            raise ValueError(f"ROI {roi} does not lie inside the {width}x{height} calibration maps.")
+        gain = None if self.gain is None else crop_roi(self.gain, roi)
+        return FrameCalibration(crop_roi(self.dark, roi), gain, self.settings)
+
+    def apply(self, frames, out=None):
+        """
+        Correct a frame or a chunk of frames.
+
+        Parameters:
+            frames (np.ndarray): (H, W) frame or (n, H, W) chunk of raw frames.
+            out (np.ndarray): Optional float32 output array of the same shape, e.g. a slice of
+                a preallocated stack.
+
+        Returns:
+            np.ndarray: float32 corrected frames (out if it was given).
+
+        Raises:
+            ValueError: If the frame size differs from the maps.
+        """
+        self.check_shape(np.shape(frames))
+        if out is None:
+            out = np.empty(np.shape(frames), dtype=np.float32)
+        if self.gain is None:
+            np.add(frames, self.offset, out=out, dtype=np.float32)
+        else:
+            np.multiply(frames, self.gain, out=out, dtype=np.float32)
+            out += self.offset
+        return out
+
+
+def reduce_frames(frames):
+    """
+    Mean of a dark or flat stack, accumulated frame by frame.
+
+    Parameters:
+        frames (iterable): Iterable of 2D frames.
+
+    Returns:
+        np.ndarray: (H, W) float32 mean frame.
+
+    Raises:
+        ValueError: If there are no frames.
+    """
+    total = None
+    num_frames = 0
+    for frame in frames:
+        if total is None:
+            total = np.zeros(np.shape(frame), dtype=np.float64)
+        total += frame
+        num_frames += 1
+    if total is None:
+        raise ValueError("Calibration stack without frames.")
+    return (total / num_frames).astype(np.float32)
+
+
+def flat_field_gain(flat, dark):
+    """
+    Per-pixel gain that equalizes the dark-corrected flat field to its mean.
+
+    Parameters:
+        flat (np.ndarray): (H, W) mean flat frame.
+        dark (np.ndarray): (H, W) mean dark frame.
+
+    Returns:
+        np.ndarray: (H, W) float32 gain with a mean response of 1.
+
+    Raises:
+        ValueError: If the flat field is not brighter than the dark frame.
+    """
+    response = flat.astype(np.float64) - dark
+    mean_response = response.mean()
+    if mean_response <= 0:
+        raise ValueError("The flat field is not brighter than the dark frame.")
+    valid = response > MIN_FLAT_RESPONSE * mean_response
+    return np.where(valid, mean_response / np.where(valid, response, 1.0), 1.0).astype(np.float32)
+
+
+def calibration_key(camera, height, width, exposure_time, gain):
+    """
+    Name of the calibration of one camera and its settings.
+
+    Parameters:
+        camera (str): Camera name, e.g. "BASLER" or "IDS".
+        height (int): Frame height in pixels.
+        width (int): Frame width in pixels.
+        exposure_time (float): Exposure time in microseconds.
+        gain (float): Camera gain.
+
+    Returns:
+        str: Key such as "BASLER_1000x768_exp6500_gain32".
+    """
+    return f"{camera.upper()}_{width}x{height}_exp{float(exposure_time):g}_gain{float(gain):g}"
+
+
+def save_calibration(calibration, calibration_dir=DEFAULT_CALIBRATION_DIR):
+    """
+    Store float32 correction maps under the key of their camera and settings.
+
+    Parameters:
+        calibration (FrameCalibration): Calibration with complete settings (camera, exposure_time, gain).
+        calibration_dir (str): Folder of the stored calibrations.
+
+    Returns:
+        str: Path of the saved file.
+    """
+    settings = calibration.settings
+    height, width = calibration.shape
+    key = calibration_key(settings["camera"], height, width, settings["exposure_time"], settings["gain"])
+    os.makedirs(calibration_dir, exist_ok=True)
+    path = os.path.join(calibration_dir, key + CALIBRATION_EXTENSION)
+
+    arrays = {"dark": calibration.dark}
+    if calibration.gain is not None:
+        arrays["gain"] = calibration.gain
+    # Write next to the target and rename, so a loader never sees a partial file
+    temporary_path = path + TEMPORARY_MARKER + CALIBRATION_EXTENSION
+    np.savez(temporary_path, settings=json.dumps(settings), **arrays)
+    os.replace(temporary_path, path)
+    return path
+
+
+def list_calibrations(calibration_dir=DEFAULT_CALIBRATION_DIR):
+    """
+    Keys of the stored calibrations.
+
+    Files left behind by an interrupted save_calibration are skipped.
+
+    Parameters:
+        calibration_dir (str): Folder of the stored calibrations.
+
+    Returns:
+        list: Sorted calibration keys, empty if the folder does not exist.
+    """
+    if not os.path.isdir(calibration_dir):
+        return []
+    return sorted(os.path.splitext(filename)[0] for filename in os.listdir(calibration_dir)
+                  if filename.endswith(CALIBRATION_EXTENSION) and TEMPORARY_MARKER not in filename)
+
+
+@lru_cache(maxsize=8)
+def _load_calibration_file(path, modified_ns):
+    # modified_ns is part of the cache key, so a recalibration is picked up
+    with np.load(path) as archive:
+        gain = archive["gain"] if "gain" in archive.files else None
+        return FrameCalibration(archive["dark"], gain, json.loads(str(archive["settings"])))
+
+
+def load_calibration(camera, height, width, exposure_time, gain, calibration_dir=DEFAULT_CALIBRATION_DIR):
+    """
+    Load the stored calibration of a camera and its settings.
+
+    Loaded calibrations are cached in memory until their file changes.
+
+    Parameters:
+        camera (str): Camera name.
+        height (int): Frame height in pixels.
+        width (int): Frame width in pixels.
+        exposure_time (float): Exposure time in microseconds.
+        gain (float): Camera gain.
+        calibration_dir (str): Folder of the stored calibrations.
+
+    Returns:
+        FrameCalibration: The calibration, or None if there is none for these settings.
+    """
+    path = os.path.join(calibration_dir,
+                        calibration_key(camera, height, width, exposure_time, gain) + CALIBRATION_EXTENSION)
+    if not os.path.exists(path):
+        return None
+    return _load_calibration_file(path, os.stat(path).st_mtime_ns)
+
+
+def calibration_for_recording(source_path, calibration_dir=DEFAULT_CALIBRATION_DIR, camera=None, exposure_time=None,
+                              gain=None):
+    """
+    Find the stored calibration matching a recording.
+
+    Recording containers carry their camera and settings in the header; for PNG folders they
+    have to be given (the frame size is read from the first frame).
+
+    Parameters:
+        source_path (str): Path to a recording container or to a folder of PNG frames.
+        calibration_dir (str): Folder of the stored calibrations.
+        camera (str): Camera name, overriding the header.
+        exposure_time (float): Exposure time in microseconds, overriding the header.
+        gain (float): Camera gain, overriding the header.
+
+    Returns:
+        FrameCalibration: The calibration, or None if the settings are unknown or not calibrated.
+    """
+    settings = recording_settings(source_path, camera, exposure_time, gain)
+    if None in settings.values():
+        return None
+    return load_calibration(calibration_dir=calibration_dir, **settings)
+
+
+def recording_settings(source_path, camera=None, exposure_time=None, gain=None):
+    """
+    Camera, frame size, exposure time and gain of a recording container or PNG folder.
+
+    Parameters:
+        source_path (str): Path to a recording container or to a folder of PNG frames.
+        camera (str): Camera name, overriding the header.
+        exposure_time (float): Exposure time in microseconds, overriding the header.
+        gain (float): Camera gain, overriding the header.
+
+    Returns:
+        dict: camera, height, width, exposure_time and gain (None where unknown).
+    """
+    if source_path.endswith(RECORDING_EXTENSION):
+        header = read_recording_header(source_path)
+        _, height, width = header["shape"]
+    else:
+        header = {}
+        height, width = read_frame(list_frame_paths(source_path)[0]).shape
+    return {
+        "camera": camera or header.get("camera"),
+        "height": height,
+        "width": width,
+        "exposure_time": exposure_time if exposure_time is not None else header.get("exposure_time"),
+        "gain": gain if gain is not None else header.get("gain"),
+    }
+
+
+def build_calibration(dark_source, flat_source=None, calibration_dir=DEFAULT_CALIBRATION_DIR, camera=None,
+                      exposure_time=None, gain=None):
+    """
+    Reduce recorded dark and flat stacks to correction maps and store them.
+
+    The flat field is corrected with the same dark frame, so both stacks have to be recorded
+    with the same settings.
+
+    Parameters:
+        dark_source (str): Recording container or PNG folder recorded with the lens covered.
+        flat_source (str): Optional recording of a uniformly illuminated target.
+        calibration_dir (str): Folder of the stored calibrations.
+        camera (str): Camera name, overriding the header of dark_source.
+        exposure_time (float): Exposure time in microseconds, overriding the header.
+        gain (float): Camera gain, overriding the header.
+
+    Returns:
+        tuple: (calibration, path) with the FrameCalibration and the path of the saved file.
+
+    Raises:
+        ValueError: If the camera or settings are unknown.
+    """
+    settings = recording_settings(dark_source, camera, exposure_time, gain)
+    missing = [name for name, value in settings.items() if value is None]
+    if missing:
+        raise ValueError(f"Unknown {', '.join(missing)} of {dark_source}; please pass them explicitly.")
+
+    dark = reduce_frames(iter_frames(dark_source))
+    flat_gain = flat_field_gain(reduce_frames(iter_frames(flat_source)), dark) if flat_source else None
+    settings = dict(settings, dark_source=dark_source, flat_source=flat_source,
+                    date=datetime.now().isoformat(timespec="seconds"))
+    calibration = FrameCalibration(dark, flat_gain, settings)
+    return calibration, save_calibration(calibration, calibration_dir)
+
+
+def grab_frames(camera, num_frames):
+    """
+    Yield frames straight from a started camera backend, without writing them.
+
+    Parameters:
+        camera (CameraBackend): Opened camera backend.
+        num_frames (int): Number of frames to grab.
+
+    Yields:
+        np.ndarray: 2D frame, valid until the next frame is requested.
+    """
+    camera.start(num_frames)
+    try:
+        for _ in range(num_frames):
+            grabbed = camera.grab()
+            if grabbed is None:
+                break
+            yield grabbed.array
+    finally:
+        camera.stop()
+
+
+def record_calibration(camera, num_dark_frames=200, num_flat_frames=0, calibration_dir=DEFAULT_CALIBRATION_DIR,
+                       prompt=input):
+    """
+    Record dark (and flat) stacks with a camera and store the correction maps.
+
+    The frames are reduced while they are grabbed, so nothing is written to disk but the maps.
+
+    Parameters:
+        camera (CameraBackend): Opened camera backend with the settings of the measurements.
+        num_dark_frames (int): Number of dark frames.
+        num_flat_frames (int): Number of flat frames (0 skips the flat field).
+        calibration_dir (str): Folder of the stored calibrations.
+        prompt (callable): Called with an instruction before each stack, e.g. input.
+
+    Returns:
+        tuple: (calibration, path) with the FrameCalibration and the path of the saved file.
+    """
+    prompt("Cover the lens, then press Enter to record the dark frames.")
+    dark = reduce_frames(grab_frames(camera, num_dark_frames))
+    flat_gain = None
+    if num_flat_frames:
+        prompt("Image a uniformly illuminated target, then press Enter to record the flat frames.")
+        flat_gain = flat_field_gain(reduce_frames(grab_frames(camera, num_flat_frames)), dark)
+
+    settings = {"camera": camera.name, "height": camera.height, "width": camera.width,
+                "exposure_time": camera.exposure_time, "gain": camera.gain,
+                "date": datetime.now().isoformat(timespec="seconds")}
+    calibration = FrameCalibration(dark, flat_gain, settings)
+    return calibration, save_calibration(calibration, calibration_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build, record or list dark/flat calibrations.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Reduce recorded dark/flat stacks")
+    build_parser.add_argument("dark", help="Dark recording (container or PNG folder)")
+    build_parser.add_argument("--flat", help="Flat recording (container or PNG folder)")
+    build_parser.add_argument("--camera", help="Camera name (default: from the container header)")
+    build_parser.add_argument("--exposure", type=float, help="Exposure time in microseconds")
+    build_parser.add_argument("--gain", type=float, help="Camera gain")
+
+    record_parser = subparsers.add_parser("record", help="Record dark/flat stacks with a camera")
+    record_parser.add_argument("--camera", choices=["basler", "ids", "simulated"], default="simulated")
+    record_parser.add_argument("--dark-frames", type=int, default=200)
+    record_parser.add_argument("--flat-frames", type=int, default=0)
+
+    subparsers.add_parser("list", help="List the stored calibrations")
+    parser.add_argument("--calibration-dir", default=DEFAULT_CALIBRATION_DIR)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        _, path = build_calibration(args.dark, args.flat, args.calibration_dir, args.camera, args.exposure,
+                                    args.gain)
+        print(f"Calibration saved as {path}.")
+    elif args.command == "record":
+        cameras = {"basler": BaslerCamera, "ids": IDSCamera, "simulated": SimulatedCamera}
+        with cameras[args.camera]() as camera:
+            _, path = record_calibration(camera, args.dark_frames, args.flat_frames, args.calibration_dir)
+        print(f"Calibration saved as {path}.")
+    else:
+        for key in list_calibrations(args.calibration_dir):
+            print(key)
+
+
+if __name__ == "__main__":
+    main()
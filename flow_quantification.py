@@ -0,0 +1,153 @@
+from functools import lru_cache
+import numpy as np
+
+# Exposure times (microseconds) the recorders set: rec_basler.py and rec_ids.py
+EXPOSURE_TIMES = {"BASLER": 6500, "IDS": 5500}
+# Range of T / tau_c the lookup table covers
+MIN_EXPOSURE_RATIO = 1e-3
+MAX_EXPOSURE_RATIO = 1e4
+
+
+def speckle_contrast_model(exposure_ratio, beta=1.0):
+    """
+    Speckle contrast of a Lorentzian velocity distribution (Bandyopadhyay et al., 2005).
+
+    K^2 = beta * (exp(-2x) - 1 + 2x) / (2x^2) with x = T / tau_c, the exposure time over the
+    speckle correlation time. K falls monotonically from sqrt(beta) (x -> 0, static) to 0.
+
+    Parameters:
+        exposure_ratio (np.ndarray): x = T / tau_c.
+        beta (float): Coherence factor of the optical setup (K of fully static speckle squared).
+
+    Returns:
+        np.ndarray: Speckle contrast K.
+    """
+    x = np.asarray(exposure_ratio, dtype=np.float64)
+    return np.sqrt(beta * (np.expm1(-2 * x) + 2 * x) / (2 * x ** 2))
+
+
+@lru_cache(maxsize=16)
+def contrast_lookup_table(exposure_time, beta=1.0, num_entries=4096):
+    """
+    Lookup table from K to the correlation time for one exposure time, cached per exposure.
+
+    The model is sampled densely on a logarithmic grid of x = T / tau_c and resampled on a
+    uniform grid of K, so applying the table is a direct index plus a linear interpolation
+    instead of a root finder or a binary search per pixel.
+
+    Parameters:
+        exposure_time (float): Camera exposure time T in microseconds.
+        beta (float): Coherence factor of the optical setup.
+        num_entries (int): Number of uniform K steps between 0 and sqrt(beta).
+
+    Returns:
+        tuple: (k_max, tau_table) with tau_table the correlation time (microseconds) at
+            K = k_max * i / (num_entries - 1).
+    """
+    exposure_ratios = np.logspace(np.log10(MAX_EXPOSURE_RATIO), np.log10(MIN_EXPOSURE_RATIO), 16 * num_entries)
+    model_k = speckle_contrast_model(exposure_ratios, beta)  # increasing, as x decreases
+
+    k_max = float(np.sqrt(beta))
+    k_grid = np.linspace(0.0, k_max, num_entries)
+    # Interpolate log(x) for accuracy over the many decades of tau_c
+    log_ratios = np.interp(k_grid, model_k, np.log(exposure_ratios))
+    tau_table = exposure_time / np.exp(log_ratios)
+    tau_table.setflags(write=False)
+    return k_max, tau_table
+
+
+def correlation_time_map(lsci_maps, exposure_time, beta=1.0, out=None, chunk_size=1 << 20):
+    """
+    Convert K maps or stacks into speckle correlation times with the cached lookup table.
+
+    K values outside [0, sqrt(beta)] are clipped to the ends of the table, i.e. to the
+    correlation times of x = MAX_EXPOSURE_RATIO and x = MIN_EXPOSURE_RATIO. Non-finite K
+    values (NaN, inf) give NaN.
+
+    Parameters:
+        lsci_maps (np.ndarray): K map or (T, H, W) stack of K maps.
+        exposure_time (float): Camera exposure time in microseconds.
+        beta (float): Coherence factor of the optical setup.
+        out (np.ndarray): Optional float32 output array of the same shape.
+        chunk_size (int): Pixels converted at a time, bounding the temporaries.
+
+    Returns:
+        np.ndarray: float32 correlation times tau_c in microseconds.
+    """
+    k_max, tau_table = contrast_lookup_table(float(exposure_time), float(beta))
+    scale = (len(tau_table) - 1) / k_max
+
+    lsci_maps = np.asarray(lsci_maps)
+    if out is None:
+        out = np.empty(lsci_maps.shape, dtype=np.float32)
+    flat_k = lsci_maps.reshape(-1)
+    flat_out = out.reshape(-1)
+
+    for start in range(0, flat_k.size, chunk_size):
+        chunk_k = flat_k[start:start + chunk_size]
+        finite = np.isfinite(chunk_k)
+        # Non-finite values are looked up as 0 and overwritten with NaN below
+        position = np.clip(np.where(finite, chunk_k, 0.0), 0.0, k_max) * scale
+        index = np.minimum(position.astype(np.intp), len(tau_table) - 2)
+        position -= index
+        lower = tau_table[index]
+        chunk_out = flat_out[start:start + chunk_size]
+        chunk_out[...] = lower + position * (tau_table[index + 1] - lower)
+        chunk_out[~finite] = np.nan
+    return out
+
+
+def quantify_flow(lsci_maps, exposure_time, beta=1.0, reference_correlation_time=None):
+    """
+    Relative correlation time and flow index maps from K maps.
+
+    The flow index is T / tau_c, which is proportional to the decorrelation rate and with it
+    to the flow speed; unlike 1 / K^2 it is linear in the speed over the whole range of the
+    model. The relative correlation time is tau_c divided by a reference (e.g. the baseline
+    recording) and defaults to the mean tau_c of the given maps (ignoring NaN pixels).
+
+    Parameters:
+        lsci_maps (np.ndarray): K map or (T, H, W) stack of K maps.
+        exposure_time (float): Camera exposure time in microseconds (see EXPOSURE_TIMES).
+        beta (float): Coherence factor of the optical setup.
+        reference_correlation_time (float): Reference tau_c in microseconds.
+
+    Returns:
+        dict: float32 maps "correlation_time" (microseconds), "relative_correlation_time" and
+            "flow_index", plus the "reference_correlation_time" used.
+    """
+    correlation_time = correlation_time_map(lsci_maps, exposure_time, beta)
+    if reference_correlation_time is None:
+        reference_correlation_time = float(np.nanmean(correlation_time, dtype=np.float64))
+
+    flow_index = np.divide(np.float32(exposure_time), correlation_time)
+    return {
+        "correlation_time": correlation_time,
+        "relative_correlation_time": correlation_time / np.float32(reference_correlation_time),
+        "flow_index": flow_index,
+        "reference_correlation_time": reference_correlation_time,
+    }
+
+
+def lookup_exposure_time(metadata=None, name=""):
+    """
+    Find the exposure time of a K map from its metadata or, failing that, its file name.
+
+    Parameters:
+        metadata (dict): K map metadata (an "exposure_time" or "camera" entry).
+        name (str): File name, searched for a camera name of EXPOSURE_TIMES.
+
+    Returns:
+        float: Exposure time in microseconds, or None if unknown.
+    """
+    metadata = metadata or {}
+    if metadata.get("exposure_time"):
+        return float(metadata["exposure_time"])
+    # "camera" is null in the headers of recordings without a camera name
+    camera = (metadata.get("camera") or "").upper()
+    if camera in EXPOSURE_TIMES:
+        return float(EXPOSURE_TIMES[camera])
+    for camera, exposure_time in EXPOSURE_TIMES.items():
+        if camera in name.upper():
+            return float(exposure_time)
+    return None
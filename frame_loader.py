@@ -0,0 +1,249 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import cv2
+
+from lsci_engine import crop_roi
+from recording_container import RECORDING_EXTENSION, frame_sort_key, load_recording
+
+
+def list_frame_paths(folder_path):
+    """
+    List the PNG frames of a recording folder ordered by frame number (see frame_sort_key).
+
+    Parameters:
+        folder_path (str): Path to the folder containing PNG frames.
+
+    Returns:
+        list: Sorted list of frame paths.
+    """
+    return [
+        os.path.join(folder_path, filename)
+        for filename in sorted((f for f in os.listdir(folder_path) if f.endswith(".png")), key=frame_sort_key)
+    ]
+
+
+def read_frame(frame_path):
+    """
+    Read a single frame as a grayscale uint8 array.
+
+    Parameters:
+        frame_path (str): Path to the PNG frame.
+
+    Returns:
+        np.ndarray: 2D array representing the frame.
+
+    Raises:
+        FileNotFoundError: If the frame cannot be loaded.
+    """
+    frame = cv2.imread(frame_path, cv2.IMREAD_GRAYSCALE)
+    if frame is None:
+        raise FileNotFoundError(f"Frame not found at {frame_path}. Please check the path.")
+    return frame
+
+
+def iter_frames_from_folder(folder_path):
+    """
+    Yield the PNG frames of a folder one at a time, in sorted order.
+
+    Parameters:
+        folder_path (str): Path to the folder containing PNG frames.
+
+    Yields:
+        np.ndarray: 2D uint8 array for each frame.
+    """
+    for frame_path in list_frame_paths(folder_path):
+        yield read_frame(frame_path)
+
+
+def iter_frame_chunks(folder_path, chunk_size=64, num_workers=1):
+    """
+    Yield the PNG frames of a folder in fixed-size contiguous blocks.
+
+    Every chunk is a freshly allocated (n, H, W) uint8 array with n = chunk_size, except for
+    the last chunk which holds the remaining frames. Only one chunk is alive inside the
+    loader at a time; its frames are decoded by num_workers threads.
+
+    Parameters:
+        folder_path (str): Path to the folder containing PNG frames.
+        chunk_size (int): Number of frames per chunk.
+        num_workers (int): Number of decoding threads; None uses one per CPU core.
+
+    Yields:
+        np.ndarray: (n, H, W) uint8 block of consecutive frames.
+    """
+    frame_paths = list_frame_paths(folder_path)
+
+    for start in range(0, len(frame_paths), chunk_size):
+        chunk_paths = frame_paths[start:start + chunk_size]
+        first_frame = read_frame(chunk_paths[0])
+        chunk = np.empty((len(chunk_paths),) + first_frame.shape, dtype=np.uint8)
+        chunk[0] = first_frame
+
+        def store_frame(index, frame, chunk=chunk):
+            chunk[index + 1] = frame
+
+        _decode_in_parallel(chunk_paths[1:], store_frame, num_workers)
+        yield chunk
+
+
+def _decode_in_parallel(frame_paths, store_frame, num_workers):
+    """
+    Decode frames with a thread pool and hand each one to store_frame(index, frame).
+
+    cv2.imread releases the GIL while reading and inflating the PNG, so threads decode in
+    parallel without copying frames between processes.
+
+    Parameters:
+        frame_paths (list): Paths of the frames to decode.
+        store_frame (callable): Called as store_frame(index, frame) for every decoded frame.
+        num_workers (int): Number of decoding threads; None uses one per CPU core.
+    """
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+
+    def decode(index):
+        store_frame(index, read_frame(frame_paths[index]))
+
+    if num_workers <= 1:
+        for index in range(len(frame_paths)):
+            decode(index)
+        return
+
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        # Consume the results so that decoding errors are raised here
+        for _ in executor.map(decode, range(len(frame_paths))):
+            pass
+
+
+def load_frame_stack_from_folder(folder_path, num_workers=None):
+    """
+    Load all PNG frames of a folder into a preallocated (T, H, W) uint8 array in parallel.
+
+    The frames keep their sorted order; each worker writes its decoded frame straight into
+    its slot of the stack.
+
+    Parameters:
+        folder_path (str): Path to the folder containing PNG frames.
+        num_workers (int): Number of decoding threads; None uses one per CPU core.
+
+    Returns:
+        np.ndarray: (T, H, W) uint8 array of frames.
+    """
+    frame_paths = list_frame_paths(folder_path)
+    first_frame = read_frame(frame_paths[0])
+    stack = np.empty((len(frame_paths),) + first_frame.shape, dtype=np.uint8)
+    stack[0] = first_frame
+
+    def store_frame(index, frame):
+        stack[index + 1] = frame
+
+    _decode_in_parallel(frame_paths[1:], store_frame, num_workers)
+    return stack
+
+
+def load_roi_stacks_from_folder(folder_path, rois, num_workers=None, calibration=None):
+    """
+    Load only the ROI crops of every PNG frame into preallocated per-ROI stacks.
+
+    Each full frame is decoded, its ROIs are copied into the (T, h, w) uint8 stacks and the
+    full frame is released right away, so memory scales with the ROI area instead of the
+    sensor area. With a calibration, every crop is corrected straight into float32 stacks.
+
+    Parameters:
+        folder_path (str): Path to the folder containing PNG frames.
+        rois (dict): ROIs by name, as returned by detect_roi_coordinates.
+        num_workers (int): Number of decoding threads; None uses one per CPU core.
+        calibration (FrameCalibration): Optional dark/flat correction (see calibration.py).
+
+    Returns:
+        dict: (T, h, w) uint8 stack for every ROI name (float32 with a calibration).
+
+    Raises:
+        ValueError: If the calibration does not match the frame size.
+    """
+    frame_paths = list_frame_paths(folder_path)
+    dtype = np.uint8 if calibration is None else np.float32
+    roi_stacks = {
+        name: np.empty((len(frame_paths), roi["h"], roi["w"]), dtype=dtype)
+        for name, roi in rois.items()
+    }
+    roi_calibrations = {} if calibration is None else {name: calibration.crop(roi) for name, roi in rois.items()}
+
+    def store_frame(index, frame):
+        if calibration is not None:
+            # The crops would fit a calibration of another sensor size just as well
+            calibration.check_shape(frame.shape)
+        for name, roi in rois.items():
+            if calibration is None:
+                roi_stacks[name][index] = crop_roi(frame, roi)
+            else:
+                roi_calibrations[name].apply(crop_roi(frame, roi), out=roi_stacks[name][index])
+
+    _decode_in_parallel(frame_paths, store_frame, num_workers)
+    return roi_stacks
+
+
+def load_roi_stacks(source_path, rois, num_workers=None, calibration=None, chunk_size=64):
+    """
+    Load the ROI stacks of a recording stored as a container file or as a PNG folder.
+
+    For a recording container the stacks are zero-copy views on the memory-mapped frames;
+    for a PNG folder they are decoded with load_roi_stacks_from_folder. With a calibration,
+    the container's ROI crops are corrected chunk by chunk into float32 stacks, so the raw
+    frames are never copied as a whole.
+
+    Parameters:
+        source_path (str): Path to a recording container or to a folder of PNG frames.
+        rois (dict): ROIs by name, as returned by detect_roi_coordinates.
+        num_workers (int): Number of decoding threads for PNG folders; None uses one per CPU core.
+        calibration (FrameCalibration): Optional dark/flat correction (see calibration.py).
+        chunk_size (int): Frames corrected at a time for recording containers.
+
+    Returns:
+        dict: (T, h, w) uint8 stack for every ROI name (float32 with a calibration).
+
+    Raises:
+        ValueError: If the calibration does not match the frame size.
+    """
+    if source_path.endswith(RECORDING_EXTENSION):
+        frames, _, _ = load_recording(source_path)
+        if calibration is None:
+            return {name: crop_roi(frames, roi) for name, roi in rois.items()}
+
+        calibration.check_shape(frames.shape)
+        roi_stacks = {}
+        for name, roi in rois.items():
+            roi_calibration = calibration.crop(roi)
+            roi_frames = crop_roi(frames, roi)
+            roi_stacks[name] = np.empty(roi_frames.shape, dtype=np.float32)
+            for start in range(0, len(frames), chunk_size):
+                roi_calibration.apply(roi_frames[start:start + chunk_size],
+                                      out=roi_stacks[name][start:start + chunk_size])
+        return roi_stacks
+
+    return load_roi_stacks_from_folder(source_path, rois, num_workers=num_workers, calibration=calibration)
+
+
+def iter_frames(source_path, calibration=None):
+    """
+    Yield the frames of a recording stored as a container file or as a PNG folder, one at a time.
+
+    Parameters:
+        source_path (str): Path to a recording container or to a folder of PNG frames.
+        calibration (FrameCalibration): Optional dark/flat correction (see calibration.py).
+
+    Yields:
+        np.ndarray: 2D uint8 array for each frame (a memory-mapped view for containers), or a
+            corrected float32 frame with a calibration.
+    """
+    if source_path.endswith(RECORDING_EXTENSION):
+        frames, _, _ = load_recording(source_path)
+    else:
+        frames = iter_frames_from_folder(source_path)
+
+    if calibration is None:
+        yield from frames
+    else:
+        for frame in frames:
+            yield calibration.apply(frame)
@@ -0,0 +1,164 @@
+import os
+import argparse
+import numpy as np
+
+from frame_loader import list_frame_paths
+from recording_container import (FRAME_METADATA_FIELDS, FRAME_METADATA_FILENAME, INVALID_TIMESTAMP, RECORDING_EXTENSION,
+                                 read_recording_header, load_recording)
+
+
+def load_frame_metadata(source_path):
+    """
+    Load the per-frame metadata table of a recording container or PNG recording folder.
+
+    Parameters:
+        source_path (str): Path to a recording container or to a folder of PNG frames.
+
+    Returns:
+        tuple: (metadata, camera_tick_frequency) with metadata a (T, 3) int64 array with
+            FRAME_METADATA_FIELDS columns (None if the recording has no metadata) and the camera
+            tick frequency in ticks per second.
+
+    Raises:
+        ValueError: If the number of metadata rows does not match the number of frames.
+    """
+    if source_path.endswith(RECORDING_EXTENSION):
+        header = read_recording_header(source_path)
+        if header["timestamp_fields"] != list(FRAME_METADATA_FIELDS):
+            return None, None
+        _, metadata, _ = load_recording(source_path)
+        return metadata, header.get("camera_tick_frequency") or 1e9
+
+    metadata_path = os.path.join(source_path, FRAME_METADATA_FILENAME)
+    if not os.path.exists(metadata_path):
+        return None, None
+    metadata = np.load(metadata_path)
+    num_frames = len(list_frame_paths(source_path))
+    if len(metadata) != num_frames:
+        raise ValueError(f"{metadata_path} has {len(metadata)} rows for {num_frames} frames; "
+                         "the timestamps do not line up with the frames.")
+    return metadata, 1e9
+
+
+def frame_times(metadata, camera_tick_frequency=1e9):
+    """
+    Time of every frame in seconds since the first one, from the frame metadata.
+
+    The camera timestamps are used when every frame has one, the host timestamps otherwise; a
+    single missing (INVALID_TIMESTAMP) entry would shift the whole time axis.
+
+    Parameters:
+        metadata (np.ndarray): (T, 3) int64 table with FRAME_METADATA_FIELDS columns.
+        camera_tick_frequency (float): Ticks per second of the camera timestamps.
+
+    Returns:
+        tuple: (times_s, timestamp_source) with times_s a (T,) float64 array and timestamp_source
+            "camera" or "host", or (None, None) if neither column is complete.
+    """
+    if len(metadata) == 0:
+        return None, None
+    camera_timestamps = metadata[:, 1]
+    host_timestamps = metadata[:, 2]
+    if np.all(camera_timestamps != INVALID_TIMESTAMP):
+        return (camera_timestamps - camera_timestamps[0]) / camera_tick_frequency, "camera"
+    if np.all(host_timestamps != INVALID_TIMESTAMP):
+        return (host_timestamps - host_timestamps[0]) / 1e9, "host"
+    return None, None
+
+
+def analyze_frame_timing(metadata, camera_tick_frequency=1e9, expected_frame_rate=None, gap_factor=1.5):
+    """
+    Compute the effective frame rate, timing jitter, gaps and dropped frames of a recording.
+
+    The timestamps are chosen by frame_times (camera, else host). A gap is
+    an interval longer than gap_factor times the median interval; dropped frames are counted
+    from jumps in the camera frame ID.
+
+    Parameters:
+        metadata (np.ndarray): (T, 3) int64 table with FRAME_METADATA_FIELDS columns.
+        camera_tick_frequency (float): Ticks per second of the camera timestamps.
+        expected_frame_rate (float): Frame rate the camera was set to, if known.
+        gap_factor (float): Interval, relative to the median interval, above which a gap is flagged.
+
+    Returns:
+        dict: Timing report with "num_frames", "effective_frame_rate", "expected_frame_rate",
+            "mean_interval_ms", "jitter_ms", "gap_indices", "dropped_frames", "dropped_indices"
+            and "timestamp_source".
+    """
+    frame_ids = metadata[:, 0]
+    times_s, timestamp_source = frame_times(metadata, camera_tick_frequency)
+    intervals = np.diff(times_s) if times_s is not None else np.empty(0)
+    report = {
+        "num_frames": len(metadata),
+        "effective_frame_rate": None,
+        "expected_frame_rate": expected_frame_rate,
+        "mean_interval_ms": None,
+        "jitter_ms": None,
+        "gap_indices": [],
+        "dropped_frames": 0,
+        "dropped_indices": [],
+        "timestamp_source": timestamp_source,
+    }
+    if len(intervals) == 0:
+        return report
+
+    median_interval = np.median(intervals)
+    report["effective_frame_rate"] = float(len(intervals) / times_s[-1]) if times_s[-1] > 0 else None
+    report["mean_interval_ms"] = float(np.mean(intervals) * 1e3)
+    report["jitter_ms"] = float(np.std(intervals) * 1e3)
+    # Index of the first frame after each gap
+    report["gap_indices"] = (np.flatnonzero(intervals > gap_factor * median_interval) + 1).tolist()
+
+    if np.all(frame_ids != INVALID_TIMESTAMP):
+        id_steps = np.diff(frame_ids)
+        dropped = np.flatnonzero(id_steps > 1)
+        report["dropped_frames"] = int(np.sum(id_steps[dropped] - 1))
+        report["dropped_indices"] = (dropped + 1).tolist()
+
+    return report
+
+
+def check_frame_timing(source_path, expected_frame_rate=None):
+    """
+    Print a timing report of a recording before it goes into the LSCI stage.
+
+    Parameters:
+        source_path (str): Path to a recording container or to a folder of PNG frames.
+        expected_frame_rate (float): Frame rate the camera was set to, if known.
+
+    Returns:
+        dict: Timing report from analyze_frame_timing, or None if the recording has no metadata.
+    """
+    metadata, camera_tick_frequency = load_frame_metadata(source_path)
+    if metadata is None:
+        print(f"No frame metadata found for {source_path}; skipping the timing check.")
+        return None
+
+    report = analyze_frame_timing(metadata, camera_tick_frequency, expected_frame_rate)
+    if report["effective_frame_rate"] is None:
+        print(f"{source_path}: {report['num_frames']} frames, too few for a timing check.")
+        return report
+
+    print(f"{source_path}: {report['num_frames']} frames at {report['effective_frame_rate']:.2f} fps "
+          f"({report['timestamp_source']} timestamps), jitter {report['jitter_ms']:.3f} ms")
+    if expected_frame_rate and abs(report["effective_frame_rate"] - expected_frame_rate) > 0.05 * expected_frame_rate:
+        print(f"  Warning: effective frame rate differs from the expected {expected_frame_rate:.2f} fps")
+    if report["gap_indices"]:
+        print(f"  Warning: {len(report['gap_indices'])} timing gaps, first before frame {report['gap_indices'][0]}")
+    if report["dropped_frames"]:
+        print(f"  Warning: {report['dropped_frames']} dropped frames, first before frame {report['dropped_indices'][0]}")
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check frame timing and dropped frames of a recording.")
+    parser.add_argument("source_path", help="Recording container or folder of PNG frames")
+    parser.add_argument("--frame-rate", type=float, help="Frame rate the camera was set to")
+    args = parser.parse_args()
+
+    check_frame_timing(args.source_path, args.frame_rate)
+
+
+if __name__ == "__main__":
+    main()
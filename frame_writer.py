@@ -0,0 +1,157 @@
+import queue
+import threading
+import numpy as np
+import cv2
+
+from recording_container import INVALID_TIMESTAMP
+
+
+class AsyncFrameWriter:
+    """
+    Write-behind frame writer decoupling camera acquisition from disk I/O.
+
+    submit() copies a frame into a free slot of a preallocated ring buffer and returns
+    immediately, so the grab loop can requeue the camera buffer straight away. A pool of
+    writer threads takes filled slots in FIFO order, hands them to the sink (PNG encoding,
+    container writing, ...) and frees the slot again. When every slot is still waiting to
+    be written the frame is dropped and counted instead of blocking the grab loop.
+
+    Parameters:
+        sink (callable): Called as sink(index, frame, timestamp) from a writer thread. The frame
+            is a view on the ring buffer and must not be kept after the call returns.
+        frame_shape (tuple): (height, width) of the frames.
+        capacity (int): Number of frames the ring buffer can hold.
+        num_writers (int): Number of writer threads. Use 1 for sinks that must receive the
+            frames in order, such as a RecordingWriter.
+    """
+
+    def __init__(self, sink, frame_shape, capacity=256, num_writers=4):
+        self.sink = sink
+        self.buffer = np.empty((capacity,) + tuple(frame_shape), dtype=np.uint8)
+
+        self.frames_submitted = 0
+        self.frames_written = 0
+        self.dropped_frames = 0
+        self.max_queue_depth = 0
+        self.errors = []
+
+        self._free_slots = queue.Queue()
+        for slot in range(capacity):
+            self._free_slots.put(slot)
+        self._pending = queue.Queue()
+        self._lock = threading.Lock()
+
+        self._writers = [threading.Thread(target=self._write_loop, daemon=True) for _ in range(num_writers)]
+        for writer in self._writers:
+            writer.start()
+
+    def submit(self, frame, timestamp=None):
+        """
+        Queue a frame for writing without blocking.
+
+        Parameters:
+            frame (np.ndarray): 2D uint8 frame; it is copied, so the caller may reuse its buffer.
+            timestamp (int): Timestamp passed on to the sink.
+
+        Returns:
+            bool: True if the frame was queued, False if it was dropped because the buffer is full.
+        """
+        index = self.frames_submitted
+        self.frames_submitted += 1
+
+        try:
+            slot = self._free_slots.get_nowait()
+        except queue.Empty:
+            self.dropped_frames += 1
+            return False
+
+        self.buffer[slot] = frame
+        self._pending.put((slot, index, timestamp))
+        self.max_queue_depth = max(self.max_queue_depth, self._pending.qsize())
+        return True
+
+    def _write_loop(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+
+            slot, index, timestamp = item
+            try:
+                self.sink(index, self.buffer[slot], timestamp)
+                with self._lock:
+                    self.frames_written += 1
+            except Exception as e:
+                with self._lock:
+                    self.errors.append(e)
+            finally:
+                self._free_slots.put(slot)
+
+    def close(self):
+        """
+        Wait until all queued frames are written and stop the writer threads.
+
+        Returns:
+            dict: Counters of the run ("submitted", "written", "dropped", "max_queue_depth", "errors").
+        """
+        for _ in self._writers:
+            self._pending.put(None)
+        for writer in self._writers:
+            writer.join()
+
+        return self.statistics()
+
+    def statistics(self):
+        """
+        Return the current counters of the writer.
+
+        Returns:
+            dict: Counters of the run ("submitted", "written", "dropped", "max_queue_depth", "errors").
+        """
+        return {
+            "submitted": self.frames_submitted,
+            "written": self.frames_written,
+            "dropped": self.dropped_frames,
+            "max_queue_depth": self.max_queue_depth,
+            "errors": len(self.errors),
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def png_folder_sink(folder_path, filename_pattern="frame_{index:04d}.png"):
+    """
+    Create a sink that saves every frame as a PNG file in a folder.
+
+    Parameters:
+        folder_path (str): Folder to write the frames into.
+        filename_pattern (str): File name pattern, formatted with index and timestamp.
+
+    Returns:
+        callable: Sink for AsyncFrameWriter.
+    """
+    def sink(index, frame, timestamp):
+        if not cv2.imwrite(f"{folder_path}/{filename_pattern.format(index=index, timestamp=timestamp)}", frame):
+            raise OSError(f"Could not write frame {index} to {folder_path}.")
+
+    return sink
+
+
+def recording_sink(recording_writer):
+    """
+    Create a sink that appends every frame to a RecordingWriter (use with num_writers=1).
+
+    Parameters:
+        recording_writer (RecordingWriter): Open recording container.
+
+    Returns:
+        callable: Sink for AsyncFrameWriter.
+    """
+    def sink(index, frame, timestamp):
+        recording_writer.write_frame(frame, INVALID_TIMESTAMP if timestamp is None else timestamp)
+
+    return sink
@@ -0,0 +1,151 @@
+import time
+import queue
+import threading
+import numpy as np
+import cv2
+
+from lsci_engine import contrast_from_sums, crop_roi, update_window_sums
+from spatial_lsci import calculate_spatial_lsci
+
+
+class LivePreview:
+    """
+    Live LSCI preview fed from the grab loop of a recorder.
+
+    offer() copies a subsampled version of the frame into a small queue and returns at once;
+    when the queue is full the preview frame is dropped, so the grab loop is never blocked.
+    A consumer thread keeps running sums over a rolling window of the last W preview frames
+    (temporal mode) and, at most every update_interval seconds, computes the K map, the mean
+    K inside every ROI and hands them to on_update and/or saves a colour-mapped PNG.
+
+    Parameters:
+        rois (dict): ROIs by name, as returned by detect_roi_coordinates (full-frame coordinates).
+        mode (str): "temporal" or "spatial".
+        window_size (int): Number of frames in the temporal window.
+        kernel_size (int): Side length of the spatial window in pixels (spatial mode).
+        downsample (int): Keep every n-th pixel in x and y. Subsampling keeps the speckle
+            statistics intact, unlike averaging.
+        update_interval (float): Minimum time between two preview updates in seconds.
+        on_update (callable): Called as on_update(lsci_map, roi_means) from the consumer thread.
+        output_path (str): Optional PNG path the latest colour-mapped K map is saved to.
+        queue_size (int): Number of preview frames that may wait for the consumer.
+    """
+
+    def __init__(self, rois=None, mode="temporal", window_size=5, kernel_size=7, downsample=4, update_interval=0.5,
+                 on_update=None, output_path=None, queue_size=4):
+        if mode not in ("temporal", "spatial"):
+            raise ValueError(f"Unknown preview mode {mode!r}; use 'temporal' or 'spatial'.")
+
+        self.mode = mode
+        self.window_size = window_size
+        self.kernel_size = kernel_size
+        self.downsample = downsample
+        self.update_interval = update_interval
+        self.on_update = on_update
+        self.output_path = output_path
+        # ROI coordinates on the subsampled grid
+        self.rois = {
+            name: {key: max(value // downsample, 1) if key in ("w", "h") else value // downsample
+                   for key, value in roi.items()}
+            for name, roi in (rois or {}).items()
+        }
+
+        self.frames_offered = 0
+        self.frames_dropped = 0
+        self.updates = 0
+        self.latest_map = None
+        self.latest_roi_means = {}
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._consume, daemon=True)
+        self._thread.start()
+
+    def offer(self, frame):
+        """
+        Offer a grabbed frame to the preview without blocking.
+
+        Parameters:
+            frame (np.ndarray): 2D frame; only a subsampled copy is kept.
+
+        Returns:
+            bool: True if the frame was queued, False if it was dropped.
+        """
+        self.frames_offered += 1
+        try:
+            self._queue.put_nowait(np.array(frame[::self.downsample, ::self.downsample], dtype=np.float32))
+            return True
+        except queue.Full:
+            self.frames_dropped += 1
+            return False
+
+    def _consume(self):
+        num_window_frames = 2 * (self.window_size // 2) + 1
+        ring = None
+        num_frames = 0
+        last_update = 0.0
+
+        while not self._stop.is_set():
+            try:
+                frame = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            if self.mode == "temporal":
+                if ring is None or ring.shape[1:] != frame.shape:
+                    ring = np.empty((num_window_frames,) + frame.shape, dtype=np.float32)
+                    sum_x = np.zeros(frame.shape, dtype=np.float32)
+                    sum_x2 = np.zeros(frame.shape, dtype=np.float32)
+                    frame_buffer = np.empty(frame.shape, dtype=np.float32)
+                    num_frames = 0
+
+                # Update the rolling window sums with every frame, compute K only when an update is due
+                slot = num_frames % num_window_frames
+                if num_frames >= num_window_frames:
+                    update_window_sums(sum_x, sum_x2, ring[slot], frame_buffer, np.subtract)
+                ring[slot] = frame
+                update_window_sums(sum_x, sum_x2, frame, frame_buffer, np.add)
+                num_frames += 1
+                if num_frames < num_window_frames:
+                    continue
+
+            now = time.monotonic()
+            if now - last_update < self.update_interval:
+                continue
+            last_update = now
+
+            if self.mode == "temporal":
+                lsci_map = contrast_from_sums(sum_x, sum_x2, num_window_frames)
+            else:
+                lsci_map = calculate_spatial_lsci(frame, self.kernel_size)
+            self._publish(lsci_map)
+
+    def _publish(self, lsci_map):
+        roi_means = {name: float(np.mean(crop_roi(lsci_map, roi))) for name, roi in self.rois.items()}
+        self.latest_map = lsci_map
+        self.latest_roi_means = roi_means
+        self.updates += 1
+
+        if self.on_update is not None:
+            self.on_update(lsci_map, roi_means)
+        if self.output_path is not None:
+            # K is mostly in [0, 1]; scale to 8 bit and apply the same jet colour map as the offline maps
+            scaled = np.clip(lsci_map * 255.0, 0, 255).astype(np.uint8)
+            cv2.imwrite(self.output_path, cv2.applyColorMap(scaled, cv2.COLORMAP_JET))
+
+    def close(self):
+        """
+        Stop the consumer thread.
+
+        Returns:
+            dict: Counters of the run ("offered", "dropped", "updates").
+        """
+        self._stop.set()
+        self._thread.join()
+        return {"offered": self.frames_offered, "dropped": self.frames_dropped, "updates": self.updates}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
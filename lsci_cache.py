@@ -0,0 +1,352 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import numpy as np
+
+from frame_loader import list_frame_paths, load_roi_stacks
+from lsci_engine import calculate_roi_stacks_lsci_sweep
+from LSCI_convertion import detect_roi_coordinates
+
+DEFAULT_CACHE_DIR = ".lsci_cache"
+DEFAULT_MAX_CACHE_BYTES = 4 * 1024 ** 3
+METADATA_FILENAME = "metadata.json"
+# Marks the directory an entry is written to before it is renamed into place, and the one an
+# evicted entry is renamed to before it is deleted
+TEMP_MARKER = ".tmp-"
+REMOVED_MARKER = f"{TEMP_MARKER}removed-"
+# Bumped whenever the layout or the meaning of cached results changes
+CACHE_VERSION = 1
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return [os.path.basename(path), stat.st_size, stat.st_mtime_ns]
+
+
+def source_fingerprint(source_path):
+    """
+    Fingerprint a recording (PNG folder or container file) or a reference image.
+
+    Only file names, sizes and modification times are hashed, so fingerprinting a folder
+    with thousands of frames takes milliseconds.
+
+    Parameters:
+        source_path (str): PNG folder or single file.
+
+    Returns:
+        str: SHA-256 hex digest.
+    """
+    if os.path.isdir(source_path):
+        signature = [_file_signature(frame_path) for frame_path in list_frame_paths(source_path)]
+    else:
+        signature = _file_signature(source_path)
+    return hashlib.sha256(json.dumps(signature).encode()).hexdigest()
+
+
+def cache_key(kind, source_path, reference_frame_path=None, **params):
+    """
+    Content-addressed key of an intermediate result.
+
+    Parameters:
+        kind (str): Type of result, e.g. "roi_stacks" or "lsci_sweep".
+        source_path (str): Recording the result was computed from.
+        reference_frame_path (str): ROI reference image, if the result depends on the ROIs.
+        **params: Parameters of the computation (window sizes, mode, dtype, ...).
+
+    Returns:
+        str: SHA-256 hex digest.
+    """
+    description = {
+        "version": CACHE_VERSION,
+        "kind": kind,
+        "source": source_fingerprint(source_path),
+        "reference": source_fingerprint(reference_frame_path) if reference_frame_path else None,
+        "params": params,
+    }
+    return hashlib.sha256(json.dumps(description, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _entry_size(entry_path):
+    return sum(os.path.getsize(os.path.join(entry_path, filename)) for filename in os.listdir(entry_path))
+
+
+class LSCICache:
+    """
+    On-disk cache of intermediate LSCI results with size-bounded LRU eviction.
+
+    Every entry is a directory named after its key, holding one .npy file per array (loaded
+    back as read-only memory maps) and a JSON metadata file. Reading an entry refreshes its
+    modification time; when the cache grows beyond max_bytes, the least recently used entries
+    are removed.
+
+    Parameters:
+        cache_dir (str): Directory of the cache.
+        max_bytes (int): Maximum total size of the cache in bytes.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _entries(self):
+        # Entries still being written by put() are neither listed, counted nor evicted
+        return [
+            self._entry_path(key) for key in os.listdir(self.cache_dir)
+            if TEMP_MARKER not in key and os.path.exists(os.path.join(self._entry_path(key), METADATA_FILENAME))
+        ]
+
+    def _remove_entry(self, entry_path):
+        """
+        Take an entry out of the cache and delete its files.
+
+        The entry is renamed out of the way first, so readers see it either whole or not at
+        all. On Windows, files memory-mapped by get() can be neither renamed nor deleted while
+        the arrays are alive; such an entry stays in the cache, and files that could not be
+        deleted are retried by the next evict().
+
+        Parameters:
+            entry_path (str): Directory of the entry.
+
+        Returns:
+            int: Number of bytes freed, or None if the entry is still in use.
+        """
+        removed_path = f"{entry_path}{REMOVED_MARKER}{os.getpid()}"
+        try:
+            os.rename(entry_path, removed_path)
+        except OSError:
+            return None
+        size = _entry_size(removed_path)
+        shutil.rmtree(removed_path, ignore_errors=True)
+        return size - (_entry_size(removed_path) if os.path.exists(removed_path) else 0)
+
+    def get(self, key):
+        """
+        Look up a cached result.
+
+        Parameters:
+            key (str): Key from cache_key.
+
+        Returns:
+            tuple: (arrays, metadata) with a dict of memory-mapped arrays, or None on a miss.
+        """
+        entry_path = self._entry_path(key)
+        metadata_path = os.path.join(entry_path, METADATA_FILENAME)
+        if not os.path.exists(metadata_path):
+            return None
+
+        with open(metadata_path) as json_file:
+            metadata = json.load(json_file)
+        arrays = {
+            name: np.load(os.path.join(entry_path, f"{index}.npy"), mmap_mode="r")
+            for index, name in enumerate(metadata["arrays"])
+        }
+        # Mark the entry as recently used
+        os.utime(entry_path)
+        return arrays, metadata["metadata"]
+
+    def put(self, key, arrays, metadata=None):
+        """
+        Store a result and evict old entries if the cache is too large.
+
+        The entry is written to a temporary directory and renamed into place, so readers
+        never see a partial entry. If another process stores the same key first, its entry
+        is kept.
+
+        Parameters:
+            key (str): Key from cache_key.
+            arrays (dict): Arrays by name.
+            metadata (dict): JSON-serializable metadata stored with the arrays.
+        """
+        entry_path = self._entry_path(key)
+        temp_path = f"{entry_path}{TEMP_MARKER}{os.getpid()}"
+        os.makedirs(temp_path, exist_ok=True)
+
+        for index, array in enumerate(arrays.values()):
+            np.save(os.path.join(temp_path, f"{index}.npy"), np.asarray(array))
+        with open(os.path.join(temp_path, METADATA_FILENAME), "w") as json_file:
+            json.dump({"arrays": list(arrays), "metadata": metadata or {}, "created": time.time()}, json_file,
+                      default=lambda value: value.item())
+
+        try:
+            os.rename(temp_path, entry_path)
+        except OSError:
+            # Another worker stored the same result in the meantime (the rename fails with
+            # EEXIST or ENOTEMPTY): keep its entry
+            shutil.rmtree(temp_path, ignore_errors=True)
+            if not os.path.exists(os.path.join(entry_path, METADATA_FILENAME)):
+                raise
+        # The caller may still use the arrays of the entry just stored
+        self.evict(keep=key)
+
+    def get_or_compute(self, key, compute, metadata=None):
+        """
+        Return a cached result or compute and store it.
+
+        Parameters:
+            key (str): Key from cache_key.
+            compute (callable): Called without arguments on a miss; returns a dict of arrays.
+            metadata (dict): Metadata stored with a computed result.
+
+        Returns:
+            dict: Arrays by name (memory maps on a hit, the computed arrays on a miss).
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached[0]
+
+        arrays = compute()
+        self.put(key, arrays, metadata)
+        return arrays
+
+    def size(self):
+        """
+        Returns:
+            int: Total size of all cache entries in bytes.
+        """
+        return sum(_entry_size(entry_path) for entry_path in self._entries())
+
+    def evict(self, keep=None):
+        """
+        Remove the least recently used entries until the cache fits into max_bytes.
+
+        Entries still in use (see _remove_entry) are skipped and only the bytes actually
+        deleted count towards the limit.
+
+        Parameters:
+            keep (str): Key that is never evicted, e.g. the entry just stored.
+
+        Returns:
+            int: Number of removed entries.
+        """
+        # Files of earlier removals that could not be deleted yet
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if REMOVED_MARKER in name:
+                removed_path = self._entry_path(name)
+                shutil.rmtree(removed_path, ignore_errors=True)
+                total += _entry_size(removed_path) if os.path.exists(removed_path) else 0
+
+        entries = sorted(self._entries(), key=os.path.getmtime)
+        sizes = {entry_path: _entry_size(entry_path) for entry_path in entries}
+        total += sum(sizes.values())
+        keep_path = None if keep is None else self._entry_path(keep)
+
+        removed = 0
+        for entry_path in entries:
+            if total <= self.max_bytes:
+                break
+            if entry_path == keep_path:
+                continue
+            freed = self._remove_entry(entry_path)
+            if freed is None:
+                continue
+            total -= freed
+            removed += 1
+        return removed
+
+    def invalidate(self, source_path=None):
+        """
+        Remove cached results.
+
+        Parameters:
+            source_path (str): Only remove the results computed from this recording; None clears the cache.
+
+        Returns:
+            int: Number of removed entries.
+        """
+        source = os.path.abspath(source_path) if source_path is not None else None
+        removed = 0
+        for entry_path in self._entries():
+            if source is not None:
+                with open(os.path.join(entry_path, METADATA_FILENAME)) as json_file:
+                    if json.load(json_file)["metadata"].get("source") != source:
+                        continue
+            if self._remove_entry(entry_path) is not None:
+                removed += 1
+        return removed
+
+
+def load_roi_stacks_cached(cache, source_path, reference_frame_path, num_workers=None):
+    """
+    Detect the ROIs and load their stacks, reusing the decoded stacks of an earlier run.
+
+    Recording containers are already memory-mapped without decoding, so only PNG folders
+    are cached.
+
+    Parameters:
+        cache (LSCICache): Cache to use.
+        source_path (str): Recording container or PNG folder.
+        reference_frame_path (str): ROI reference image.
+        num_workers (int): Number of decoding threads on a cache miss.
+
+    Returns:
+        tuple: (rois, roi_stacks) as returned by detect_roi_coordinates and load_roi_stacks.
+    """
+    rois = detect_roi_coordinates(reference_frame_path)
+    if not os.path.isdir(source_path):
+        return rois, load_roi_stacks(source_path, rois, num_workers=num_workers)
+
+    key = cache_key("roi_stacks", source_path, reference_frame_path)
+    roi_stacks = cache.get_or_compute(key, lambda: load_roi_stacks(source_path, rois, num_workers=num_workers),
+                                      {"source": os.path.abspath(source_path), "rois": rois})
+    return rois, roi_stacks
+
+
+def calculate_lsci_sweep_cached(cache, source_path, reference_frame_path, roi_stacks, window_sizes,
+                                dtype=np.float32):
+    """
+    Cached version of calculate_roi_stacks_lsci_sweep.
+
+    Parameters:
+        cache (LSCICache): Cache to use.
+        source_path (str): Recording the ROI stacks come from.
+        reference_frame_path (str): ROI reference image the stacks were cropped with.
+        roi_stacks (dict): (T, h, w) stack for every ROI name (only read on a cache miss).
+        window_sizes (list): Temporal window sizes.
+        dtype (np.dtype): Computation dtype of the K maps.
+
+    Returns:
+        dict: {roi_name: {window_size: lsci_map}} like calculate_roi_stacks_lsci_sweep.
+    """
+    def compute():
+        lsci_maps = calculate_roi_stacks_lsci_sweep(roi_stacks, window_sizes, dtype=dtype)
+        return {f"{name}/{window_size}": lsci_map
+                for name, maps in lsci_maps.items() for window_size, lsci_map in maps.items()}
+
+    key = cache_key("lsci_sweep", source_path, reference_frame_path, mode="temporal",
+                    window_sizes=list(window_sizes), dtype=np.dtype(dtype).name)
+    arrays = cache.get_or_compute(key, compute, {"source": os.path.abspath(source_path)})
+
+    lsci_maps = {}
+    for array_name, lsci_map in arrays.items():
+        name, window_size = array_name.rsplit("/", 1)
+        lsci_maps.setdefault(name, {})[int(window_size)] = lsci_map
+    return lsci_maps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear the LSCI result cache.")
+    parser.add_argument("command", choices=["info", "invalidate", "evict"])
+    parser.add_argument("source", nargs="?", help="Only invalidate the results of this recording")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--max-gb", type=float, default=DEFAULT_MAX_CACHE_BYTES / 1024 ** 3,
+                        help="Size limit used by evict")
+    args = parser.parse_args()
+
+    cache = LSCICache(args.cache_dir, int(args.max_gb * 1024 ** 3))
+    if args.command == "invalidate":
+        print(f"Removed {cache.invalidate(args.source)} cache entries.")
+    elif args.command == "evict":
+        print(f"Removed {cache.evict()} cache entries.")
+    print(f"{args.cache_dir}: {len(cache._entries())} entries, {cache.size() / 1024 ** 2:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,509 @@
+import itertools
+import numpy as np
+
+
+# Small constant added to the local mean to avoid division by zero (same as calculate_temporal_lsci)
+EPSILON = 1e-6
+
+
+def contrast_from_sums(sum_x, sum_x2, num_window_frames, out=None, mean_buffer=None):
+    """
+    Compute K = std / mean from the window sums of x and x^2.
+
+    All intermediate results are written into out and mean_buffer, so no temporaries are
+    allocated when both are given.
+
+    Parameters:
+        sum_x (np.ndarray): Sum of the frames in the window.
+        sum_x2 (np.ndarray): Sum of the squared frames in the window.
+        num_window_frames (int): Number of frames in the window.
+        out (np.ndarray): Optional array to write the LSCI map into (its dtype sets the precision).
+        mean_buffer (np.ndarray): Optional scratch array of the same shape for the local mean.
+
+    Returns:
+        np.ndarray: LSCI map of the window (out if it was given).
+    """
+    if out is None:
+        out = np.empty(sum_x.shape, dtype=np.result_type(sum_x, np.float32))
+    if mean_buffer is None:
+        mean_buffer = np.empty(out.shape, dtype=out.dtype)
+
+    np.divide(sum_x, num_window_frames, out=mean_buffer)
+    # var = (sum(x^2) - sum(x) * mean) / n, which equals E[x^2] - E[x]^2
+    np.multiply(sum_x, mean_buffer, out=out)
+    np.subtract(sum_x2, out, out=out)
+    out /= num_window_frames
+    np.maximum(out, 0.0, out=out)  # guard against tiny negative rounding errors
+    np.sqrt(out, out=out)
+
+    mean_buffer += EPSILON
+    out /= mean_buffer
+    return out
+
+
+def average_lsci_maps(lsci_maps):
+    """
+    Average a stream of LSCI maps with a running mean instead of storing every map.
+
+    The maps may be the same reused buffer on every step; each map is consumed (and may be
+    overwritten) before the next one is requested.
+
+    Parameters:
+        lsci_maps (iterable): Iterable of LSCI maps of equal shape.
+
+    Returns:
+        tuple: (lsci_mean, num_maps) with lsci_mean None if the stream was empty.
+    """
+    lsci_mean = None
+    num_maps = 0
+    for K in lsci_maps:
+        num_maps += 1
+        if lsci_mean is None:
+            lsci_mean = K.copy()
+            continue
+
+        # mean += (K - mean) / n, computed in the map's own buffer
+        np.subtract(K, lsci_mean, out=K)
+        K /= num_maps
+        lsci_mean += K
+
+    return lsci_mean, num_maps
+
+
+def update_window_sums(sum_x, sum_x2, frame, frame_buffer, ufunc):
+    """
+    Add (ufunc=np.add) or remove (ufunc=np.subtract) a frame from the window sums in place.
+
+    Parameters:
+        sum_x (np.ndarray): Running sum of x, updated in place.
+        sum_x2 (np.ndarray): Running sum of x^2, updated in place.
+        frame (np.ndarray): Frame entering or leaving the window.
+        frame_buffer (np.ndarray): Scratch array of the sums' shape and dtype.
+        ufunc (np.ufunc): np.add or np.subtract.
+    """
+    np.copyto(frame_buffer, frame)
+    ufunc(sum_x, frame_buffer, out=sum_x)
+    np.multiply(frame_buffer, frame_buffer, out=frame_buffer)
+    ufunc(sum_x2, frame_buffer, out=sum_x2)
+
+
+def accumulator_dtype(frame_dtype, num_window_frames, dtype=np.float32):
+    """
+    Floating point type of the running window sums for frames of a given dtype.
+
+    Adding and removing frames is only free of rounding errors while every sum is an exact
+    integer in the accumulator, i.e. for integer frames whose largest square times the window
+    length fits the mantissa (uint8 frames in float32 up to 258 frames). Float frames, such as
+    calibrated ones, and wider integers would drift over a long stream, so they are summed in
+    float64.
+
+    Parameters:
+        frame_dtype (np.dtype): dtype of the frames.
+        num_window_frames (int): Number of frames in the window.
+        dtype (np.dtype): Floating point type requested for the maps.
+
+    Returns:
+        np.dtype: dtype if the sums stay exact in it, otherwise float64.
+    """
+    frame_dtype = np.dtype(frame_dtype)
+    dtype = np.dtype(dtype)
+    if frame_dtype.kind in "ui":
+        info = np.iinfo(frame_dtype)
+        max_square = max(abs(int(info.min)), int(info.max)) ** 2
+        if max_square * num_window_frames <= 2 ** (np.finfo(dtype).nmant + 1):
+            return dtype
+    return np.promote_types(dtype, np.float64)
+
+
+def _window_contrast(sum_x, sum_x2, num_window_frames, out, mean_buffer, k_buffer):
+    """
+    contrast_from_sums into out, going through k_buffer when the sums are wider than out.
+
+    Parameters:
+        sum_x (np.ndarray): Sum of the frames in the window.
+        sum_x2 (np.ndarray): Sum of the squared frames in the window.
+        num_window_frames (int): Number of frames in the window.
+        out (np.ndarray): Array the LSCI map is written into.
+        mean_buffer (np.ndarray): Scratch array of the sums' dtype.
+        k_buffer (np.ndarray): Scratch array of the sums' dtype, or None if out has it.
+
+    Returns:
+        np.ndarray: out.
+    """
+    if k_buffer is None:
+        return contrast_from_sums(sum_x, sum_x2, num_window_frames, out=out, mean_buffer=mean_buffer)
+    contrast_from_sums(sum_x, sum_x2, num_window_frames, out=k_buffer, mean_buffer=mean_buffer)
+    np.copyto(out, k_buffer, casting="same_kind")
+    return out
+
+
+def iter_temporal_lsci_maps(sequence, window_size=5, dtype=np.float32, out=None):
+    """
+    Yield the temporal LSCI map for every valid time index using running sums.
+
+    The window for time index t covers frames t - window_size // 2 to t + window_size // 2,
+    exactly like calculate_temporal_lsci. Instead of recomputing the mean and standard
+    deviation over the whole window, running sums of x and x^2 are updated with the frame
+    entering and the frame leaving the window, so every step costs O(H * W) regardless of
+    the window size. All arithmetic runs in preallocated buffers; the sums use dtype where
+    they stay exact (uint8 frames in float32) and float64 otherwise, see accumulator_dtype.
+
+    Parameters:
+        sequence (list or np.ndarray): List of 2D arrays or a (T, H, W) array of frames.
+        window_size (int): Number of frames in the temporal window.
+        dtype (np.dtype): Floating point type of the maps (np.float32 or np.float64).
+        out (np.ndarray): Optional buffer that every map is written into and yielded as;
+            by default a new array is yielded for every time index.
+
+    Yields:
+        np.ndarray: LSCI map (K = std / mean) for each valid time index t.
+    """
+    num_frames = len(sequence)
+    half_window = window_size // 2
+    num_window_frames = 2 * half_window + 1
+
+    if num_frames < num_window_frames:
+        return
+
+    shape = np.shape(sequence[0])
+    sum_dtype = accumulator_dtype(np.asarray(sequence[0]).dtype, num_window_frames, dtype)
+    sum_x = np.zeros(shape, dtype=sum_dtype)
+    sum_x2 = np.zeros(shape, dtype=sum_dtype)
+    frame_buffer = np.empty(shape, dtype=sum_dtype)
+    mean_buffer = np.empty(shape, dtype=sum_dtype)
+    k_buffer = np.empty(shape, dtype=sum_dtype) if sum_dtype != dtype else None
+
+    for i in range(num_window_frames):
+        update_window_sums(sum_x, sum_x2, sequence[i], frame_buffer, np.add)
+
+    for t in range(half_window, num_frames - half_window):
+        if t > half_window:
+            # Slide the window by one frame: add the newest, remove the oldest
+            update_window_sums(sum_x, sum_x2, sequence[t + half_window], frame_buffer, np.add)
+            update_window_sums(sum_x, sum_x2, sequence[t - half_window - 1], frame_buffer, np.subtract)
+
+        yield _window_contrast(sum_x, sum_x2, num_window_frames,
+                               out if out is not None else np.empty(shape, dtype=dtype), mean_buffer, k_buffer)
+
+
+def calculate_running_temporal_lsci(sequence, window_size=5, dtype=np.float32):
+    """
+    Calculate the average temporal LSCI map with the running-sum engine.
+
+    Produces the same result as averaging every per-t map of calculate_temporal_lsci, but
+    in O(T * H * W) time, without stacking the sequence into a second copy and without
+    keeping the per-t maps: every map is computed into one reused buffer and folded into a
+    running mean.
+
+    Parameters:
+        sequence (list or np.ndarray): List of 2D arrays or a (T, H, W) array of frames.
+        window_size (int): Number of frames in the temporal window.
+        dtype (np.dtype): Floating point type of the computation (np.float32 or np.float64).
+
+    Returns:
+        np.ndarray: Average LSCI map across all valid time indices.
+
+    Raises:
+        ValueError: If the sequence is shorter than the temporal window.
+    """
+    out = np.empty(np.shape(sequence[0]), dtype=dtype)
+    lsci_map, num_maps = average_lsci_maps(iter_temporal_lsci_maps(sequence, window_size, dtype=dtype, out=out))
+
+    if num_maps == 0:
+        raise ValueError(
+            f"Sequence has {len(sequence)} frames, fewer than the temporal window of {window_size}."
+        )
+
+    return lsci_map
+
+
+def crop_roi(frame, roi):
+    """
+    Crop a rectangular ROI out of a frame.
+
+    Parameters:
+        frame (np.ndarray): 2D frame (or (T, H, W) stack) to crop.
+        roi (dict): ROI with "x", "y", "w" and "h" keys as returned by detect_roi_coordinates.
+
+    Returns:
+        np.ndarray: View on the cropped region.
+    """
+    return frame[..., roi["y"]:roi["y"] + roi["h"], roi["x"]:roi["x"] + roi["w"]]
+
+
+def calculate_temporal_lsci_sweep(sequence, rois, window_sizes, dtype=np.float32):
+    """
+    Calculate average temporal LSCI maps for several ROIs and window sizes in one pass.
+
+    Each frame is visited once. For every ROI a ring buffer of cumulative sums of x and x^2
+    is kept, long enough for the largest window; the window sums for every window size are
+    then differences of two cumulative sums, so all window sizes share the same moments.
+
+    Parameters:
+        sequence (list or np.ndarray): List of 2D arrays or a (T, H, W) array of full frames.
+        rois (dict): ROIs by name, as returned by detect_roi_coordinates.
+        window_sizes (list): Window sizes (number of frames) to evaluate.
+        dtype (np.dtype): Floating point type of the contrast computation and the maps.
+
+    Returns:
+        dict: Average LSCI map for every ROI and window size, as {roi_name: {window_size: map}}.
+
+    Raises:
+        ValueError: If the sequence is shorter than the largest temporal window.
+    """
+    sources = {name: (sequence, roi) for name, roi in rois.items()}
+    return _temporal_lsci_sweep(sources, len(sequence), window_sizes, dtype)
+
+
+def calculate_roi_stacks_lsci_sweep(roi_stacks, window_sizes, dtype=np.float32):
+    """
+    Calculate average temporal LSCI maps for pre-cropped ROI stacks and several window sizes.
+
+    Same as calculate_temporal_lsci_sweep, but for the per-ROI (T, h, w) arrays returned by
+    frame_loader.load_roi_stacks_from_folder.
+
+    Parameters:
+        roi_stacks (dict): (T, h, w) frame stacks by ROI name.
+        window_sizes (list): Window sizes (number of frames) to evaluate.
+        dtype (np.dtype): Floating point type of the contrast computation and the maps.
+
+    Returns:
+        dict: Average LSCI map for every ROI and window size, as {roi_name: {window_size: map}}.
+
+    Raises:
+        ValueError: If the stacks are shorter than the largest temporal window.
+    """
+    sources = {name: (stack, None) for name, stack in roi_stacks.items()}
+    num_frames = min(len(stack) for stack in roi_stacks.values())
+    return _temporal_lsci_sweep(sources, num_frames, window_sizes, dtype)
+
+
+def _temporal_lsci_sweep(sources, num_frames, window_sizes, dtype):
+    """
+    Shared single-pass implementation of the multi-ROI, multi-window temporal LSCI sweep.
+
+    Parameters:
+        sources (dict): (sequence, roi) pairs by name; roi is None if the sequence is already cropped.
+        num_frames (int): Number of frames to process.
+        window_sizes (list): Window sizes (number of frames) to evaluate.
+        dtype (np.dtype): Floating point type of the contrast computation and the maps.
+
+    Returns:
+        dict: Average LSCI map for every source and window size, as {name: {window_size: map}}.
+    """
+    # Effective number of frames per window, matching calculate_temporal_lsci (2 * (w // 2) + 1)
+    window_frames = {window_size: 2 * (window_size // 2) + 1 for window_size in window_sizes}
+    max_window_frames = max(window_frames.values())
+
+    if num_frames < max_window_frames:
+        raise ValueError(
+            f"Sequence has {num_frames} frames, fewer than the temporal window of {max(window_sizes)}."
+        )
+
+    # Cumulative sums C[i] = sum of the first i frames, kept for the last max_window_frames + 1 indices.
+    # They grow with the frame count, so they stay in float64 to remain exact.
+    ring_length = max_window_frames + 1
+    cumulative = {}
+    buffers = {}
+    lsci_means = {}
+    for name, (sequence, roi) in sources.items():
+        frame_shape = tuple((roi["h"], roi["w"]) if roi is not None else np.shape(sequence[0]))
+        shape = (ring_length,) + frame_shape
+        cumulative[name] = (np.zeros(shape, dtype=np.float64), np.zeros(shape, dtype=np.float64))
+        # Scratch buffers: frame, window sums, LSCI map and local mean
+        buffers[name] = (
+            np.empty(frame_shape, dtype=np.float64),
+            np.empty(frame_shape, dtype=np.float64),
+            np.empty(frame_shape, dtype=np.float64),
+            np.empty(frame_shape, dtype=dtype),
+            np.empty(frame_shape, dtype=dtype),
+        )
+        lsci_means[name] = {window_size: np.zeros(frame_shape, dtype=dtype) for window_size in window_sizes}
+
+    for i in range(num_frames):
+        current = (i + 1) % ring_length
+        previous = i % ring_length
+
+        for name, (sequence, roi) in sources.items():
+            cum_x, cum_x2 = cumulative[name]
+            frame_buffer, window_x, window_x2, K, mean_buffer = buffers[name]
+
+            frame = np.asarray(sequence[i])
+            if roi is not None:
+                frame = crop_roi(frame, roi)
+            np.copyto(frame_buffer, frame)
+            np.add(cum_x[previous], frame_buffer, out=cum_x[current])
+            np.multiply(frame_buffer, frame_buffer, out=frame_buffer)
+            np.add(cum_x2[previous], frame_buffer, out=cum_x2[current])
+
+            for window_size, n in window_frames.items():
+                # The window ending at frame i is complete once n frames have been seen
+                if i + 1 < n:
+                    continue
+                start = (i + 1 - n) % ring_length
+                np.subtract(cum_x[current], cum_x[start], out=window_x)
+                np.subtract(cum_x2[current], cum_x2[start], out=window_x2)
+                contrast_from_sums(window_x, window_x2, n, out=K, mean_buffer=mean_buffer)
+
+                # Running mean over the valid time indices: mean += (K - mean) / count
+                lsci_mean = lsci_means[name][window_size]
+                K -= lsci_mean
+                K /= i + 2 - n
+                lsci_mean += K
+
+    return lsci_means
+
+
+def iter_streaming_temporal_lsci_maps(frames, window_size=5, dtype=np.float32, out=None):
+    """
+    Yield temporal LSCI maps from a stream of frames using a bounded ring buffer.
+
+    Only the last window_size frames are kept (in their original dtype), so peak memory is
+    O(window_size * H * W) no matter how long the stream is. The maps are identical to the
+    ones produced by iter_temporal_lsci_maps for the same frames; like there, the running
+    sums are only kept in dtype while they stay exact (see accumulator_dtype), so calibrated
+    float frames do not drift over a long stream.
+
+    Parameters:
+        frames (iterable): Iterable of 2D frames, e.g. from frame_loader.iter_frames_from_folder.
+        window_size (int): Number of frames in the temporal window.
+        dtype (np.dtype): Floating point type of the maps (np.float32 or np.float64).
+        out (np.ndarray): Optional buffer that every map is written into and yielded as;
+            by default a new array is yielded for every time index.
+
+    Yields:
+        np.ndarray: LSCI map (K = std / mean) for each valid time index t.
+    """
+    num_window_frames = 2 * (window_size // 2) + 1
+    ring = None
+
+    for i, frame in enumerate(frames):
+        if ring is None:
+            ring = np.empty((num_window_frames,) + frame.shape, dtype=frame.dtype)
+            sum_dtype = accumulator_dtype(frame.dtype, num_window_frames, dtype)
+            sum_x = np.zeros(frame.shape, dtype=sum_dtype)
+            sum_x2 = np.zeros(frame.shape, dtype=sum_dtype)
+            frame_buffer = np.empty(frame.shape, dtype=sum_dtype)
+            mean_buffer = np.empty(frame.shape, dtype=sum_dtype)
+            k_buffer = np.empty(frame.shape, dtype=sum_dtype) if sum_dtype != dtype else None
+
+        slot = i % num_window_frames
+        if i >= num_window_frames:
+            # The slot still holds the frame that leaves the window
+            update_window_sums(sum_x, sum_x2, ring[slot], frame_buffer, np.subtract)
+
+        ring[slot] = frame
+        update_window_sums(sum_x, sum_x2, ring[slot], frame_buffer, np.add)
+
+        if i + 1 >= num_window_frames:
+            yield _window_contrast(sum_x, sum_x2, num_window_frames,
+                                   out if out is not None else np.empty(frame.shape, dtype=dtype), mean_buffer,
+                                   k_buffer)
+
+
+def calculate_streaming_temporal_lsci(chunks, window_size=5, dtype=np.float32):
+    """
+    Calculate the average temporal LSCI map from chunks of frames.
+
+    Parameters:
+        chunks (iterable): Iterable of (n, H, W) frame blocks, e.g. from
+            frame_loader.iter_frame_chunks.
+        window_size (int): Number of frames in the temporal window.
+        dtype (np.dtype): Floating point type of the computation (np.float32 or np.float64).
+
+    Returns:
+        np.ndarray: Average LSCI map across all valid time indices.
+
+    Raises:
+        ValueError: If the stream is shorter than the temporal window.
+    """
+    chunks = iter(chunks)
+    first_chunk = next(chunks, None)
+    if first_chunk is None:
+        raise ValueError(f"Frame stream is shorter than the temporal window of {window_size}.")
+
+    frames = itertools.chain(first_chunk, (frame for chunk in chunks for frame in chunk))
+    out = np.empty(first_chunk.shape[1:], dtype=dtype)
+    lsci_map, num_maps = average_lsci_maps(iter_streaming_temporal_lsci_maps(frames, window_size, dtype=dtype, out=out))
+
+    if num_maps == 0:
+        raise ValueError(f"Frame stream is shorter than the temporal window of {window_size}.")
+
+    return lsci_map
+
+
+def calculate_flow_index(lsci_map, out=None):
+    """
+    Convert a K map into the flow index 1 / K^2.
+
+    Under the usual simplified speckle model the decorrelation rate, and with it the flow
+    speed, is proportional to 1 / K^2. K is clipped at EPSILON so that dark or saturated
+    pixels with K = 0 stay finite.
+
+    Parameters:
+        lsci_map (np.ndarray): Raw K map (not a rendered PNG).
+        out (np.ndarray): Optional float32 output buffer of the same shape.
+
+    Returns:
+        np.ndarray: float32 flow index map.
+    """
+    out = np.maximum(lsci_map, EPSILON, out=out, dtype=np.float32)
+    np.multiply(out, out, out=out)
+    return np.reciprocal(out, out=out)
+
+
+def calculate_roi_contrast_series(frames, rois, window_size=5, timestamps=None, dtype=np.float32):
+    """
+    Reduce a stream of frames to per-ROI temporal contrast time series.
+
+    For every valid time index the temporal K map of every ROI is computed with the streaming
+    ring-buffer engine and reduced on the fly to its mean K, median K and mean flow index
+    (1 / K^2), so no per-t maps are stored and memory stays constant however long the
+    recording is. All ROIs are processed in one pass over the frames.
+
+    Parameters:
+        frames (iterable): Iterable of 2D frames, e.g. frame_loader.iter_frames_from_folder or a
+            memory-mapped (T, H, W) recording.
+        rois (dict): ROIs by name, as returned by detect_roi_coordinates.
+        window_size (int): Number of frames in the temporal window.
+        timestamps (np.ndarray): Optional per-frame timestamps; defaults to the frame index.
+        dtype (np.dtype): Floating point type of the computation (np.float32 or np.float64).
+
+    Returns:
+        dict: "rois" (ROI names, the column order), "mean_k", "median_k" and "flow_index" as
+            (T', n_roi) float32 arrays, "timestamps" (T',) of the window centre frames and
+            "window_size", with T' = T - window_size + 1 (window_size rounded up to odd).
+    """
+    names = list(rois)
+    half_window = window_size // 2
+    streams = itertools.tee(frames, len(names))
+    # Each ROI runs its own ring-buffer engine; zip keeps them in lock step, so tee only ever
+    # holds the current frame
+    generators = [
+        iter_streaming_temporal_lsci_maps(map(crop_roi, stream, itertools.repeat(rois[name])), window_size,
+                                          dtype=dtype, out=np.empty((rois[name]["h"], rois[name]["w"]), dtype=dtype))
+        for name, stream in zip(names, streams)
+    ]
+
+    # (capacity, statistic, roi) table, doubled when full
+    values = np.empty((1024, 3, len(names)), dtype=np.float32)
+    num_maps = 0
+    for lsci_maps in zip(*generators):
+        if num_maps == len(values):
+            values = np.concatenate([values, np.empty_like(values)])
+        for column, K in enumerate(lsci_maps):
+            values[num_maps, 0, column] = K.mean()
+            # The map is scratch space: the median may reorder it and the flow index overwrite it
+            values[num_maps, 1, column] = np.median(K, overwrite_input=True)
+            values[num_maps, 2, column] = calculate_flow_index(K, out=K).mean()
+        num_maps += 1
+
+    centre_indices = np.arange(half_window, half_window + num_maps)
+    return {
+        "rois": names,
+        "mean_k": np.ascontiguousarray(values[:num_maps, 0]),
+        "median_k": np.ascontiguousarray(values[:num_maps, 1]),
+        "flow_index": np.ascontiguousarray(values[:num_maps, 2]),
+        "timestamps": np.asarray(timestamps)[centre_indices] if timestamps is not None else centre_indices,
+        "window_size": window_size,
+    }
@@ -0,0 +1,108 @@
+import os
+import json
+import numpy as np
+
+# K maps are stored as float32 .npy files (memory-mappable) with a JSON sidecar for the metadata
+LSCI_MAP_EXTENSION = ".npy"
+METADATA_EXTENSION = ".json"
+# Per-ROI contrast time series are small and stored as one compressed archive
+CONTRAST_SERIES_SUFFIX = "_series.npz"
+
+
+def save_lsci_map(lsci_map, output_path, **metadata):
+    """
+    Save a raw K map as float32 .npy with its metadata in a JSON sidecar.
+
+    Parameters:
+        lsci_map (np.ndarray): 2D K map.
+        output_path (str): Output path; LSCI_MAP_EXTENSION is appended if missing.
+        **metadata: JSON-serializable metadata, e.g. roi, window_size, kernel_size, mode, source.
+
+    Returns:
+        str: Path of the saved .npy file.
+    """
+    base_path = output_path[:-len(LSCI_MAP_EXTENSION)] if output_path.endswith(LSCI_MAP_EXTENSION) else output_path
+    map_path = base_path + LSCI_MAP_EXTENSION
+
+    lsci_map = np.asarray(lsci_map, dtype=np.float32)
+    np.save(map_path, lsci_map)
+
+    metadata = dict(metadata, shape=list(lsci_map.shape), dtype=str(lsci_map.dtype))
+    with open(base_path + METADATA_EXTENSION, "w") as json_file:
+        # NumPy scalars (e.g. ROI coordinates) are stored as plain numbers
+        json.dump(metadata, json_file, indent=4, default=lambda value: value.item())
+    return map_path
+
+
+def load_lsci_map(map_path):
+    """
+    Open a saved K map as a read-only memory map, together with its metadata.
+
+    Parameters:
+        map_path (str): Path of the .npy file.
+
+    Returns:
+        tuple: (lsci_map, metadata) with the (H, W) float32 memmap and the metadata dict
+            (empty if there is no sidecar).
+    """
+    lsci_map = np.load(map_path, mmap_mode="r")
+
+    metadata_path = os.path.splitext(map_path)[0] + METADATA_EXTENSION
+    metadata = {}
+    if os.path.exists(metadata_path):
+        with open(metadata_path) as json_file:
+            metadata = json.load(json_file)
+    return lsci_map, metadata
+
+
+def list_lsci_maps(folder_path):
+    """
+    List the saved K maps of a folder in sorted order.
+
+    Parameters:
+        folder_path (str): Folder with .npy K maps.
+
+    Returns:
+        list: Sorted list of .npy paths.
+    """
+    return [
+        os.path.join(folder_path, filename)
+        for filename in sorted(os.listdir(folder_path))
+        if filename.endswith(LSCI_MAP_EXTENSION)
+    ]
+
+
+def save_contrast_series(output_path, series):
+    """
+    Save per-ROI contrast time series from calculate_roi_contrast_series.
+
+    Parameters:
+        output_path (str): Output path; CONTRAST_SERIES_SUFFIX is appended if missing.
+        series (dict): Result of calculate_roi_contrast_series.
+
+    Returns:
+        str: Path of the saved archive.
+    """
+    if not output_path.endswith(CONTRAST_SERIES_SUFFIX):
+        output_path += CONTRAST_SERIES_SUFFIX
+    np.savez_compressed(output_path, rois=np.array(series["rois"]), mean_k=series["mean_k"],
+                        median_k=series["median_k"], flow_index=series["flow_index"],
+                        timestamps=series["timestamps"], window_size=series["window_size"])
+    return output_path
+
+
+def load_contrast_series(series_path):
+    """
+    Load per-ROI contrast time series saved with save_contrast_series.
+
+    Parameters:
+        series_path (str): Path of the archive.
+
+    Returns:
+        dict: Same layout as the result of calculate_roi_contrast_series.
+    """
+    with np.load(series_path) as archive:
+        series = {key: archive[key] for key in archive.files}
+    series["rois"] = series["rois"].tolist()
+    series["window_size"] = int(series["window_size"])
+    return series
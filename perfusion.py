@@ -1,9 +1,14 @@
 import cv2
 import numpy as np
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import os
 import glob
 import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from flow_quantification import correlation_time_map, lookup_exposure_time
+from lsci_engine import calculate_flow_index, crop_roi
+from lsci_map_io import CONTRAST_SERIES_SUFFIX, list_lsci_maps, load_contrast_series, load_lsci_map, save_lsci_map
 
 def load_image(image_path):
     """
@@ -23,6 +28,128 @@ def load_image(image_path):
         raise FileNotFoundError(f"Image not found at {image_path}. Please check the path.")
     return image
 
+def load_images(image_paths, num_workers=None):
+    """
+    Load several images as grayscale arrays, decoding them in a thread pool.
+
+    Parameters:
+        image_paths (list): Paths to the images.
+        num_workers (int): Number of decoding threads (None uses one per CPU core).
+
+    Returns:
+        list: Grayscale image arrays in the order of image_paths.
+
+    Raises:
+        FileNotFoundError: If an image cannot be loaded.
+    """
+    with ThreadPoolExecutor(max_workers=num_workers or os.cpu_count()) as executor:
+        return list(executor.map(load_image, image_paths))
+
+def perfusion_metrics_dtype(roi_names=(), integer_total=False):
+    """
+    Structured dtype of the batch perfusion metrics.
+
+    Parameters:
+        roi_names (list): Names of the ROIs with their own "<name>_mean" and "<name>_std" fields.
+        integer_total (bool): Store "total" as int64 (integer images) instead of float64.
+
+    Returns:
+        np.dtype: Structured dtype with "mean", "total", "std" and the per-ROI fields.
+    """
+    fields = [("mean", np.float64), ("total", np.int64 if integer_total else np.float64), ("std", np.float64)]
+    for name in roi_names:
+        fields += [(f"{name}_mean", np.float64), (f"{name}_std", np.float64)]
+    return np.dtype(fields)
+
+def _stack_moments(stack):
+    # Sum and sum of squares along the pixel axis of an (N, P) stack, accumulated in float64
+    sums = stack.sum(axis=1, dtype=np.float64)
+    sums_sq = np.einsum("ij,ij->i", stack, stack, dtype=np.float64, casting="unsafe")
+    return sums, sums_sq
+
+def _image_moments(images, block_size=1 << 15, group_size=1 << 24):
+    """
+    Pixel count, sum and sum of squares of every image in a single pass over the data.
+
+    A (N, H, W) array and maps of a common shape are reduced as (N, P) stacks with one sum and
+    one einsum call along the pixel axis; lists are stacked in groups of at most group_size
+    pixels to bound the copy. Maps of different shapes fall back to streaming each image in
+    blocks through one small float64 scratch buffer, so no full-size float64 copy is allocated.
+    """
+    if isinstance(images, np.ndarray) and images.ndim >= 2:
+        if images[0].size == 0:
+            raise ValueError("Perfusion metrics need non-empty images.")
+        sums, sums_sq = _stack_moments(images.reshape(len(images), -1))
+        return np.full(len(images), images[0].size, dtype=np.int64), sums, sums_sq
+
+    counts = np.array([np.size(image) for image in images], dtype=np.int64)
+    if not counts.all():
+        raise ValueError("Perfusion metrics need non-empty images.")
+    sums = np.zeros(len(images), dtype=np.float64)
+    sums_sq = np.zeros(len(images), dtype=np.float64)
+
+    if len({np.shape(image) for image in images}) == 1:
+        images_per_group = max(1, group_size // int(counts[0]))
+        for start in range(0, len(images), images_per_group):
+            stack = np.stack([np.ravel(image) for image in images[start:start + images_per_group]])
+            sums[start:start + len(stack)], sums_sq[start:start + len(stack)] = _stack_moments(stack)
+        return counts, sums, sums_sq
+
+    scratch = np.empty(block_size, dtype=np.float64)
+    for i, image in enumerate(images):
+        values = np.ravel(image)
+        for start in range(0, values.size, block_size):
+            block = scratch[:min(block_size, values.size - start)]
+            block[...] = values[start:start + block_size]
+            sums[i] += block.sum()
+            np.multiply(block, block, out=block)
+            sums_sq[i] += block.sum()
+
+    return counts, sums, sums_sq
+
+def calculate_perfusion_batch(images, rois=None):
+    """
+    Calculate the perfusion metrics of many LSCI maps at once.
+
+    Mean, total and standard deviation (population) come from the first two moments of every
+    map, computed in a single pass over the data instead of three passes per map. The maps
+    may have different shapes; a (N, H, W) stack or float K maps straight from the LSCI engine
+    work as well as decoded PNGs.
+
+    Parameters:
+        images (list or np.ndarray): LSCI maps (2D arrays) or a (N, H, W) stack.
+        rois (dict): Optional ROIs by name, as returned by detect_roi_coordinates, evaluated in every map.
+
+    Returns:
+        np.ndarray: (N,) structured array with the fields of perfusion_metrics_dtype (empty
+            without maps).
+
+    Raises:
+        ValueError: If a map or ROI crop is empty.
+    """
+    if not (isinstance(images, np.ndarray) and images.ndim >= 2):
+        images = list(images)
+    rois = rois or {}
+    integer_total = len(images) > 0 and all(np.issubdtype(image.dtype, np.integer) for image in images)
+    metrics = np.empty(len(images), dtype=perfusion_metrics_dtype(rois, integer_total))
+    if len(images) == 0:
+        return metrics
+
+    counts, sums, sums_sq = _image_moments(images)
+    mean = sums / counts
+    metrics["mean"] = mean
+    metrics["total"] = sums
+    metrics["std"] = np.sqrt(np.maximum(sums_sq / counts - mean * mean, 0.0))
+
+    for name, roi in rois.items():
+        crops = crop_roi(images, roi) if isinstance(images, np.ndarray) else [crop_roi(image, roi) for image in images]
+        counts, sums, sums_sq = _image_moments(crops)
+        mean = sums / counts
+        metrics[f"{name}_mean"] = mean
+        metrics[f"{name}_std"] = np.sqrt(np.maximum(sums_sq / counts - mean * mean, 0.0))
+
+    return metrics
+
 def calculate_perfusion(image):
     """
     Calculate perfusion metrics (mean, total, and standard deviation) for the entire image.
@@ -33,38 +160,41 @@ def calculate_perfusion(image):
     Returns:
         dict: Dictionary containing "mean", "total", and "std" perfusion values.
     """
-    mean_perfusion = np.mean(image)
-    total_perfusion = np.sum(image)
-    std_perfusion = np.std(image)
-
-    return {
-        "mean": mean_perfusion,
-        "total": total_perfusion,
-        "std": std_perfusion
-    }
+    metrics = calculate_perfusion_batch([image])[0]
+    return dict(zip(metrics.dtype.names, metrics.tolist()))
 
-def visualize_perfusion(image, metrics, output_path1="perfusion_mean_std.png", output_path2="perfusion_total.png"):
+def visualize_perfusion(image, metrics, output_path1="perfusion_mean_std.png", output_path2="perfusion_total.png",
+                        figures=None):
     """
     Create visual representations of the perfusion metrics.
 
+    The charts are drawn on standalone Agg figures instead of pyplot figures, so nothing is
+    kept alive after saving and no display is needed.
+
     Parameters:
         image (ndarray): The original grayscale image.
         metrics (dict): Calculated perfusion metrics.
         output_path1 (str): Path to save the mean and std visualization.
         output_path2 (str): Path to save the total perfusion visualization.
+        figures (tuple): Optional (mean/std, total) figures to draw on; they are cleared and reused.
     """
+    if figures is None:
+        figures = (Figure(figsize=(8, 5)), Figure(figsize=(8, 5)))
+    figure1, figure2 = figures
+
     # --- Plot 1: Mean and Std ---
-    plt.figure(figsize=(8, 5))
-    plt.title("Perfusion Metrics (Mean and Std)")
+    figure1.clear()
+    ax = figure1.subplots()
+    ax.set_title("Perfusion Metrics (Mean and Std)")
     labels = ["Mean", "Std"]
     values = [metrics["mean"], metrics["std"]]
-    bar_container = plt.bar(labels, values, color="green")
-    plt.ylabel("Values")
+    bar_container = ax.bar(labels, values, color="green")
+    ax.set_ylabel("Values")
 
     # Annotate bar values
     for rect, val in zip(bar_container, values):
         height = rect.get_height()
-        plt.text(
+        ax.text(
             rect.get_x() + rect.get_width() / 2,
             height,
             f"{val:.2f}",
@@ -73,18 +203,18 @@ def visualize_perfusion(image, metrics, output_path1="perfusion_mean_std.png", o
             fontsize=9
         )
 
-    plt.tight_layout()
-    plt.savefig(output_path1, dpi=150)
-    #plt.show()
+    figure1.tight_layout()
+    figure1.savefig(output_path1, dpi=150)
 
     # --- Plot 2: Total Perfusion ---
-    plt.figure(figsize=(8, 5))
-    plt.title("Perfusion Metric (Total)")
-    plt.bar(["Total"], [metrics["total"]], color="blue")
-    plt.ylabel("Values")
+    figure2.clear()
+    ax = figure2.subplots()
+    ax.set_title("Perfusion Metric (Total)")
+    ax.bar(["Total"], [metrics["total"]], color="blue")
+    ax.set_ylabel("Values")
 
     # Annotate the bar value
-    plt.text(
+    ax.text(
         0,
         metrics["total"],
         f"{metrics['total']:.2f}",
@@ -93,52 +223,315 @@ def visualize_perfusion(image, metrics, output_path1="perfusion_mean_std.png", o
         fontsize=9
     )
 
-    plt.tight_layout()
-    plt.savefig(output_path2, dpi=150)
-    #plt.show()
+    figure2.tight_layout()
+    figure2.savefig(output_path2, dpi=150)
+
+# Figures reused by all charts rendered in one worker process
+_worker_figures = None
+
+def _render_perfusion_task(task):
+    global _worker_figures
+    if _worker_figures is None:
+        _worker_figures = (Figure(figsize=(8, 5)), Figure(figsize=(8, 5)))
+    metrics, output_path1, output_path2 = task
+    visualize_perfusion(None, metrics, output_path1, output_path2, _worker_figures)
+
+def render_perfusion_charts(perfusion_metrics_dict, output_folder, num_workers=None):
+    """
+    Render the per-file mean/std and total charts in a process pool.
+
+    Every worker draws all its charts on the same two figures, so memory stays flat no matter
+    how many files are rendered.
+
+    Parameters:
+        perfusion_metrics_dict (dict): Perfusion metrics by image filename.
+        output_folder (str): Folder the charts are saved to.
+        num_workers (int): Number of rendering processes (None uses one per CPU core, 1 renders serially).
+    """
+    tasks = [
+        (metrics, os.path.join(output_folder, f"output_mean_std_{filename}"),
+         os.path.join(output_folder, f"output_total_{filename}"))
+        for filename, metrics in perfusion_metrics_dict.items()
+    ]
+    num_workers = num_workers or os.cpu_count()
+
+    if num_workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            _render_perfusion_task(task)
+        return
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        chunk_size = max(1, len(tasks) // (4 * num_workers))
+        # Consume the results so rendering errors are raised here
+        list(executor.map(_render_perfusion_task, tasks, chunksize=chunk_size))
+
+def plot_perfusion_summary(perfusion_metrics_dict, output_path="perfusion_summary.png"):
+    """
+    Plot the metrics of all files in one chart: mean with std error bars and the total perfusion.
+
+    Parameters:
+        perfusion_metrics_dict (dict): Perfusion metrics by image filename.
+        output_path (str): Path to save the summary chart.
+    """
+    filenames = list(perfusion_metrics_dict)
+    means = [perfusion_metrics_dict[filename]["mean"] for filename in filenames]
+    stds = [perfusion_metrics_dict[filename]["std"] for filename in filenames]
+    totals = [perfusion_metrics_dict[filename]["total"] for filename in filenames]
+    positions = np.arange(len(filenames))
+
+    figure = Figure(figsize=(max(8, 0.5 * len(filenames)), 8))
+    ax_mean, ax_total = figure.subplots(2, 1, sharex=True)
+
+    ax_mean.set_title("Perfusion Metrics (Mean and Std)")
+    ax_mean.bar(positions, means, yerr=stds, capsize=3, color="green")
+    ax_mean.set_ylabel("Mean")
+
+    ax_total.set_title("Perfusion Metric (Total)")
+    ax_total.bar(positions, totals, color="blue")
+    ax_total.set_ylabel("Total")
+    ax_total.set_xticks(positions)
+    ax_total.set_xticklabels(filenames, rotation=90, fontsize=8)
+
+    figure.tight_layout()
+    figure.savefig(output_path, dpi=150)
+
+def process_images_in_folder(folder_path, output_folder, rois=None, plots="summary", num_workers=None):
+    """
+    Calculate the perfusion metrics of all PNG maps in a folder and save them as JSON.
+
+    Parameters:
+        folder_path (str): Folder with the LSCI maps.
+        output_folder (str): Folder for perfusion_metrics.json and the charts.
+        rois (dict): Optional ROIs by name with their own mean and std.
+        plots (str): None for metrics only, "summary" for one combined chart, or "per_file" for
+            the mean/std and total charts of every file.
+        num_workers (int): Number of processes rendering the per-file charts.
 
-def process_images_in_folder(folder_path, output_folder):
+    Returns:
+        dict: Perfusion metrics by image filename.
+    """
     # Get all image files in the folder
-    image_files = glob.glob(os.path.join(folder_path, "*.png"))  # Adjust the extension if needed
+    image_files = sorted(glob.glob(os.path.join(folder_path, "*.png")))  # Adjust the extension if needed
+    filenames = [os.path.basename(image_path) for image_path in image_files]
 
-    # Dictionary to store perfusion metrics for each image
-    perfusion_metrics_dict = {}
+    # 1. Load all images and 2. calculate the perfusion metrics of all of them in one batch
+    metrics = calculate_perfusion_batch(load_images(image_files), rois)
+
+    # Store the perfusion metrics (as standard Python types) for each image
+    perfusion_metrics_dict = {
+        filename: dict(zip(metrics.dtype.names, row))
+        for filename, row in zip(filenames, metrics.tolist())
+    }
+
+    # Save the perfusion metrics dictionary to a JSON file
+    os.makedirs(output_folder, exist_ok=True)
+    json_output_path = os.path.join(output_folder, "perfusion_metrics.json")
+    with open(json_output_path, 'w') as json_file:
+        json.dump(perfusion_metrics_dict, json_file, indent=4)
+
+    # 3. Visualize and save results (optional, separate stage)
+    if plots == "summary":
+        plot_perfusion_summary(perfusion_metrics_dict, os.path.join(output_folder, "perfusion_summary.png"))
+    elif plots == "per_file":
+        render_perfusion_charts(perfusion_metrics_dict, output_folder, num_workers)
+    elif plots is not None:
+        raise ValueError(f"Unknown plots option {plots!r}; use None, 'summary' or 'per_file'.")
 
-    for image_path in image_files:
-        # Extract the filename from the image path
-        filename = os.path.basename(image_path)
-        # Create output paths based on the input image filename
-        output_path1 = os.path.join(output_folder, f"output_mean_std_{filename}")
-        output_path2 = os.path.join(output_folder, f"output_total_{filename}")
+    return perfusion_metrics_dict
 
-        # Process each image
-        print(f"Processing {image_path} with output {output_path1} and {output_path2}")
-        # 1. Load the image
-        lsci_image = load_image(image_path)
+def process_lsci_maps_in_folder(folder_path, output_folder, rois=None, plots="summary", num_workers=None,
+                                beta=1.0, save_flow_maps=True):
+    """
+    Calculate the perfusion metrics of the raw K maps saved by the LSCI scripts.
+
+    The float32 .npy maps are memory-mapped instead of decoded. Next to mean, total and std
+    of K, the mean and std of the flow index 1 / K^2 are computed; the ROI and window
+    metadata of every map is copied into perfusion_metrics.json.
 
-        # 2. Calculate perfusion metrics
-        perfusion_metrics = calculate_perfusion(lsci_image)
+    For maps whose exposure time is known (from the metadata or the camera name in the file
+    name, see lookup_exposure_time), K is also inverted to the correlation time tau_c with the
+    lookup table of flow_quantification.py. The relative correlation time is given against
+    the mean tau_c of all maps of the same exposure time; NaN pixels are left out of these
+    metrics.
 
-        # Convert NumPy data types to standard Python data types
-        perfusion_metrics = {k: (v.tolist() if isinstance(v, np.ndarray) else int(v) if isinstance(v, np.integer) else v)
-                             for k, v in perfusion_metrics.items()}
+    Parameters:
+        folder_path (str): Folder with .npy K maps and their JSON metadata.
+        output_folder (str): Folder for perfusion_metrics.json and the charts.
+        rois (dict): Optional ROIs by name (in map coordinates) with their own mean and std.
+        plots (str): None for metrics only, "summary" for one combined chart, or "per_file" for
+            the mean/std and total charts of every map.
+        num_workers (int): Number of processes rendering the per-file charts.
+        beta (float): Coherence factor of the optical setup for the correlation time.
+        save_flow_maps (bool): Save the relative correlation time and flow index (T / tau_c)
+            maps as .npy files in output_folder.
 
-        # Store the perfusion metrics in the dictionary
+    Returns:
+        dict: Perfusion metrics by map filename.
+    """
+    map_paths = list_lsci_maps(folder_path)
+    filenames = [os.path.basename(map_path) for map_path in map_paths]
+    lsci_maps, map_metadata = zip(*[load_lsci_map(map_path) for map_path in map_paths]) if map_paths else ((), ())
+
+    metrics = calculate_perfusion_batch(lsci_maps, rois)
+    flow_metrics = calculate_perfusion_batch([calculate_flow_index(lsci_map) for lsci_map in lsci_maps])
+
+    perfusion_metrics_dict = {}
+    for filename, row, flow_row, metadata in zip(filenames, metrics.tolist(), flow_metrics.tolist(), map_metadata):
+        perfusion_metrics = dict(zip(metrics.dtype.names, row))
+        perfusion_metrics["flow_index_mean"] = flow_row[0]
+        perfusion_metrics["flow_index_std"] = flow_row[2]
+        perfusion_metrics["metadata"] = metadata
         perfusion_metrics_dict[filename] = perfusion_metrics
 
-        # 3. Visualize and save results
-        visualize_perfusion(lsci_image, perfusion_metrics, output_path1, output_path2)
+    os.makedirs(output_folder, exist_ok=True)
+
+    # Correlation times of the maps with a known exposure time
+    exposure_times = [lookup_exposure_time(metadata, filename) for filename, metadata in zip(filenames, map_metadata)]
+    correlation_times = {
+        filename: correlation_time_map(lsci_map, exposure_time, beta)
+        for filename, lsci_map, exposure_time in zip(filenames, lsci_maps, exposure_times)
+        if exposure_time is not None
+    }
+    references = {}
+    for filename, exposure_time in zip(filenames, exposure_times):
+        if exposure_time is not None:
+            references.setdefault(exposure_time, []).append(np.nanmean(correlation_times[filename], dtype=np.float64))
+    references = {exposure_time: float(np.mean(means)) for exposure_time, means in references.items()}
+
+    for filename, exposure_time in zip(filenames, exposure_times):
+        if exposure_time is None:
+            continue
+        correlation_time = correlation_times[filename]
+        relative_correlation_time = correlation_time / np.float32(references[exposure_time])
+        flow_index = np.float32(exposure_time) / correlation_time
+        perfusion_metrics_dict[filename].update(
+            exposure_time_us=exposure_time,
+            correlation_time_mean_us=float(np.nanmean(correlation_time, dtype=np.float64)),
+            correlation_time_std_us=float(np.nanstd(correlation_time, dtype=np.float64)),
+            relative_correlation_time_mean=float(np.nanmean(relative_correlation_time, dtype=np.float64)),
+            tc_flow_index_mean=float(np.nanmean(flow_index, dtype=np.float64)),
+            tc_flow_index_std=float(np.nanstd(flow_index, dtype=np.float64)),
+        )
+        if save_flow_maps:
+            base_path = os.path.join(output_folder, os.path.splitext(filename)[0])
+            save_lsci_map(relative_correlation_time, base_path + "_relative_correlation_time",
+                          exposure_time=exposure_time, beta=beta, reference_correlation_time=references[exposure_time])
+            save_lsci_map(flow_index, base_path + "_tc_flow_index", exposure_time=exposure_time, beta=beta)
 
     # Save the perfusion metrics dictionary to a JSON file
     json_output_path = os.path.join(output_folder, "perfusion_metrics.json")
     with open(json_output_path, 'w') as json_file:
         json.dump(perfusion_metrics_dict, json_file, indent=4)
 
+    # Visualize and save results (optional, separate stage); chart names need an image extension
+    chart_metrics = {os.path.splitext(filename)[0] + ".png": metrics
+                     for filename, metrics in perfusion_metrics_dict.items()}
+    if plots == "summary":
+        plot_perfusion_summary(chart_metrics, os.path.join(output_folder, "perfusion_summary.png"))
+    elif plots == "per_file":
+        render_perfusion_charts(chart_metrics, output_folder, num_workers)
+    elif plots is not None:
+        raise ValueError(f"Unknown plots option {plots!r}; use None, 'summary' or 'per_file'.")
+
+    return perfusion_metrics_dict
+
+def calculate_series_perfusion(series, baseline_samples=None):
+    """
+    Summarize per-ROI contrast time series from calculate_roi_contrast_series.
+
+    Parameters:
+        series (dict): Result of calculate_roi_contrast_series (or load_contrast_series).
+        baseline_samples (int): Number of leading samples forming the baseline of the relative
+            flow; None uses the whole series.
+
+    Returns:
+        dict: Metrics by ROI name: mean and std over time of the mean K and the flow index,
+            the mean median K, and the minimum and maximum flow index relative to the baseline.
+    """
+    mean_k = series["mean_k"].astype(np.float64)
+    flow_index = series["flow_index"].astype(np.float64)
+    baseline = flow_index[:baseline_samples].mean(axis=0)
+    relative_flow = flow_index / baseline
+
+    return {
+        name: {
+            "mean": float(mean_k[:, column].mean()),
+            "std": float(mean_k[:, column].std()),
+            "median_k_mean": float(series["median_k"][:, column].mean(dtype=np.float64)),
+            "flow_index_mean": float(flow_index[:, column].mean()),
+            "flow_index_std": float(flow_index[:, column].std()),
+            "relative_flow_min": float(relative_flow[:, column].min()),
+            "relative_flow_max": float(relative_flow[:, column].max()),
+            "num_samples": int(len(mean_k)),
+        }
+        for column, name in enumerate(series["rois"])
+    }
+
+def plot_contrast_series(series, output_path="perfusion_time_series.png"):
+    """
+    Plot the mean K and the flow index of every ROI over time.
+
+    Parameters:
+        series (dict): Result of calculate_roi_contrast_series (or load_contrast_series).
+        output_path (str): Path to save the chart.
+    """
+    figure = Figure(figsize=(10, 6))
+    ax_k, ax_flow = figure.subplots(2, 1, sharex=True)
+    for column, name in enumerate(series["rois"]):
+        # The blue and red ROIs keep their colours; other ROIs use the default colour cycle
+        color = name if name in ("blue", "red") else None
+        ax_k.plot(series["timestamps"], series["mean_k"][:, column], label=name, color=color)
+        ax_flow.plot(series["timestamps"], series["flow_index"][:, column], label=name, color=color)
+
+    ax_k.set_title(f"Temporal LSCI per ROI (Window Size {series['window_size']})")
+    ax_k.set_ylabel("Mean K")
+    ax_k.legend()
+    ax_flow.set_ylabel("Flow index (1/K²)")
+    ax_flow.set_xlabel("Time")
+
+    figure.tight_layout()
+    figure.savefig(output_path, dpi=150)
+
+def process_contrast_series(series_path, output_folder, baseline_samples=None, plots=True):
+    """
+    Calculate the perfusion metrics of saved per-ROI contrast time series.
+
+    Parameters:
+        series_path (str): Archive saved with save_contrast_series.
+        output_folder (str): Folder for the JSON metrics and the chart.
+        baseline_samples (int): Number of leading samples forming the baseline of the relative flow.
+        plots (bool): Save the time series chart.
+
+    Returns:
+        dict: Metrics by ROI name, see calculate_series_perfusion.
+    """
+    series = load_contrast_series(series_path)
+    metrics = calculate_series_perfusion(series, baseline_samples)
+
+    name = os.path.basename(series_path)[:-len(CONTRAST_SERIES_SUFFIX)]
+    os.makedirs(output_folder, exist_ok=True)
+    with open(os.path.join(output_folder, f"{name}_perfusion_metrics.json"), 'w') as json_file:
+        json.dump(metrics, json_file, indent=4)
+    if plots:
+        plot_contrast_series(series, os.path.join(output_folder, f"{name}_time_series.png"))
+    return metrics
+
 def main():
     # Replace with your actual folder paths
     input_folder_path = r"LSCI_outputs"
     output_folder_path = r"LSCI_outputs_perfusion_processed"
-    process_images_in_folder(input_folder_path, output_folder_path)
+    # None (metrics only), "summary" (one combined chart) or "per_file" (charts rendered in parallel)
+    plots = "summary"
+    # Per-ROI contrast time series saved by LSCI_convertion.py
+    for series_path in glob.glob(os.path.join(input_folder_path, "*" + CONTRAST_SERIES_SUFFIX)):
+        process_contrast_series(series_path, output_folder_path, plots=plots is not None)
+
+    if list_lsci_maps(input_folder_path):
+        # Raw float32 K maps saved by the LSCI scripts
+        process_lsci_maps_in_folder(input_folder_path, output_folder_path, plots=plots)
+    else:
+        # Older outputs only have the rendered PNG maps
+        process_images_in_folder(input_folder_path, output_folder_path, plots=plots)
 
 if __name__ == "__main__":
     main()
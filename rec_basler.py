@@ -1,83 +1,54 @@
 # USING BASLER
 
-from pypylon import pylon
-import os
 from datetime import datetime
-import cv2
-import numpy as np
 
-# Get the current timestamp
-timestamp = datetime.now().strftime("%H_%M_%S")
+from acquisition import BaslerCamera, record
+from live_preview import LivePreview
+from LSCI_convertion import detect_roi_coordinates
 
-# Use the timestamp as the folder name
-folder_name = f"Basler_{timestamp}"
 
-# Create folder with camera name and timestamp as name
-os.mkdir(folder_name)
+def basler_png_filename(index, metadata):
+    # "<index>_<host time>.png", as the recordings have always been named
+    img_timestamp_string = datetime.fromtimestamp(metadata[2] / 1e9).strftime('%H_%M_%S_%f')
+    return f"{index}_{img_timestamp_string}.png"
 
-camera = pylon.InstantCamera(pylon.TlFactory.GetInstance().CreateFirstDevice())
-camera.Open()
-#camera.TriggerDelay.SetValue(0)
-#camera.TriggerSelector.SetValue("FrameBurstStart")
-#camera.TriggerSource.SetValue("Line4")
-#camera.TriggerMode.SetValue("On")
-#camera.TriggerActivation.SetValue('RisingEdge')
-#camera.AcquisitionFrameRateEnable.SetValue(True)
-#camera.AcquisitionFrameRateAbs.SetValue(200.0)
 
-camera.PixelFormat.Value = "Mono8"
-camera.AcquisitionFrameRate.Value = 100
-camera.AcquisitionFrameRateEnable.Value = True
-camera.ExposureTime.Value = 6500
-camera.Gain.Value = 32
-camera.DigitalShift.Value = 1
-camera.BinningHorizontal.Value = 2
-camera.BinningVertical.Value = 2
-camera.BinningHorizontalMode.Value = "Average"
-camera.BinningVerticalMode.Value = "Average"
-camera.Width.Value = 1000
-camera.Height.Value = 768
+def main():
+    # Save all frames into one recording container instead of one PNG per frame
+    save_as_container = True
+    # PNG encoding threads (the container is written by a single thread)
+    num_png_writers = 4
+    # Live LSCI preview saved to live_preview.png with the mean K in the ROIs of the reference frame
+    live_preview = False
+    preview_reference_frame_path = r"ROI_refrences\BASLER_initial_roi.png"
+    numberOfImagesToGrab = 3000
 
-# demonstrate some feature access
-# new_width = camera.Width.Value - camera.Width.Inc
-# if new_width >= camera.Width.Min:
-#    camera.Width.Value = new_width
+    # Use the camera name and the current time as the recording name
+    folder_name = f"Basler_{datetime.now().strftime('%H_%M_%S')}"
 
-numberOfImagesToGrab = 3000
-camera.StartGrabbingMax(numberOfImagesToGrab)
+    camera = BaslerCamera(height=768, width=1000, frame_rate=100, exposure_time=6500, gain=32, binning=2,
+                          digital_shift=1)
 
-# img_count = 0
-img_timestamp = []
-img_array = []
-while camera.IsGrabbing():
-    grabResult = camera.RetrieveResult(5000, pylon.TimeoutHandling_ThrowException)
+    preview = None
+    if live_preview:
+        preview = LivePreview(detect_roi_coordinates(preview_reference_frame_path), mode="temporal",
+                              output_path="live_preview.png",
+                              on_update=lambda lsci_map, roi_means: print(f"Live mean K: {roi_means}"))
 
-    if grabResult.GrabSucceeded():
-        img_timestamp_string = datetime.now().strftime('%H_%M_%S_%f') # + "_" + datetime.now().microsecond // 1000:03d
-        img_timestamp.append(img_timestamp_string) #(f"{img}_{datetime.now.microsecond // 1000:03d}")
-        # Access the image data.
-        #print("SizeX: ", grabResult.Width)
-        #print("SizeY: ", grabResult.Height)
-        #img = np.copy(grabResult.Array)
-        img_array.append(grabResult.Array.copy())
-        #print(f"Gray value of first pixel: {img[0, 0]}")
-        #print(f"Timestamp: {img_timestamp[-1]} \n")
-        #filename = f"{folder_name}/{img_timestamp_string}.png"
-        #cv2.imwrite(filename, grabResult.Array.copy())
+    # Frames are copied into a preallocated (numberOfImagesToGrab, H, W) buffer and saved by
+    # background writers while the camera is still grabbing
+    with camera:
+        stats = record(camera, folder_name, num_frames=numberOfImagesToGrab, save_as_container=save_as_container,
+                       write_buffer_frames=numberOfImagesToGrab, num_png_writers=num_png_writers,
+                       png_filename=basler_png_filename, preview=preview)
+    print("Recording done!")
 
-        #img_count += 1
+    if preview is not None:
+        preview.close()
 
-    grabResult.Release()
+    print(f"Images saved! {stats['written']} of {stats['frames']} frames written to '{stats['output_path']}', "
+          f"{stats['dropped']} dropped, {stats['write_errors']} write errors.")
 
-print("Recording done!")
 
-for i in range(len(img_array)):
-    filename = f"{folder_name}/{i}_{img_timestamp[i]}.png"
-    cv2.imwrite(filename, img_array[i][:,:])
-    #print(img_array[i][:,:])
-    #print("\n")
-    #(img_array[i]).Save(pylon.ImageFileFormat_Png, filename)
-
-camera.Close()
-
-print("Images saved!")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+import os
+import re
+import json
+import argparse
+from datetime import datetime
+import numpy as np
+import cv2
+
+
+# File layout: MAGIC | JSON header padded to HEADER_SIZE | uint8 frame payload (T, H, W) | int64 timestamp table
+MAGIC = b"LSCIREC1"
+HEADER_SIZE = 4096
+RECORDING_EXTENSION = ".lsci"
+# Marks a timestamp that is not known (e.g. PNG frames without a timestamp in their name)
+INVALID_TIMESTAMP = -1
+# Columns of the per-frame metadata table filled by the recorders: camera frame ID, camera
+# timestamp in ticks of camera_tick_frequency, and host time in nanoseconds
+FRAME_METADATA_FIELDS = ("frame_id", "camera_timestamp", "host_time_ns")
+# Name of the metadata table saved next to the frames of a PNG recording folder
+FRAME_METADATA_FILENAME = "frame_metadata.npy"
+# Initial rows of a RecordingWriter timestamp table when the frame count is not known
+TIMESTAMP_TABLE_FRAMES = 1024
+
+
+def allocate_frame_metadata(num_frames):
+    """
+    Preallocate a per-frame metadata table with FRAME_METADATA_FIELDS columns.
+
+    Parameters:
+        num_frames (int): Number of frames the table can hold.
+
+    Returns:
+        np.ndarray: (num_frames, 3) int64 array filled with INVALID_TIMESTAMP.
+    """
+    return np.full((num_frames, len(FRAME_METADATA_FIELDS)), INVALID_TIMESTAMP, dtype=np.int64)
+
+
+class RecordingWriter:
+    """
+    Write frames into a single-file raw recording container.
+
+    The container holds a fixed-size JSON header (shape, dtype, frame rate, exposure, gain),
+    the frames as one contiguous uint8 payload and a per-frame int64 timestamp table, so it
+    can be opened with np.memmap without decoding anything. The timestamp table has one column
+    per entry of timestamp_fields.
+
+    Parameters:
+        path (str): Path of the container file to create.
+        height (int): Frame height in pixels.
+        width (int): Frame width in pixels.
+        frame_rate (float): Acquisition frame rate in frames per second.
+        exposure_time (float): Exposure time in microseconds.
+        gain (float): Camera gain.
+        camera (str): Name of the camera the frames were recorded with.
+        timestamp_fields (tuple): Names of the timestamp table columns, e.g. FRAME_METADATA_FIELDS.
+        camera_tick_frequency (float): Ticks per second of the camera timestamp, if recorded.
+        expected_frames (int): Number of frames the timestamp table is preallocated for; it
+            doubles whenever more frames are written.
+    """
+
+    def __init__(self, path, height, width, frame_rate=None, exposure_time=None, gain=None, camera=None,
+                 timestamp_fields=("host_time_ns",), camera_tick_frequency=None, expected_frames=None):
+        self.path = path
+        self.height = height
+        self.width = width
+        self.timestamp_fields = list(timestamp_fields)
+        self.metadata = {
+            "frame_rate": frame_rate,
+            "exposure_time": exposure_time,
+            "gain": gain,
+            "camera": camera,
+            "camera_tick_frequency": camera_tick_frequency,
+        }
+        self.num_frames = 0
+        self.timestamps = np.empty((max(expected_frames or TIMESTAMP_TABLE_FRAMES, 1), len(self.timestamp_fields)),
+                                   dtype=np.int64)
+
+        self._file = open(path, "wb")
+        self._write_header()
+
+    def _write_header(self, timestamps_offset=None):
+        header = {
+            "version": 1,
+            "shape": [self.num_frames, self.height, self.width],
+            "dtype": "uint8",
+            "timestamp_fields": self.timestamp_fields,
+            "timestamps_offset": timestamps_offset,
+            **self.metadata,
+        }
+        encoded = json.dumps(header).encode("utf-8")
+        if len(MAGIC) + len(encoded) > HEADER_SIZE:
+            raise ValueError("Recording header does not fit into the reserved header size.")
+
+        self._file.seek(0)
+        self._file.write(MAGIC + encoded.ljust(HEADER_SIZE - len(MAGIC), b" "))
+
+    def write_frame(self, frame, timestamp_ns=INVALID_TIMESTAMP):
+        """
+        Append a frame to the recording.
+
+        Parameters:
+            frame (np.ndarray): 2D uint8 frame of shape (height, width).
+            timestamp_ns (int or sequence): Acquisition time of the frame in nanoseconds, or one
+                value per entry of timestamp_fields.
+        """
+        if frame.shape != (self.height, self.width):
+            raise ValueError(f"Frame shape {frame.shape} does not match the recording shape {(self.height, self.width)}.")
+
+        self._file.write(np.ascontiguousarray(frame, dtype=np.uint8).tobytes())
+        if self.num_frames == len(self.timestamps):
+            self.timestamps = np.concatenate([self.timestamps, np.empty_like(self.timestamps)])
+        # A single value fills every column
+        self.timestamps[self.num_frames] = timestamp_ns
+        self.num_frames += 1
+
+    def close(self):
+        """
+        Write the timestamp table and the final header, then close the file.
+        """
+        if self._file.closed:
+            return
+
+        timestamps_offset = self._file.tell()
+        self._file.write(self.timestamps[:self.num_frames].tobytes())
+        self._write_header(timestamps_offset)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_recording_header(path):
+    """
+    Read the JSON header of a recording container.
+
+    Parameters:
+        path (str): Path to the container file.
+
+    Returns:
+        dict: Header with shape, dtype, acquisition settings and table offsets.
+
+    Raises:
+        ValueError: If the file is not a recording container.
+    """
+    with open(path, "rb") as file:
+        raw = file.read(HEADER_SIZE)
+
+    if not raw.startswith(MAGIC):
+        raise ValueError(f"{path} is not a recording container.")
+
+    return json.loads(raw[len(MAGIC):].decode("utf-8"))
+
+
+def load_recording(path):
+    """
+    Open a recording container as a zero-copy memory map.
+
+    Parameters:
+        path (str): Path to the container file.
+
+    Returns:
+        tuple: (frames, timestamps, header) with frames a read-only (T, H, W) uint8 np.memmap,
+            timestamps a (T, n_fields) int64 array with the header's timestamp_fields as columns
+            (also for a single field) and header the metadata dict.
+    """
+    header = read_recording_header(path)
+    shape = tuple(header["shape"])
+
+    frames = np.memmap(path, dtype=header["dtype"], mode="r", offset=HEADER_SIZE, shape=shape)
+
+    num_fields = len(header["timestamp_fields"])
+    with open(path, "rb") as file:
+        file.seek(header["timestamps_offset"])
+        timestamps = np.fromfile(file, dtype=np.int64, count=shape[0] * num_fields).reshape(shape[0], num_fields)
+
+    return frames, timestamps, header
+
+
+def frame_sort_key(filename):
+    """
+    Sort key ordering PNG frames by their frame number instead of lexicographically.
+
+    The first number in the file name is the frame number ("12_10_31_05_123456.png" from
+    rec_basler.py, "frame_0012.png"), so unpadded names keep frame_2 before frame_10. Every
+    loader sorts frames with this key, so a folder has the same frame order everywhere.
+
+    Parameters:
+        filename (str): File name of the frame.
+
+    Returns:
+        tuple: (frame number, or -1 without a number; file name).
+    """
+    match = re.search(r"\d+", os.path.basename(filename))
+    return (int(match.group()) if match else -1, os.path.basename(filename))
+
+
+def _timestamp_from_filename(filename):
+    # rec_basler.py names frames "{i}_{%H_%M_%S_%f}.png"; return nanoseconds since midnight
+    match = re.search(r"_(\d{2}_\d{2}_\d{2}_\d{6})\.png$", filename)
+    if match is None:
+        return INVALID_TIMESTAMP
+
+    time = datetime.strptime(match.group(1), "%H_%M_%S_%f")
+    microseconds = ((time.hour * 60 + time.minute) * 60 + time.second) * 1_000_000 + time.microsecond
+    return microseconds * 1000
+
+
+def convert_png_folder_to_recording(folder_path, output_path, frame_rate=None, exposure_time=None, gain=None,
+                                    camera=None):
+    """
+    Convert a folder of PNG frames written by rec_basler.py or rec_ids.py into a container.
+
+    Frames are ordered by their frame number. If the folder contains a FRAME_METADATA_FILENAME
+    table written by the recorders (one row per frame) it becomes the timestamp table;
+    otherwise timestamps are taken from the Basler file names when present and marked as
+    INVALID_TIMESTAMP.
+
+    Parameters:
+        folder_path (str): Path to the folder containing PNG frames.
+        output_path (str): Path of the container file to create.
+        frame_rate (float): Acquisition frame rate in frames per second.
+        exposure_time (float): Exposure time in microseconds.
+        gain (float): Camera gain.
+        camera (str): Name of the camera the frames were recorded with.
+
+    Returns:
+        int: Number of frames written.
+
+    Raises:
+        FileNotFoundError: If the folder has no PNG frames.
+        ValueError: If the metadata table does not have one row per frame.
+    """
+    filenames = sorted((f for f in os.listdir(folder_path) if f.endswith(".png")), key=frame_sort_key)
+    if not filenames:
+        raise FileNotFoundError(f"No PNG frames found in {folder_path}.")
+
+    metadata_path = os.path.join(folder_path, FRAME_METADATA_FILENAME)
+    frame_metadata = np.load(metadata_path) if os.path.exists(metadata_path) else None
+    if frame_metadata is not None and len(frame_metadata) != len(filenames):
+        raise ValueError(f"{metadata_path} has {len(frame_metadata)} rows for {len(filenames)} frames; "
+                         "the timestamps do not line up with the frames.")
+    timestamp_fields = FRAME_METADATA_FIELDS if frame_metadata is not None else ("host_time_ns",)
+
+    writer = None
+    try:
+        for index, filename in enumerate(filenames):
+            frame_path = os.path.join(folder_path, filename)
+            frame = cv2.imread(frame_path, cv2.IMREAD_GRAYSCALE)
+            if frame is None:
+                raise FileNotFoundError(f"Frame not found at {frame_path}. Please check the path.")
+
+            if writer is None:
+                writer = RecordingWriter(output_path, frame.shape[0], frame.shape[1], frame_rate=frame_rate,
+                                         exposure_time=exposure_time, gain=gain, camera=camera,
+                                         timestamp_fields=timestamp_fields, expected_frames=len(filenames))
+            if frame_metadata is not None:
+                # The recorders save one row per written frame, in frame order
+                writer.write_frame(frame, frame_metadata[index])
+            else:
+                writer.write_frame(frame, _timestamp_from_filename(filename))
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return len(filenames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a folder of PNG frames into a recording container.")
+    parser.add_argument("folder_path", help="Folder containing the PNG frames")
+    parser.add_argument("output_path", nargs="?", help=f"Output file (default: <folder>{RECORDING_EXTENSION})")
+    parser.add_argument("--frame-rate", type=float, help="Acquisition frame rate in frames per second")
+    parser.add_argument("--exposure-time", type=float, help="Exposure time in microseconds")
+    parser.add_argument("--gain", type=float, help="Camera gain")
+    parser.add_argument("--camera", help="Camera name (e.g. BASLER or IDS)")
+    args = parser.parse_args()
+
+    output_path = args.output_path or os.path.normpath(args.folder_path) + RECORDING_EXTENSION
+    num_frames = convert_png_folder_to_recording(args.folder_path, output_path, frame_rate=args.frame_rate,
+                                                 exposure_time=args.exposure_time, gain=args.gain,
+                                                 camera=args.camera)
+    print(f"Converted {num_frames} frames to {output_path}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import os
+import numpy as np
+import cv2
+
+from frame_loader import iter_frames
+from frame_timing import frame_times, load_frame_metadata
+from lsci_engine import calculate_flow_index, iter_streaming_temporal_lsci_maps
+from lsci_map_io import save_contrast_series
+
+# Colour channels of the ROI markers in the reference frames (BGR order)
+ROI_COLORS = {"blue": 0, "red": 2}
+
+
+def detect_roi_labels(frame_path, min_area=100):
+    """
+    Detect every blue and red ROI of any shape in a reference frame as one label image.
+
+    Unlike detect_roi_coordinates, all contours above min_area are kept and filled with their
+    exact outline instead of a bounding rectangle. A single ROI per colour is named after the
+    colour ("blue", "red"); several ROIs of one colour are numbered ("blue_1", "blue_2", ...).
+
+    Parameters:
+        frame_path (str): Path to the reference frame (PNG file).
+        min_area (float): Minimum contour area in pixels.
+
+    Returns:
+        tuple: (labels, names) with labels an (H, W) int32 image (0 = background, i = names[i - 1]).
+
+    Raises:
+        FileNotFoundError: If the reference frame cannot be loaded.
+    """
+    image = cv2.imread(frame_path)
+    if image is None:
+        raise FileNotFoundError(f"Reference frame not found at {frame_path}. Please check the path.")
+
+    labels = np.zeros(image.shape[:2], dtype=np.int32)
+    names = []
+    for color, channel in ROI_COLORS.items():
+        _, thresh = cv2.threshold(image[:, :, channel], 200, 255, cv2.THRESH_BINARY)
+        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        contours = [c for c in contours if cv2.contourArea(c) > min_area]
+        for i, contour in enumerate(contours):
+            names.append(color if len(contours) == 1 else f"{color}_{i + 1}")
+            cv2.drawContours(labels, [contour], -1, len(names), thickness=cv2.FILLED)
+    return labels, names
+
+
+def load_roi_labels(mask_path):
+    """
+    Load ROIs from a mask file: an integer .npy label image or a grayscale PNG.
+
+    Every distinct non-zero value is one ROI; the values are renumbered to 1..n and the ROIs
+    are named "roi_<value>". A grayscale mask saved as a colour PNG (equal B, G and R, any
+    alpha channel ignored) is reduced to one channel.
+
+    Parameters:
+        mask_path (str): Path to the mask file.
+
+    Returns:
+        tuple: (labels, names) like detect_roi_labels.
+
+    Raises:
+        FileNotFoundError: If the mask cannot be loaded.
+        ValueError: If the mask is not a single-channel image.
+    """
+    if mask_path.endswith(".npy"):
+        mask = np.load(mask_path)
+    else:
+        mask = cv2.imread(mask_path, cv2.IMREAD_UNCHANGED)
+        if mask is None:
+            raise FileNotFoundError(f"Mask not found at {mask_path}. Please check the path.")
+        if mask.ndim == 3 and (mask[:, :, :3] == mask[:, :, :1]).all():
+            mask = mask[:, :, 0]
+
+    if mask.ndim != 2:
+        raise ValueError(f"Mask {mask_path} has shape {mask.shape}; expected a single-channel label image "
+                         f"(use detect_roi_labels for colour reference frames).")
+
+    values, labels = np.unique(mask, return_inverse=True)
+    labels = labels.reshape(mask.shape).astype(np.int32)
+    if values[0] != 0:
+        # No background pixels: shift so that label 0 stays unused
+        labels += 1
+    else:
+        values = values[1:]
+    return labels, [f"roi_{value}" for value in values]
+
+
+def labels_from_rois(rois, shape):
+    """
+    Convert rectangular ROIs (as returned by detect_roi_coordinates) into a label image.
+
+    Parameters:
+        rois (dict): ROIs by name.
+        shape (tuple): (height, width) of the frames.
+
+    Returns:
+        tuple: (labels, names) like detect_roi_labels; later ROIs win where ROIs overlap.
+    """
+    labels = np.zeros(shape, dtype=np.int32)
+    for label, roi in enumerate(rois.values(), start=1):
+        labels[roi["y"]:roi["y"] + roi["h"], roi["x"]:roi["x"] + roi["w"]] = label
+    return labels, list(rois)
+
+
+def calculate_label_contrast_series(frames, labels, names, window_size=5, timestamps=None, dtype=np.float32):
+    """
+    Per-ROI temporal contrast time series for ROIs given as a label image.
+
+    The streaming engine computes the K map over the bounding box of all ROIs; every per-t map
+    is reduced right away with np.bincount to the mean K and mean flow index of every label.
+    The median needs the values themselves, so the labelled pixels are sorted by label once
+    and every map is gathered in that order. The result has the layout of
+    calculate_roi_contrast_series, so perfusion.py consumes it the same way.
+
+    Parameters:
+        frames (iterable): Iterable of 2D frames.
+        labels (np.ndarray): Integer label image of the frame shape (0 = background).
+        names (list): ROI names for labels 1..len(names).
+        window_size (int): Number of frames in the temporal window.
+        timestamps (np.ndarray): Optional per-frame timestamps; defaults to the frame index.
+        dtype (np.dtype): Floating point type of the computation (np.float32 or np.float64).
+
+    Returns:
+        dict: "rois", "mean_k", "median_k", "flow_index" ((T', n_roi) float32), "timestamps"
+            and "window_size", like calculate_roi_contrast_series.
+
+    Raises:
+        ValueError: If the label image has no ROI pixels, its labels do not match names or a
+            ROI has no pixels.
+    """
+    num_labels = len(names)
+    if not labels.any():
+        raise ValueError("The label image has no ROI pixels.")
+    if labels.min() < 0 or labels.max() != num_labels:
+        raise ValueError(f"The label image has labels {labels.min()}..{labels.max()} but {num_labels} ROI names; "
+                         f"expected labels 0..{num_labels}.")
+    ys, xs = np.nonzero(labels)
+    y0, y1, x0, x1 = ys.min(), ys.max() + 1, xs.min(), xs.max() + 1
+    box_labels = np.ascontiguousarray(labels[y0:y1, x0:x1]).ravel()
+
+    counts = np.bincount(box_labels, minlength=num_labels + 1)[1:]
+    if not counts.all():
+        raise ValueError(f"ROIs without pixels: {[name for name, count in zip(names, counts) if not count]}.")
+    # Pixel indices sorted by label and the start of every label's segment, for the medians
+    order = np.argsort(box_labels, kind="stable")[len(box_labels) - counts.sum():]
+    starts = np.concatenate([[0], np.cumsum(counts)])
+    gathered = np.empty(counts.sum(), dtype=dtype)
+
+    half_window = window_size // 2
+    out = np.empty((y1 - y0, x1 - x0), dtype=dtype)
+    maps = iter_streaming_temporal_lsci_maps((frame[y0:y1, x0:x1] for frame in frames), window_size, dtype=dtype,
+                                             out=out)
+
+    values = np.empty((1024, 3, num_labels), dtype=np.float32)
+    num_maps = 0
+    for K in maps:
+        if num_maps == len(values):
+            values = np.concatenate([values, np.empty_like(values)])
+        flat_k = K.ravel()
+        values[num_maps, 0] = np.bincount(box_labels, weights=flat_k, minlength=num_labels + 1)[1:] / counts
+
+        np.take(flat_k, order, out=gathered)
+        for i in range(num_labels):
+            # Segments of the gathered buffer are scratch space for the in-place median
+            values[num_maps, 1, i] = np.median(gathered[starts[i]:starts[i + 1]], overwrite_input=True)
+
+        flow_index = calculate_flow_index(K, out=K).ravel()
+        values[num_maps, 2] = np.bincount(box_labels, weights=flow_index, minlength=num_labels + 1)[1:] / counts
+        num_maps += 1
+
+    centre_indices = np.arange(half_window, half_window + num_maps)
+    return {
+        "rois": list(names),
+        "mean_k": np.ascontiguousarray(values[:num_maps, 0]),
+        "median_k": np.ascontiguousarray(values[:num_maps, 1]),
+        "flow_index": np.ascontiguousarray(values[:num_maps, 2]),
+        "timestamps": np.asarray(timestamps)[centre_indices] if timestamps is not None else centre_indices,
+        "window_size": window_size,
+    }
+
+
+# Main script
+if __name__ == "__main__":
+    # Folder containing PNG frames
+    folder_path = r"BASLER\Basler_16_53_05_Heat_Cold"  # Folder path to frames taken (or a .lsci recording container)
+    reference_frame_path = r"ROI_refrences\BASLER_initial_roi.png"  # Path to the reference frame
+    mask_path = None  # Optional mask file (.npy label image or PNG) used instead of the reference frame
+    window_size = 5
+
+    # Every ROI of any shape, as one label image
+    if mask_path is not None:
+        labels, names = load_roi_labels(mask_path)
+    else:
+        labels, names = detect_roi_labels(reference_frame_path)
+    print(f"ROIs: {', '.join(f'{name} ({count} px)' for name, count in zip(names, np.bincount(labels.ravel())[1:]))}")
+
+    # Seconds since the first frame (camera, else host timestamps), or frame indices without complete metadata
+    metadata, camera_tick_frequency = load_frame_metadata(folder_path)
+    timestamps = None if metadata is None else frame_times(metadata, camera_tick_frequency)[0]
+
+    series = calculate_label_contrast_series(iter_frames(folder_path), labels, names, window_size, timestamps)
+    series_output = save_contrast_series(os.path.join("LSCI_outputs", "initial_labelled_basler"), series)
+    print(f"ROI contrast time series saved as {series_output}.")
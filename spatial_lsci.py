@@ -0,0 +1,182 @@
+import os
+import numpy as np
+import cv2
+
+from frame_loader import load_roi_stacks
+from lsci_engine import EPSILON, average_lsci_maps, contrast_from_sums
+from LSCI_convertion import detect_roi_coordinates, visualize_and_save_lsci_map
+from lsci_map_io import save_lsci_map
+
+
+def calculate_spatial_lsci(frame, kernel_size=7, out=None):
+    """
+    Calculate the spatial LSCI map K = std / mean over an N x N window of a single frame.
+
+    The local mean and the local mean of squares come from cv2.boxFilter, which uses running
+    sums, so the cost does not depend on kernel_size. The frame is shifted by its global mean
+    before squaring to keep the float32 variance accurate. Windows that reach past the border
+    are mirrored at it, edge pixel included (cv2.BORDER_REFLECT, np.pad mode "symmetric"), so
+    the map keeps the frame's shape.
+
+    Parameters:
+        frame (np.ndarray): 2D frame.
+        kernel_size (int): Side length N of the spatial window in pixels.
+        out (np.ndarray): Optional float32 array of the frame's shape to write the map into.
+
+    Returns:
+        np.ndarray: float32 LSCI map with the same shape as the frame.
+    """
+    centered = frame.astype(np.float32)
+    frame_mean = float(centered.mean())
+    centered -= frame_mean
+
+    kernel = (kernel_size, kernel_size)
+    local_mean = cv2.boxFilter(centered, -1, kernel, normalize=True, borderType=cv2.BORDER_REFLECT)
+    np.multiply(centered, centered, out=centered)
+    local_var = cv2.boxFilter(centered, -1, kernel, normalize=True, borderType=cv2.BORDER_REFLECT)
+
+    # var = E[x^2] - E[x]^2 (shift invariant), then restore the mean
+    local_var -= local_mean * local_mean
+    np.maximum(local_var, 0.0, out=local_var)
+    local_mean += frame_mean + EPSILON
+
+    if out is None:
+        out = np.empty(frame.shape, dtype=np.float32)
+    np.sqrt(local_var, out=out)
+    out /= local_mean
+    return out
+
+
+def calculate_spatial_lsci_stack(stack, kernel_size=7, average=True):
+    """
+    Calculate spatial LSCI maps for every frame of a (T, H, W) stack.
+
+    Parameters:
+        stack (np.ndarray): (T, H, W) frames, e.g. an ROI stack from frame_loader.load_roi_stacks.
+        kernel_size (int): Side length N of the spatial window in pixels.
+        average (bool): Return the average map over all frames instead of one map per frame.
+
+    Returns:
+        np.ndarray: Average (H, W) float32 LSCI map, or a (T, H, W) float32 stack of maps.
+    """
+    if average:
+        lsci_sum = np.zeros(stack.shape[1:], dtype=np.float64)
+        lsci_map = np.empty(stack.shape[1:], dtype=np.float32)
+        for frame in stack:
+            lsci_sum += calculate_spatial_lsci(frame, kernel_size, out=lsci_map)
+        return (lsci_sum / len(stack)).astype(np.float32)
+
+    lsci_maps = np.empty(stack.shape, dtype=np.float32)
+    for t, frame in enumerate(stack):
+        calculate_spatial_lsci(frame, kernel_size, out=lsci_maps[t])
+    return lsci_maps
+
+
+def iter_spatiotemporal_lsci_maps(frames, kernel_size=5, window_size=5):
+    """
+    Yield spatio-temporal LSCI maps over an N x N x W box window from a stream of frames.
+
+    The window sums are separable: every frame is box-summed over N x N with cv2.boxFilter,
+    and those per-frame sums are accumulated over the last W frames with running sums and a
+    ring buffer. The cost is linear in the number of voxels and memory is bounded by the ring
+    buffer of W per-frame sums, independent of the stream length. The window for time index t
+    covers frames t - window_size // 2 to t + window_size // 2, like calculate_temporal_lsci;
+    spatially it is mirrored at the frame border like in calculate_spatial_lsci.
+
+    Parameters:
+        frames (iterable): Iterable of 2D frames, e.g. the rows of an ROI stack.
+        kernel_size (int): Side length N of the spatial window in pixels.
+        window_size (int): Number of frames W in the temporal window.
+
+    Yields:
+        np.ndarray: LSCI map (K = std / mean over the N x N x W voxels) for each valid time index t.
+    """
+    num_window_frames = 2 * (window_size // 2) + 1
+    num_voxels = kernel_size * kernel_size * num_window_frames
+    kernel = (kernel_size, kernel_size)
+
+    ring_x = ring_x2 = None
+    for i, frame in enumerate(frames):
+        frame = frame.astype(np.float64)
+        if ring_x is None:
+            ring_x = np.zeros((num_window_frames,) + frame.shape, dtype=np.float64)
+            ring_x2 = np.zeros((num_window_frames,) + frame.shape, dtype=np.float64)
+            sum_x = np.zeros(frame.shape, dtype=np.float64)
+            sum_x2 = np.zeros(frame.shape, dtype=np.float64)
+
+        # Remove the spatial sums of the frame leaving the window (zeros while the window fills)
+        slot = i % num_window_frames
+        sum_x -= ring_x[slot]
+        sum_x2 -= ring_x2[slot]
+
+        # Spatial N x N sums of x and x^2 for the entering frame
+        cv2.boxFilter(frame, -1, kernel, dst=ring_x[slot], normalize=False, borderType=cv2.BORDER_REFLECT)
+        cv2.boxFilter(frame * frame, -1, kernel, dst=ring_x2[slot], normalize=False, borderType=cv2.BORDER_REFLECT)
+        sum_x += ring_x[slot]
+        sum_x2 += ring_x2[slot]
+
+        if i + 1 >= num_window_frames:
+            yield contrast_from_sums(sum_x, sum_x2, num_voxels)
+
+
+def calculate_spatiotemporal_lsci(sequence, kernel_size=5, window_size=5):
+    """
+    Calculate the average spatio-temporal LSCI map over an N x N x W box window.
+
+    Parameters:
+        sequence (iterable): List of 2D arrays, a (T, H, W) ROI stack or any iterable of frames.
+        kernel_size (int): Side length N of the spatial window in pixels.
+        window_size (int): Number of frames W in the temporal window.
+
+    Returns:
+        np.ndarray: Average LSCI map across all valid time indices.
+
+    Raises:
+        ValueError: If the sequence is shorter than the temporal window.
+    """
+    lsci_map, num_maps = average_lsci_maps(iter_spatiotemporal_lsci_maps(sequence, kernel_size, window_size))
+
+    if num_maps == 0:
+        raise ValueError(f"Sequence is shorter than the temporal window of {window_size}.")
+
+    return lsci_map
+
+
+# Main script
+if __name__ == "__main__":
+    # Folder containing PNG frames
+    folder_path = r"BASLER\Basler_16_53_05_Heat_Cold"  # Folder path to frames taken (or a .lsci recording container)
+    reference_frame_path = r"ROI_refrences\BASLER_initial_roi.png"  # Path to the reference frame
+    kernel_size = 7  # Spatial window N x N in pixels
+    window_size = 5  # Temporal window in frames (spatio-temporal mode only)
+    mode = "spatial"  # "spatial" or "spatiotemporal" (N x N x W window, better SNR at low frame counts)
+
+    # Detect ROI coordinates from the reference frame
+    rois = detect_roi_coordinates(reference_frame_path)
+
+    # Load only the blue and red ROIs
+    roi_stacks = load_roi_stacks(folder_path, rois)
+
+    # Calculate LSCI maps for blue and red ROIs, averaged over all frames
+    if mode == "spatiotemporal":
+        blue_lsci_map = calculate_spatiotemporal_lsci(roi_stacks["blue"], kernel_size, window_size)
+        red_lsci_map = calculate_spatiotemporal_lsci(roi_stacks["red"], kernel_size, window_size)
+        window_label = f"{kernel_size}x{kernel_size}x{window_size}"
+    else:
+        blue_lsci_map = calculate_spatial_lsci_stack(roi_stacks["blue"], kernel_size=kernel_size)
+        red_lsci_map = calculate_spatial_lsci_stack(roi_stacks["red"], kernel_size=kernel_size)
+        window_label = f"{kernel_size}x{kernel_size}"
+
+    blue_output = f"LSCI_outputs/blue_output_initial_{mode}_basler.png"
+    red_output = f"LSCI_outputs/red_output_initial_{mode}_basler.png"
+
+    # Save the LSCI maps as PNGs
+    visualize_and_save_lsci_map(blue_lsci_map, blue_output, title=f"Blue ROI {mode.capitalize()} LSCI Map ({window_label})")
+    visualize_and_save_lsci_map(red_lsci_map, red_output, title=f"Red ROI {mode.capitalize()} LSCI Map ({window_label})")
+
+    # Save the raw float32 K maps with their ROI and window for perfusion.py
+    for name, lsci_map, output in (("blue", blue_lsci_map, blue_output), ("red", red_lsci_map, red_output)):
+        save_lsci_map(lsci_map, os.path.splitext(output)[0], roi=rois[name], mode=mode, kernel_size=kernel_size,
+                      window_size=window_size if mode == "spatiotemporal" else None, source=folder_path)
+
+    print(f"LSCI maps saved as {blue_output} and {red_output}.")
@@ -0,0 +1,80 @@
+import numpy as np
+import cv2
+
+
+class SpeckleGenerator:
+    """
+    Generate synthetic laser speckle frames with spatially varying decorrelation.
+
+    A complex Gaussian field is low-pass filtered to set the speckle grain size and evolves
+    as an AR(1) process, E_s = rho * E_(s-1) + sqrt(1 - rho^2) * noise, in exposure_steps
+    sub-steps per frame. The frame integrates |E|^2 over those sub-steps like a camera
+    exposure: a rho close to 1 gives static, fully developed speckle, while the lower rho
+    inside the flow regions blurs the speckle and lowers the spatial contrast, mimicking
+    perfusion. The intensity is scaled to the requested mean and clipped to uint8.
+
+    Parameters:
+        height (int): Frame height in pixels.
+        width (int): Frame width in pixels.
+        mean_intensity (float): Mean grey value of the frames.
+        speckle_size (float): Speckle grain size in pixels (Gaussian filter sigma).
+        static_correlation (float): Sub-step field correlation outside the flow regions.
+        flow_regions (list): (x, y, w, h, correlation) rectangles with faster decorrelation.
+        exposure_steps (int): Number of field sub-steps integrated into one frame.
+        seed (int): Seed for the random number generator.
+    """
+
+    def __init__(self, height, width, mean_intensity=80.0, speckle_size=1.5, static_correlation=0.999,
+                 flow_regions=(), exposure_steps=4, seed=0):
+        self.height = height
+        self.width = width
+        self.mean_intensity = mean_intensity
+        self.speckle_size = speckle_size
+        self.exposure_steps = exposure_steps
+        self.rng = np.random.default_rng(seed)
+
+        self.correlation = np.full((height, width), static_correlation, dtype=np.float32)
+        for x, y, w, h, correlation in flow_regions:
+            self.correlation[y:y + h, x:x + w] = correlation
+        self.innovation = np.sqrt(1.0 - self.correlation ** 2)
+
+        self.field = self._random_field()
+
+    def _random_field(self):
+        noise = (self.rng.standard_normal((self.height, self.width), dtype=np.float32)
+                 + 1j * self.rng.standard_normal((self.height, self.width), dtype=np.float32))
+        if self.speckle_size > 0:
+            real = cv2.GaussianBlur(np.ascontiguousarray(noise.real), (0, 0), self.speckle_size)
+            imag = cv2.GaussianBlur(np.ascontiguousarray(noise.imag), (0, 0), self.speckle_size)
+            noise = real + 1j * imag
+        # Normalize to unit mean intensity
+        return noise / np.sqrt(np.mean(np.abs(noise) ** 2))
+
+    def next_frame(self):
+        """
+        Advance the field by one exposure and integrate its intensity.
+
+        Returns:
+            np.ndarray: 2D uint8 speckle frame.
+        """
+        intensity = np.zeros((self.height, self.width), dtype=np.float32)
+        for _ in range(self.exposure_steps):
+            self.field = self.correlation * self.field + self.innovation * self._random_field()
+            intensity += np.abs(self.field) ** 2
+        intensity *= self.mean_intensity / self.exposure_steps
+        return np.clip(intensity, 0, 255).astype(np.uint8)
+
+    def frames(self, num_frames):
+        """
+        Generate a (T, H, W) stack of consecutive frames.
+
+        Parameters:
+            num_frames (int): Number of frames to generate.
+
+        Returns:
+            np.ndarray: (num_frames, H, W) uint8 array.
+        """
+        stack = np.empty((num_frames, self.height, self.width), dtype=np.uint8)
+        for t in range(num_frames):
+            stack[t] = self.next_frame()
+        return stack
@@ -0,0 +1,123 @@
+import os
+import re
+import sys
+import types
+import numpy as np
+import pytest
+
+from acquisition import CameraBackend, IDSCamera, SimulatedCamera, record
+from frame_loader import list_frame_paths
+from frame_timing import analyze_frame_timing, load_frame_metadata
+from recording_container import convert_png_folder_to_recording, load_recording
+
+
+def test_camera_backend_is_abstract():
+    with pytest.raises(TypeError):
+        CameraBackend(64, 80, 100, 6500, 0)
+
+
+def fake_ids_peak(monkeypatch, devices):
+    # Minimal ids_peak package: a library that counts Initialize/Close and a device manager
+    calls = []
+    library = types.SimpleNamespace(Initialize=lambda: calls.append("Initialize"),
+                                    Close=lambda: calls.append("Close"))
+    device_manager = types.SimpleNamespace(Update=lambda: None, Devices=lambda: devices)
+    ids_peak = types.SimpleNamespace(Library=library, DeviceAccessType_Control=0,
+                                     DeviceManager=types.SimpleNamespace(Instance=lambda: device_manager))
+    package = types.ModuleType("ids_peak")
+    package.ids_peak = ids_peak
+    package.ids_peak_ipl_extension = types.SimpleNamespace()
+    monkeypatch.setitem(sys.modules, "ids_peak", package)
+    return calls
+
+
+class NoDevices(list):
+    def empty(self):
+        return not self
+
+
+class FailingDevice:
+    def OpenDevice(self, access_type):
+        raise RuntimeError("Device is in use.")
+
+
+@pytest.mark.parametrize("devices", [NoDevices(), NoDevices([FailingDevice()])])
+def test_ids_failed_open_closes_the_library(monkeypatch, devices):
+    calls = fake_ids_peak(monkeypatch, devices)
+    with pytest.raises(RuntimeError):
+        with IDSCamera():
+            pass
+    assert calls == ["Initialize", "Close"]
+
+
+def test_record_requires_a_length(tmp_path):
+    with SimulatedCamera(height=64, width=80) as camera:
+        with pytest.raises(ValueError):
+            record(camera, str(tmp_path / "recording"))
+
+
+def test_record_container(tmp_path):
+    with SimulatedCamera(height=64, width=80, frame_rate=0, pool_size=4) as camera:
+        stats = record(camera, str(tmp_path / "recording"), num_frames=150)
+
+    assert stats["frames"] == 150
+    assert stats["written"] + stats["dropped"] == 150
+    assert stats["write_errors"] == 0
+    frames, metadata, header = load_recording(stats["output_path"])
+    assert frames.shape == (stats["written"], 64, 80)
+    assert header["camera"] == "SIMULATED"
+    # One metadata row per stored frame, in grab order
+    assert metadata.shape == (len(frames), 3)
+    assert np.all(np.diff(metadata[:, 0]) > 0)
+    assert np.all(np.diff(metadata[:, 2]) >= 0)
+
+
+def test_record_paced_duration(tmp_path):
+    with SimulatedCamera(height=64, width=80, frame_rate=100, pool_size=4) as camera:
+        stats = record(camera, str(tmp_path / "recording"), duration=0.5)
+
+    assert 35 <= stats["frames"] <= 60
+    assert stats["dropped"] == 0
+    frames, metadata, _ = load_recording(stats["output_path"])
+    assert len(frames) == len(metadata) == stats["frames"]
+
+
+def test_camera_drops_show_up_in_the_frame_ids(tmp_path):
+    with SimulatedCamera(height=64, width=80, frame_rate=0, pool_size=4, drop_rate=0.1, seed=3) as camera:
+        stats = record(camera, str(tmp_path / "recording"), num_frames=200)
+
+    _, metadata, _ = load_recording(stats["output_path"])
+    report = analyze_frame_timing(metadata)
+    assert report["num_frames"] == stats["written"] == 200
+    # Frames lost by the camera are counted from the frame ID gaps, not by the writer
+    assert report["dropped_frames"] == metadata[-1, 0] - metadata[0, 0] + 1 - len(metadata) > 0
+
+
+def test_png_metadata_stays_aligned_with_dropped_frames(tmp_path):
+    output_path = str(tmp_path / "recording")
+    # Unpaced camera, tiny write-behind buffer and one PNG writer: frames get dropped
+    with SimulatedCamera(height=64, width=80, frame_rate=0, pool_size=4) as camera:
+        stats = record(camera, output_path, num_frames=300, save_as_container=False, write_buffer_frames=2,
+                       num_png_writers=1)
+
+    assert stats["dropped"] > 0
+    frame_paths = list_frame_paths(output_path)
+    assert len(frame_paths) == stats["written"] == stats["frames"] - stats["dropped"]
+
+    metadata, _ = load_frame_metadata(output_path)
+    assert len(metadata) == len(frame_paths)
+    # Every row belongs to the PNG at the same position: frame IDs equal the file indices
+    file_indices = [int(re.search(r"\d+", os.path.basename(path)).group()) for path in frame_paths]
+    np.testing.assert_array_equal(metadata[:, 0], file_indices)
+
+
+def test_png_recording_converts_with_aligned_metadata(tmp_path):
+    output_path = str(tmp_path / "recording")
+    with SimulatedCamera(height=64, width=80, frame_rate=0, pool_size=4) as camera:
+        stats = record(camera, output_path, num_frames=200, save_as_container=False, write_buffer_frames=2,
+                       num_png_writers=1)
+
+    container_path = str(tmp_path / "converted.lsci")
+    assert convert_png_folder_to_recording(output_path, container_path) == stats["written"]
+    frames, metadata, _ = load_recording(container_path)
+    np.testing.assert_array_equal(metadata, load_frame_metadata(output_path)[0])
@@ -0,0 +1,91 @@
+import os
+import csv
+import json
+import numpy as np
+import cv2
+import pytest
+
+from batch_runner import RESULT_COLUMNS, load_manifest, run_batch
+from lsci_engine import calculate_running_temporal_lsci, crop_roi
+from recording_container import RecordingWriter
+
+HEIGHT, WIDTH = 48, 64
+ROIS = {"blue": {"x": 4, "y": 6, "w": 20, "h": 14}, "red": {"x": 34, "y": 24, "w": 24, "h": 18}}
+
+
+def write_reference(path):
+    # Blue and red rectangles, as drawn on the ROI reference frames
+    image = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    for roi, color in ((ROIS["blue"], (255, 0, 0)), (ROIS["red"], (0, 0, 255))):
+        cv2.rectangle(image, (roi["x"], roi["y"]), (roi["x"] + roi["w"] - 1, roi["y"] + roi["h"] - 1), color, -1)
+    cv2.imwrite(path, image)
+
+
+@pytest.fixture
+def manifest(tmp_path, monkeypatch):
+    # The workers' default cache directory is relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    rng = np.random.default_rng(0)
+    reference_path = str(tmp_path / "reference.png")
+    write_reference(reference_path)
+
+    png_frames = rng.integers(0, 256, (12, HEIGHT, WIDTH), dtype=np.uint8)
+    png_folder = tmp_path / "Basler_run"
+    png_folder.mkdir()
+    for i, frame in enumerate(png_frames):
+        cv2.imwrite(str(png_folder / f"frame_{i}.png"), frame)
+
+    container_frames = rng.integers(0, 256, (10, HEIGHT, WIDTH), dtype=np.uint8)
+    container_path = str(tmp_path / "ids_run.lsci")
+    with RecordingWriter(container_path, HEIGHT, WIDTH, camera="IDS") as writer:
+        for frame in container_frames:
+            writer.write_frame(frame)
+
+    manifest_path = tmp_path / "manifest.json"
+    manifest_path.write_text(json.dumps([
+        {"folder": str(png_folder), "reference": reference_path, "camera": "BASLER", "window_sizes": [5, 3]},
+        {"folder": container_path, "reference": reference_path, "camera": "IDS", "name": "ids"},
+    ]))
+    return load_manifest(str(manifest_path)), {"BASLER_Basler_run": png_frames, "ids": container_frames}
+
+
+@pytest.mark.parametrize("use_cache", [True, False])
+def test_run_batch_writes_results(tmp_path, manifest, use_cache):
+    entries, frames = manifest
+    output_dir = str(tmp_path / "batch_outputs")
+    rows, failures = run_batch(entries, output_dir, max_concurrent_recordings=2, use_cache=use_cache)
+    assert failures == {}
+
+    # Manifest order, then ROI and window size
+    assert [(row["recording"], row["roi"], row["window_size"]) for row in rows] == [
+        ("BASLER_Basler_run", "blue", 5), ("BASLER_Basler_run", "blue", 3),
+        ("BASLER_Basler_run", "red", 5), ("BASLER_Basler_run", "red", 3),
+        ("ids", "blue", 5), ("ids", "red", 5),
+    ]
+    for row in rows:
+        expected = calculate_running_temporal_lsci(crop_roi(frames[row["recording"]], ROIS[row["roi"]]),
+                                                   row["window_size"])
+        np.testing.assert_allclose(row["mean"], expected.mean(), rtol=1e-5)
+        np.testing.assert_allclose(np.load(os.path.join(output_dir, "maps", row["map"])), expected)
+
+    with open(os.path.join(output_dir, "results.csv"), newline="") as csv_file:
+        csv_rows = list(csv.DictReader(csv_file))
+    assert [list(csv_row) for csv_row in csv_rows] == [RESULT_COLUMNS] * len(rows)
+    assert [csv_row["camera"] for csv_row in csv_rows] == ["BASLER"] * 4 + ["IDS"] * 2
+    np.testing.assert_allclose([float(csv_row["mean"]) for csv_row in csv_rows], [row["mean"] for row in rows])
+
+    with open(os.path.join(output_dir, "perfusion_metrics.json")) as json_file:
+        metrics = json.load(json_file)
+    assert list(metrics) == [row["map"] for row in rows]
+    assert metrics[rows[0]["map"]] == {key: rows[0][key] for key in RESULT_COLUMNS}
+    assert os.path.isdir(".lsci_cache") == use_cache
+    # A second run gives the same results (from the cache when it is used)
+    assert run_batch(entries, output_dir, use_cache=use_cache) == (rows, {})
+
+
+def test_failures_are_reported(tmp_path, manifest):
+    entries, _ = manifest
+    entries[1]["folder"] = str(tmp_path / "missing.lsci")
+    rows, failures = run_batch(entries, str(tmp_path / "batch_outputs"), use_cache=False)
+    assert list(failures) == ["ids"]
+    assert {row["recording"] for row in rows} == {"BASLER_Basler_run"}
@@ -0,0 +1,142 @@
+import os
+import numpy as np
+import cv2
+import pytest
+
+from calibration import (MIN_FLAT_RESPONSE, FrameCalibration, calibration_for_recording, flat_field_gain,
+                         list_calibrations, load_calibration, save_calibration)
+from frame_loader import load_roi_stacks
+from recording_container import RecordingWriter
+
+HEIGHT, WIDTH = 24, 32
+SETTINGS = {"camera": "BASLER", "exposure_time": 6500, "gain": 32}
+ROIS = {"blue": {"x": 2, "y": 3, "w": 10, "h": 8}, "red": {"x": 15, "y": 10, "w": 12, "h": 9}}
+
+
+def calibration_maps(seed=0):
+    rng = np.random.default_rng(seed)
+    dark = rng.uniform(0, 8, (HEIGHT, WIDTH)).astype(np.float32)
+    return dark, rng.uniform(0.8, 1.2, (HEIGHT, WIDTH)).astype(np.float32)
+
+
+def random_frames(num_frames=6, seed=1):
+    return np.random.default_rng(seed).integers(0, 256, (num_frames, HEIGHT, WIDTH), dtype=np.uint8)
+
+
+def test_apply_matches_hand_computation():
+    dark, gain = calibration_maps()
+    frames = random_frames()
+    expected = (frames.astype(np.float64) - dark) * gain
+
+    calibration = FrameCalibration(dark, gain)
+    np.testing.assert_allclose(calibration.apply(frames), expected, rtol=1e-5, atol=1e-4)
+    out = np.empty(frames.shape[1:], dtype=np.float32)
+    assert calibration.apply(frames[2], out=out) is out
+    np.testing.assert_allclose(out, expected[2], rtol=1e-5, atol=1e-4)
+    # Without a flat field only the dark frame is subtracted
+    np.testing.assert_allclose(FrameCalibration(dark).apply(frames), frames - dark.astype(np.float64), atol=1e-4)
+
+
+def test_crop_matches_the_full_frame_correction():
+    dark, gain = calibration_maps()
+    frames = random_frames()
+    calibration = FrameCalibration(dark, gain)
+    roi = ROIS["red"]
+    np.testing.assert_array_equal(calibration.crop(roi).apply(frames[:, 10:19, 15:27]),
+                                  calibration.apply(frames)[:, 10:19, 15:27])
+
+
+def test_shape_mismatch_is_rejected():
+    calibration = FrameCalibration(*calibration_maps())
+    with pytest.raises(ValueError):
+        calibration.apply(np.zeros((HEIGHT, WIDTH + 8), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        calibration.crop(ROIS["red"]).apply(np.zeros((HEIGHT, WIDTH), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        calibration.crop({"x": 25, "y": 0, "w": 10, "h": 5})
+
+
+def test_flat_field_gain():
+    dark, _ = calibration_maps()
+    response = np.random.default_rng(2).uniform(50, 150, (HEIGHT, WIDTH))
+    response[0, 0] = 0  # a dead pixel
+    gain = flat_field_gain(dark + response, dark)
+
+    mean_response = response.mean()
+    valid = response > MIN_FLAT_RESPONSE * mean_response
+    np.testing.assert_allclose(gain[valid], mean_response / response[valid], rtol=1e-5)
+    assert gain[0, 0] == 1
+    # The corrected flat field is uniform
+    np.testing.assert_allclose((response * gain)[valid], mean_response, rtol=1e-5)
+    with pytest.raises(ValueError):
+        flat_field_gain(dark, dark)
+
+
+def test_save_and_load_round_trip(tmp_path):
+    calibration_dir = str(tmp_path / "calibration")
+    dark, gain = calibration_maps()
+    path = save_calibration(FrameCalibration(dark, gain, SETTINGS), calibration_dir)
+    assert os.path.basename(path) == "BASLER_32x24_exp6500_gain32.npz"
+
+    loaded = load_calibration("basler", HEIGHT, WIDTH, 6500, 32, calibration_dir)
+    np.testing.assert_array_equal(loaded.dark, dark)
+    np.testing.assert_array_equal(loaded.gain, gain)
+    assert loaded.settings == SETTINGS
+    assert load_calibration("basler", HEIGHT, WIDTH, 5500, 32, calibration_dir) is None
+
+    # Dark-only calibrations load without a gain
+    save_calibration(FrameCalibration(dark, settings=dict(SETTINGS, gain=0)), calibration_dir)
+    assert load_calibration("BASLER", HEIGHT, WIDTH, 6500, 0, calibration_dir).gain is None
+
+
+def test_list_skips_interrupted_saves(tmp_path):
+    calibration_dir = str(tmp_path / "calibration")
+    assert list_calibrations(calibration_dir) == []
+    path = save_calibration(FrameCalibration(calibration_maps()[0], settings=SETTINGS), calibration_dir)
+    # What an interrupted save_calibration leaves behind
+    open(path + ".tmp.npz", "wb").close()
+    assert list_calibrations(calibration_dir) == ["BASLER_32x24_exp6500_gain32"]
+
+
+@pytest.fixture
+def recordings(tmp_path):
+    frames = random_frames(8, seed=3)
+    container_path = str(tmp_path / "recording.lsci")
+    with RecordingWriter(container_path, HEIGHT, WIDTH, exposure_time=6500, gain=32, camera="BASLER") as writer:
+        for frame in frames:
+            writer.write_frame(frame)
+    png_folder = tmp_path / "recording_png"
+    png_folder.mkdir()
+    for i, frame in enumerate(frames):
+        cv2.imwrite(str(png_folder / f"frame_{i:04d}.png"), frame)
+    return frames, container_path, str(png_folder)
+
+
+def test_calibration_for_recording(tmp_path, recordings):
+    _, container_path, png_folder = recordings
+    calibration_dir = str(tmp_path / "calibration")
+    dark, gain = calibration_maps()
+    save_calibration(FrameCalibration(dark, gain, SETTINGS), calibration_dir)
+
+    # Containers carry their settings in the header
+    np.testing.assert_array_equal(calibration_for_recording(container_path, calibration_dir).dark, dark)
+    # PNG folders need them passed in
+    assert calibration_for_recording(png_folder, calibration_dir) is None
+    found = calibration_for_recording(png_folder, calibration_dir, camera="BASLER", exposure_time=6500, gain=32)
+    np.testing.assert_array_equal(found.gain, gain)
+    assert calibration_for_recording(container_path, calibration_dir, exposure_time=5500) is None
+
+
+def test_roi_stacks_are_corrected_and_checked(recordings):
+    frames, container_path, png_folder = recordings
+    calibration = FrameCalibration(*calibration_maps())
+    expected = calibration.apply(frames)
+    for source_path in (container_path, png_folder):
+        roi_stacks = load_roi_stacks(source_path, ROIS, num_workers=2, calibration=calibration)
+        np.testing.assert_array_equal(roi_stacks["red"], expected[:, 10:19, 15:27])
+
+    # A calibration of another sensor size would crop fine but belongs to other pixels
+    other_sensor = FrameCalibration(np.zeros((HEIGHT + 8, WIDTH), dtype=np.float32))
+    for source_path in (container_path, png_folder):
+        with pytest.raises(ValueError):
+            load_roi_stacks(source_path, ROIS, num_workers=2, calibration=other_sensor)
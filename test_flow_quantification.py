@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from flow_quantification import (EXPOSURE_TIMES, MAX_EXPOSURE_RATIO, MIN_EXPOSURE_RATIO, correlation_time_map,
+                                 lookup_exposure_time, quantify_flow, speckle_contrast_model)
+
+
+def invert_by_bisection(k, exposure_time, beta=1.0, iterations=200):
+    # Reference inversion of the speckle model: K decreases monotonically with x = T / tau_c
+    low, high = np.log(MIN_EXPOSURE_RATIO), np.log(MAX_EXPOSURE_RATIO)
+    for _ in range(iterations):
+        middle = 0.5 * (low + high)
+        if speckle_contrast_model(np.exp(middle), beta) > k:
+            low = middle
+        else:
+            high = middle
+    return exposure_time / np.exp(0.5 * (low + high))
+
+
+@pytest.mark.parametrize("exposure_time", sorted(EXPOSURE_TIMES.values()))
+@pytest.mark.parametrize("beta", [1.0, 0.6])
+def test_lookup_table_matches_bisection(exposure_time, beta):
+    k_values = np.linspace(0.02, 0.95, 60) * np.sqrt(beta)
+    expected = np.array([invert_by_bisection(k, exposure_time, beta) for k in k_values])
+    result = correlation_time_map(k_values.astype(np.float32), exposure_time, beta)
+    np.testing.assert_allclose(result, expected, rtol=1e-4)
+
+
+def test_stack_is_converted_in_chunks():
+    k_stack = np.random.default_rng(0).uniform(0.05, 0.6, (3, 40, 50)).astype(np.float32)
+    whole = correlation_time_map(k_stack, 6500)
+    chunked = correlation_time_map(k_stack, 6500, chunk_size=1000)
+    assert whole.shape == k_stack.shape and whole.dtype == np.float32
+    np.testing.assert_array_equal(whole, chunked)
+
+
+def test_non_finite_contrast_gives_nan():
+    k_values = np.array([np.nan, 0.2, np.inf, -np.inf, 0.5], dtype=np.float32)
+    result = correlation_time_map(k_values, 6500)
+    np.testing.assert_array_equal(np.isnan(result), [True, False, True, True, False])
+    np.testing.assert_allclose(result[[1, 4]], [invert_by_bisection(0.2, 6500), invert_by_bisection(0.5, 6500)],
+                               rtol=1e-4)
+
+
+def test_quantify_flow_relative_maps():
+    k_map = np.full((4, 5), 0.3, dtype=np.float32)
+    k_map[0] = 0.1
+    flow = quantify_flow(k_map, 5500)
+    np.testing.assert_allclose(flow["flow_index"], 5500 / flow["correlation_time"], rtol=1e-6)
+    assert flow["relative_correlation_time"].mean() == pytest.approx(1.0, rel=1e-5)
+    # Lower K means faster decorrelation: shorter correlation time, higher flow index
+    assert flow["flow_index"][0, 0] > flow["flow_index"][1, 0]
+
+
+def test_quantify_flow_ignores_nan_in_reference():
+    k_map = np.array([[0.2, np.nan], [0.2, 0.2]], dtype=np.float32)
+    flow = quantify_flow(k_map, 6500)
+    assert np.isfinite(flow["reference_correlation_time"])
+    assert np.isnan(flow["flow_index"][0, 1])
+    np.testing.assert_allclose(flow["relative_correlation_time"][[0, 1, 1], [0, 0, 1]], 1.0, rtol=1e-5)
+
+
+def test_lookup_exposure_time():
+    assert lookup_exposure_time({"exposure_time": 1000, "camera": "IDS"}) == 1000
+    assert lookup_exposure_time({"camera": "basler"}) == EXPOSURE_TIMES["BASLER"]
+    # Recording headers store "camera": null when the camera is unknown
+    assert lookup_exposure_time({"camera": None, "exposure_time": None}, "IDS_initial_window_5.npy") == \
+        EXPOSURE_TIMES["IDS"]
+    assert lookup_exposure_time({"camera": None}, "map.npy") is None
+    assert lookup_exposure_time(None) is None
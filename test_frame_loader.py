@@ -0,0 +1,32 @@
+import os
+import numpy as np
+import cv2
+
+from frame_loader import iter_frame_chunks, list_frame_paths, load_frame_stack_from_folder
+from recording_container import convert_png_folder_to_recording, load_recording
+
+
+def write_unpadded_frames(folder_path, num_frames=12):
+    # "frame_2.png" must come before "frame_10.png"; every frame holds its own index
+    for i in range(num_frames):
+        cv2.imwrite(os.path.join(folder_path, f"frame_{i}.png"), np.full((8, 10), i, dtype=np.uint8))
+
+
+def test_frames_are_ordered_by_number(tmp_path):
+    write_unpadded_frames(str(tmp_path))
+    names = [os.path.basename(path) for path in list_frame_paths(str(tmp_path))]
+    assert names == [f"frame_{i}.png" for i in range(12)]
+
+
+def test_png_loader_and_container_agree_on_order(tmp_path):
+    folder_path = str(tmp_path / "frames")
+    os.makedirs(folder_path)
+    write_unpadded_frames(folder_path)
+    container_path = str(tmp_path / "frames.lsci")
+    convert_png_folder_to_recording(folder_path, container_path)
+
+    stack = load_frame_stack_from_folder(folder_path, num_workers=2)
+    frames, _, _ = load_recording(container_path)
+    np.testing.assert_array_equal(stack, frames)
+    np.testing.assert_array_equal(stack[:, 0, 0], np.arange(12))
+    np.testing.assert_array_equal(np.concatenate(list(iter_frame_chunks(folder_path, 5, num_workers=2))), stack)
@@ -0,0 +1,36 @@
+import numpy as np
+
+from frame_timing import analyze_frame_timing, frame_times
+from recording_container import INVALID_TIMESTAMP, allocate_frame_metadata
+
+
+def timing_metadata(num_frames=10, interval_ns=10_000_000):
+    metadata = allocate_frame_metadata(num_frames)
+    metadata[:, 0] = np.arange(num_frames)
+    metadata[:, 1] = 5_000 + np.arange(num_frames) * interval_ns // 1000  # microsecond camera ticks
+    metadata[:, 2] = 10 ** 12 + np.arange(num_frames) * interval_ns
+    return metadata
+
+
+def test_camera_timestamps():
+    times_s, source = frame_times(timing_metadata(), camera_tick_frequency=1e6)
+    assert source == "camera"
+    np.testing.assert_allclose(times_s, np.arange(10) * 0.01)
+
+
+def test_missing_camera_timestamp_falls_back_to_host_time():
+    metadata = timing_metadata()
+    metadata[4, 1] = INVALID_TIMESTAMP
+    times_s, source = frame_times(metadata, camera_tick_frequency=1e6)
+    assert source == "host"
+    np.testing.assert_allclose(times_s, np.arange(10) * 0.01)
+    assert analyze_frame_timing(metadata, 1e6)["effective_frame_rate"] == 100
+
+
+def test_no_complete_timestamps():
+    metadata = timing_metadata()
+    metadata[0, 1] = metadata[3, 2] = INVALID_TIMESTAMP
+    assert frame_times(metadata) == (None, None)
+    report = analyze_frame_timing(metadata)
+    assert report["effective_frame_rate"] is None
+    assert report["num_frames"] == 10
@@ -0,0 +1,72 @@
+import time
+import numpy as np
+import pytest
+
+from live_preview import LivePreview
+from synthetic_speckle import SpeckleGenerator
+
+HEIGHT, WIDTH = 192, 256
+ROIS = {
+    "blue": {"x": WIDTH // 8, "y": HEIGHT // 4, "w": WIDTH // 4, "h": HEIGHT // 2},
+    "red": {"x": 5 * WIDTH // 8, "y": HEIGHT // 4, "w": WIDTH // 4, "h": HEIGHT // 2},
+}
+
+
+@pytest.fixture(scope="module")
+def frames():
+    # Synthetic camera: the red ROI decorrelates quickly (flow), the rest is static tissue
+    red = ROIS["red"]
+    generator = SpeckleGenerator(HEIGHT, WIDTH, flow_regions=[(red["x"], red["y"], red["w"], red["h"], 0.3)])
+    return generator.frames(32)
+
+
+def feed(preview, frames, num_frames, frame_rate):
+    # Simulated grab loop; returns the longest offer() call in seconds
+    frame_period = 1.0 / frame_rate if frame_rate else 0.0
+    max_offer = 0.0
+    for i in range(num_frames):
+        start = time.perf_counter()
+        preview.offer(frames[i % len(frames)])
+        max_offer = max(max_offer, time.perf_counter() - start)
+        time.sleep(max(0.0, frame_period - (time.perf_counter() - start)))
+    return max_offer
+
+
+@pytest.mark.parametrize("mode", ["temporal", "spatial"])
+def test_preview_does_not_block_grab_loop(frames, mode):
+    frame_rate = 100.0
+    with LivePreview(ROIS, mode=mode, window_size=9, downsample=2, update_interval=0.05) as preview:
+        max_offer = feed(preview, frames, 150, frame_rate)
+    assert max_offer < 1.0 / frame_rate
+    assert preview.updates > 0
+    assert preview.frames_offered == 150
+
+
+def test_preview_drops_frames_under_load(frames):
+    def slow_update(lsci_map, roi_means):
+        time.sleep(0.05)
+
+    preview = LivePreview(ROIS, mode="spatial", downsample=2, update_interval=0.0, on_update=slow_update,
+                          queue_size=2)
+    max_offer = feed(preview, frames, 200, frame_rate=0)
+    stats = preview.close()
+    assert stats["dropped"] > 0
+    assert stats["offered"] == 200
+    # Dropping instead of waiting keeps offer() fast even with a stalled consumer
+    assert max_offer < 0.01
+
+
+@pytest.mark.parametrize("mode", ["temporal", "spatial"])
+def test_preview_roi_contrast(frames, mode):
+    with LivePreview(ROIS, mode=mode, window_size=9, downsample=2, update_interval=0.0) as preview:
+        feed(preview, frames, 60, frame_rate=200)
+    roi_means = preview.latest_roi_means
+    assert set(roi_means) == set(ROIS)
+    for mean_k in roi_means.values():
+        assert np.isfinite(mean_k) and 0.0 < mean_k < 1.5
+    if mode == "spatial":
+        # The flow ROI blurs its speckle within a frame: lower spatial K
+        assert roi_means["red"] < roi_means["blue"]
+    else:
+        # The flow ROI fluctuates from frame to frame while the static tissue does not: higher temporal K
+        assert roi_means["red"] > roi_means["blue"]
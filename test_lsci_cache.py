@@ -0,0 +1,111 @@
+import os
+import json
+import numpy as np
+
+import lsci_cache
+from lsci_cache import METADATA_FILENAME, TEMP_MARKER, LSCICache
+
+
+def write_in_flight_entry(cache_dir):
+    # What put() leaves on disk while another process is still renaming its entry into place
+    temp_path = os.path.join(cache_dir, f"somekey{TEMP_MARKER}12345")
+    os.makedirs(temp_path)
+    np.save(os.path.join(temp_path, "0.npy"), np.zeros(1000))
+    with open(os.path.join(temp_path, METADATA_FILENAME), "w") as json_file:
+        json.dump({"arrays": ["a"], "metadata": {}, "created": 0}, json_file)
+    return temp_path
+
+
+def test_in_flight_entries_are_ignored(tmp_path):
+    cache = LSCICache(str(tmp_path), max_bytes=0)
+    temp_path = write_in_flight_entry(str(tmp_path))
+
+    assert cache.size() == 0
+    assert cache.evict() == 0
+    assert cache.invalidate() == 0
+    assert os.path.isdir(temp_path)
+
+
+def test_put_get_and_evict(tmp_path):
+    cache = LSCICache(str(tmp_path), max_bytes=10 ** 9)
+    cache.put("first", {"map": np.arange(10.0)}, {"source": "a"})
+    arrays, metadata = cache.get("first")
+    np.testing.assert_array_equal(arrays["map"], np.arange(10.0))
+    assert metadata == {"source": "a"}
+
+    cache.max_bytes = 0
+    assert cache.evict() == 1
+    assert cache.get("first") is None
+
+
+def test_put_keeps_the_entry_of_a_concurrent_writer(tmp_path, monkeypatch):
+    cache = LSCICache(str(tmp_path))
+    rename = os.rename
+
+    def rename_after_another_worker(source, destination):
+        # Another worker's entry appears between the put() of this one and its rename
+        other_path = os.path.join(str(tmp_path), "other-worker")
+        os.makedirs(other_path)
+        np.save(os.path.join(other_path, "0.npy"), np.ones(4))
+        with open(os.path.join(other_path, METADATA_FILENAME), "w") as json_file:
+            json.dump({"arrays": ["map"], "metadata": {"worker": "other"}, "created": 0}, json_file)
+        rename(other_path, destination)
+        rename(source, destination)
+
+    monkeypatch.setattr(os, "rename", rename_after_another_worker)
+    cache.put("shared", {"map": np.zeros(4)}, {"worker": "this"})
+
+    arrays, metadata = cache.get("shared")
+    assert metadata == {"worker": "other"}
+    np.testing.assert_array_equal(arrays["map"], np.ones(4))
+    assert os.listdir(str(tmp_path)) == ["shared"]
+
+
+def put_entries(cache, keys):
+    # Entries of equal size, least recently used first
+    for age, key in enumerate(keys):
+        cache.put(key, {"map": np.zeros(1000)})
+        os.utime(os.path.join(cache.cache_dir, key), (age, age))
+
+
+def test_put_never_evicts_the_entry_just_stored(tmp_path):
+    cache = LSCICache(str(tmp_path), max_bytes=0)
+    cache.put("first", {"map": np.zeros(1000)})
+    assert cache.get("first") is not None
+    cache.put("second", {"map": np.ones(1000)})
+    assert cache.get("first") is None
+    np.testing.assert_array_equal(cache.get("second")[0]["map"], np.ones(1000))
+
+
+def test_entries_in_use_are_skipped(tmp_path, monkeypatch):
+    cache = LSCICache(str(tmp_path), max_bytes=10 ** 9)
+    put_entries(cache, ["a", "b", "c"])
+    # Entries differ by a byte or so (the "created" time in metadata.json), so measure "a" itself
+    entry_size = lsci_cache._entry_size(str(tmp_path / "a"))
+    cache.max_bytes = entry_size
+    rename = os.rename
+
+    def rename_unless_in_use(source, destination):
+        # Like Windows while get() holds memory maps of entry "a"
+        if os.path.basename(source) == "a":
+            raise PermissionError(13, "The process cannot access the file")
+        rename(source, destination)
+
+    monkeypatch.setattr(os, "rename", rename_unless_in_use)
+    assert cache.evict() == 2
+    assert cache.get("a") is not None and cache.get("b") is None and cache.get("c") is None
+    assert cache.size() == entry_size
+
+
+def test_undeleted_files_count_until_they_are_gone(tmp_path, monkeypatch):
+    cache = LSCICache(str(tmp_path), max_bytes=10 ** 9)
+    put_entries(cache, ["a", "b"])
+    cache.max_bytes = cache.size() // 2
+    # No file can be deleted: removing "a" frees nothing, so "b" has to go as well
+    monkeypatch.setattr(lsci_cache.shutil, "rmtree", lambda path, ignore_errors=False: None)
+    assert cache.evict() == 2
+    assert cache.size() == 0 and len(os.listdir(str(tmp_path))) == 2
+
+    monkeypatch.undo()
+    cache.evict()
+    assert os.listdir(str(tmp_path)) == []
@@ -0,0 +1,207 @@
+import numpy as np
+import pytest
+
+from lsci_engine import (EPSILON, accumulator_dtype, average_lsci_maps, calculate_roi_contrast_series,
+                         calculate_roi_stacks_lsci_sweep,
+                         calculate_running_temporal_lsci, calculate_streaming_temporal_lsci,
+                         calculate_temporal_lsci_sweep, crop_roi, iter_streaming_temporal_lsci_maps,
+                         iter_temporal_lsci_maps)
+
+# float32 maps against float64 maps of the same frames: the float32 contrast step loses about
+# 1e-6 in K at low contrast (var = E[x^2] - E[x]^2 cancels), so an absolute tolerance is stated too
+FLOAT32_RTOL = 1e-5
+FLOAT32_ATOL = 1e-5
+
+
+def baseline_temporal_lsci_maps(sequence, window_size):
+    # The original np.std / np.mean formula of calculate_temporal_lsci, one map per valid t
+    stack = np.stack(sequence, axis=0).astype(np.float64)
+    half_window = window_size // 2
+    return [np.std(stack[t - half_window:t + half_window + 1], axis=0)
+            / (np.mean(stack[t - half_window:t + half_window + 1], axis=0) + 1e-6)
+            for t in range(half_window, len(stack) - half_window)]
+
+
+def random_frames(num_frames, seed=0, shape=(24, 32)):
+    return np.random.default_rng(seed).integers(0, 256, (num_frames,) + shape, dtype=np.uint8)
+
+
+@pytest.mark.parametrize("window_size", [1, 3, 4, 5, 9])
+def test_maps_match_the_baseline_formula(window_size):
+    frames = random_frames(30)
+    maps = [K.copy() for K in iter_temporal_lsci_maps(frames, window_size, dtype=np.float64)]
+    expected = baseline_temporal_lsci_maps(frames, window_size)
+    assert len(maps) == len(expected)
+    np.testing.assert_allclose(maps, expected, rtol=1e-9, atol=1e-12)
+
+
+@pytest.mark.parametrize("window_size", [3, 5, 9])
+def test_average_matches_the_baseline_formula(window_size):
+    frames = random_frames(40, seed=1)
+    expected = np.mean(baseline_temporal_lsci_maps(frames, window_size), axis=0)
+    np.testing.assert_allclose(calculate_running_temporal_lsci(frames, window_size, dtype=np.float64), expected,
+                               rtol=1e-9, atol=1e-12)
+    # A list of frames goes through the same engine
+    np.testing.assert_allclose(calculate_running_temporal_lsci(list(frames), window_size, dtype=np.float64),
+                               expected, rtol=1e-9, atol=1e-12)
+
+
+def test_sequence_as_long_as_the_window():
+    frames = random_frames(5, seed=2)
+    maps = list(iter_temporal_lsci_maps(frames, 5, dtype=np.float64))
+    assert len(maps) == 1
+    np.testing.assert_allclose(maps[0], baseline_temporal_lsci_maps(frames, 5)[0], rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(calculate_running_temporal_lsci(frames, 5, dtype=np.float64), maps[0])
+
+
+def test_sequence_shorter_than_the_window():
+    frames = random_frames(4, seed=3)
+    assert list(iter_temporal_lsci_maps(frames, 5)) == []
+    with pytest.raises(ValueError):
+        calculate_running_temporal_lsci(frames, 5)
+
+
+def test_average_lsci_maps_of_a_reused_buffer():
+    frames = random_frames(25, seed=4)
+    expected = np.mean(baseline_temporal_lsci_maps(frames, 5), axis=0)
+    out = np.empty(frames.shape[1:], dtype=np.float64)
+    lsci_mean, num_maps = average_lsci_maps(iter_temporal_lsci_maps(frames, 5, dtype=np.float64, out=out))
+    assert num_maps == 21
+    np.testing.assert_allclose(lsci_mean, expected, rtol=1e-9, atol=1e-12)
+    assert average_lsci_maps(iter([])) == (None, 0)
+
+
+def test_float32_out_matches_float64():
+    frames = random_frames(60, seed=5)
+    out = np.empty(frames.shape[1:], dtype=np.float32)
+    for K32, K64 in zip(iter_temporal_lsci_maps(frames, 5, dtype=np.float32, out=out),
+                        iter_temporal_lsci_maps(frames, 5, dtype=np.float64)):
+        assert K32 is out
+        np.testing.assert_allclose(K32, K64, rtol=FLOAT32_RTOL, atol=FLOAT32_ATOL)
+    np.testing.assert_allclose(calculate_running_temporal_lsci(frames, 5),
+                               calculate_running_temporal_lsci(frames, 5, dtype=np.float64),
+                               rtol=FLOAT32_RTOL, atol=FLOAT32_ATOL)
+
+
+def test_float_frames_do_not_drift():
+    # Calibrated (float32) frames with a low contrast of about 0.01 over a long sequence
+    rng = np.random.default_rng(6)
+    frames = ((200 + 2 * rng.standard_normal((2000, 16, 16))) * 1.37 + 3.1).astype(np.float32)
+    np.testing.assert_allclose(calculate_running_temporal_lsci(frames, 5),
+                               calculate_running_temporal_lsci(frames, 5, dtype=np.float64),
+                               rtol=FLOAT32_RTOL, atol=FLOAT32_ATOL)
+
+
+def test_accumulator_dtype():
+    assert accumulator_dtype(np.uint8, 258) == np.float32
+    assert accumulator_dtype(np.uint8, 259) == np.float64
+    assert accumulator_dtype(np.uint16, 5) == np.float64
+    assert accumulator_dtype(np.float32, 5) == np.float64
+    assert accumulator_dtype(np.uint16, 5, np.float64) == np.float64
+
+
+SWEEP_ROIS = {"blue": {"x": 2, "y": 3, "w": 10, "h": 8}, "red": {"x": 15, "y": 10, "w": 12, "h": 9}}
+# Unsorted, with a duplicate and an even size that rounds up to the next odd window
+SWEEP_WINDOW_SIZES = [9, 3, 5, 3, 4]
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+def test_sweep_matches_single_window_computations(dtype):
+    frames = random_frames(35, seed=7)
+    sweep = calculate_temporal_lsci_sweep(frames, SWEEP_ROIS, SWEEP_WINDOW_SIZES, dtype=dtype)
+    assert set(sweep) == set(SWEEP_ROIS)
+    for name, roi in SWEEP_ROIS.items():
+        assert set(sweep[name]) == set(SWEEP_WINDOW_SIZES)
+        for window_size in SWEEP_WINDOW_SIZES:
+            expected = calculate_running_temporal_lsci(crop_roi(frames, roi), window_size, dtype=np.float64)
+            assert sweep[name][window_size].dtype == dtype
+            np.testing.assert_allclose(sweep[name][window_size], expected, rtol=FLOAT32_RTOL, atol=FLOAT32_ATOL)
+
+
+def test_roi_stacks_sweep_matches_the_frame_sweep():
+    frames = random_frames(20, seed=8)
+    roi_stacks = {name: crop_roi(frames, roi) for name, roi in SWEEP_ROIS.items()}
+    # Stacks of unequal length are cut to the shortest one
+    roi_stacks["red"] = np.concatenate([roi_stacks["red"], roi_stacks["red"][:3]])
+    stacks_sweep = calculate_roi_stacks_lsci_sweep(roi_stacks, SWEEP_WINDOW_SIZES, dtype=np.float64)
+    frames_sweep = calculate_temporal_lsci_sweep(list(frames), SWEEP_ROIS, SWEEP_WINDOW_SIZES, dtype=np.float64)
+    for name in SWEEP_ROIS:
+        for window_size in SWEEP_WINDOW_SIZES:
+            np.testing.assert_allclose(stacks_sweep[name][window_size], frames_sweep[name][window_size], rtol=1e-12)
+
+
+def test_sweep_shorter_than_the_largest_window():
+    with pytest.raises(ValueError):
+        calculate_temporal_lsci_sweep(random_frames(8, seed=9), SWEEP_ROIS, SWEEP_WINDOW_SIZES)
+
+
+def chunked(frames, chunk_size):
+    return (frames[start:start + chunk_size] for start in range(0, len(frames), chunk_size))
+
+
+@pytest.mark.parametrize("window_size", [3, 5, 8])
+def test_streaming_maps_into_a_reused_buffer(window_size):
+    frames = random_frames(30, seed=10)
+    out = np.empty(frames.shape[1:], dtype=np.float64)
+    expected = baseline_temporal_lsci_maps(frames, window_size)
+    num_maps = 0
+    for K, K_expected in zip(iter_streaming_temporal_lsci_maps(iter(frames), window_size, np.float64, out=out),
+                             expected):
+        assert K is out
+        np.testing.assert_allclose(K, K_expected, rtol=1e-9, atol=1e-12)
+        num_maps += 1
+    assert num_maps == len(expected)
+
+
+def test_streaming_average_matches_the_running_engine():
+    frames = random_frames(50, seed=11)
+    np.testing.assert_allclose(calculate_streaming_temporal_lsci(chunked(frames, 7), 5, dtype=np.float64),
+                               calculate_running_temporal_lsci(frames, 5, dtype=np.float64), rtol=1e-12)
+    np.testing.assert_allclose(calculate_streaming_temporal_lsci(chunked(frames, 7), 5),
+                               calculate_running_temporal_lsci(frames, 5, dtype=np.float64),
+                               rtol=FLOAT32_RTOL, atol=FLOAT32_ATOL)
+    with pytest.raises(ValueError):
+        calculate_streaming_temporal_lsci(chunked(frames[:4], 2), 5)
+    with pytest.raises(ValueError):
+        calculate_streaming_temporal_lsci(iter([]), 5)
+
+
+def test_streaming_calibrated_frames_do_not_drift():
+    # Calibrated float32 frames with K of about 0.01: float32 running sums used to drift by ~5%
+    rng = np.random.default_rng(12)
+    frames = ((200 + 2 * rng.standard_normal((3000, 16, 16))) * 1.37 + 3.1).astype(np.float32)
+    np.testing.assert_allclose(calculate_streaming_temporal_lsci(chunked(frames, 64), 5),
+                               calculate_streaming_temporal_lsci(chunked(frames, 64), 5, dtype=np.float64),
+                               rtol=FLOAT32_RTOL, atol=FLOAT32_ATOL)
+
+
+def direct_roi_series(frames, rois, window_size):
+    # Mean K, median K and mean flow index of every ROI, from the baseline map of every window
+    columns = []
+    for roi in rois.values():
+        maps = np.array(baseline_temporal_lsci_maps(crop_roi(frames, roi), window_size))
+        flow_index = 1 / np.maximum(maps, EPSILON) ** 2
+        columns.append((maps.mean(axis=(1, 2)), np.median(maps, axis=(1, 2)), flow_index.mean(axis=(1, 2))))
+    return [np.stack([column[i] for column in columns], axis=1) for i in range(3)]
+
+
+@pytest.mark.parametrize("window_size", [3, 5])
+def test_roi_contrast_series_matches_direct_computation(window_size):
+    frames = random_frames(30, seed=13)
+    # A generator: every ROI stream is a tee of the same single pass
+    series = calculate_roi_contrast_series(iter(frames), SWEEP_ROIS, window_size, dtype=np.float64)
+    mean_k, median_k, flow_index = direct_roi_series(frames, SWEEP_ROIS, window_size)
+
+    assert series["rois"] == list(SWEEP_ROIS)
+    assert series["mean_k"].shape == (30 - 2 * (window_size // 2), len(SWEEP_ROIS))
+    np.testing.assert_allclose(series["mean_k"], mean_k, rtol=1e-6)
+    np.testing.assert_allclose(series["median_k"], median_k, rtol=1e-6)
+    np.testing.assert_allclose(series["flow_index"], flow_index, rtol=1e-5)
+    np.testing.assert_array_equal(series["timestamps"], np.arange(window_size // 2, 30 - window_size // 2))
+
+
+def test_roi_contrast_series_timestamps_of_the_window_centres():
+    frames = random_frames(12, seed=14)
+    timestamps = np.linspace(0.0, 1.1, 12)
+    series = calculate_roi_contrast_series(frames, SWEEP_ROIS, 5, timestamps=timestamps)
+    np.testing.assert_array_equal(series["timestamps"], timestamps[2:10])
@@ -0,0 +1,38 @@
+import json
+import numpy as np
+import pytest
+
+from perfusion import calculate_perfusion_batch, process_images_in_folder
+
+ROIS = {"blue": {"x": 2, "y": 3, "w": 10, "h": 7}}
+
+
+def maps_as(kind):
+    stack = np.random.default_rng(0).random((5, 30, 40)).astype(np.float32)
+    if kind == "stack":
+        return stack
+    if kind == "list":
+        return list(stack)
+    if kind == "uint8":
+        return list((stack * 255).astype(np.uint8))
+    return [stack[0], stack[1][:20], stack[2][:, :25]]
+
+
+@pytest.mark.parametrize("kind", ["stack", "list", "uint8", "ragged"])
+def test_batch_matches_numpy(kind):
+    maps = maps_as(kind)
+    metrics = calculate_perfusion_batch(maps, ROIS)
+    for i, lsci_map in enumerate(maps):
+        assert metrics["mean"][i] == pytest.approx(lsci_map.mean(dtype=np.float64))
+        assert metrics["std"][i] == pytest.approx(lsci_map.std(dtype=np.float64))
+        assert metrics["total"][i] == pytest.approx(lsci_map.sum(dtype=np.float64))
+        assert metrics["blue_mean"][i] == pytest.approx(lsci_map[3:10, 2:12].mean(dtype=np.float64))
+    assert metrics.dtype["total"] == (np.int64 if kind == "uint8" else np.float64)
+
+
+def test_empty_folder_writes_empty_metrics(tmp_path):
+    (tmp_path / "maps").mkdir()
+    output_folder = tmp_path / "output"
+    assert calculate_perfusion_batch([]).shape == (0,)
+    assert process_images_in_folder(str(tmp_path / "maps"), str(output_folder), plots=None) == {}
+    assert json.loads((output_folder / "perfusion_metrics.json").read_text()) == {}
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from recording_container import FRAME_METADATA_FIELDS, INVALID_TIMESTAMP, RecordingWriter, load_recording
+
+
+def write_recording(path, num_frames, **writer_args):
+    frames = np.random.default_rng(0).integers(0, 256, (num_frames, 6, 8), dtype=np.uint8)
+    with RecordingWriter(str(path), 6, 8, **writer_args) as writer:
+        for i, frame in enumerate(frames):
+            if writer.timestamp_fields == list(FRAME_METADATA_FIELDS):
+                writer.write_frame(frame, (i, 1000 * i, 10 ** 9 + i))
+            else:
+                writer.write_frame(frame, 10 ** 9 + i)
+    return frames
+
+
+def test_single_field_timestamps_are_a_column(tmp_path):
+    frames = write_recording(tmp_path / "host.lsci", 5)
+    loaded, timestamps, header = load_recording(str(tmp_path / "host.lsci"))
+    np.testing.assert_array_equal(loaded, frames)
+    assert header["timestamp_fields"] == ["host_time_ns"]
+    assert timestamps.shape == (5, 1) and timestamps.dtype == np.int64
+    np.testing.assert_array_equal(timestamps[:, 0], 10 ** 9 + np.arange(5))
+
+
+@pytest.mark.parametrize("expected_frames", [None, 1, 3, 100])
+def test_timestamp_table_grows_past_the_expected_frames(tmp_path, expected_frames):
+    path = tmp_path / "metadata.lsci"
+    write_recording(path, 7, timestamp_fields=FRAME_METADATA_FIELDS, expected_frames=expected_frames)
+    _, timestamps, _ = load_recording(str(path))
+    np.testing.assert_array_equal(timestamps, np.stack([np.arange(7), 1000 * np.arange(7), 10 ** 9 + np.arange(7)],
+                                                       axis=1))
+
+
+def test_empty_recording(tmp_path):
+    with RecordingWriter(str(tmp_path / "empty.lsci"), 6, 8, timestamp_fields=FRAME_METADATA_FIELDS) as writer:
+        assert writer.num_frames == 0
+    frames, timestamps, _ = load_recording(str(tmp_path / "empty.lsci"))
+    assert frames.shape == (0, 6, 8) and timestamps.shape == (0, 3)
+
+
+def test_default_timestamp_fills_every_column(tmp_path):
+    with RecordingWriter(str(tmp_path / "invalid.lsci"), 6, 8, timestamp_fields=FRAME_METADATA_FIELDS) as writer:
+        writer.write_frame(np.zeros((6, 8), dtype=np.uint8))
+    _, timestamps, _ = load_recording(str(tmp_path / "invalid.lsci"))
+    np.testing.assert_array_equal(timestamps, [[INVALID_TIMESTAMP] * 3])
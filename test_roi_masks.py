@@ -0,0 +1,91 @@
+import numpy as np
+import cv2
+import pytest
+
+from lsci_engine import EPSILON
+from roi_masks import calculate_label_contrast_series, load_roi_labels
+
+
+def label_mask():
+    mask = np.zeros((40, 50), dtype=np.uint8)
+    mask[5:15, 5:20] = 7
+    mask[20:35, 25:45] = 200
+    return mask
+
+
+def test_grayscale_png(tmp_path):
+    mask_path = str(tmp_path / "mask.png")
+    cv2.imwrite(mask_path, label_mask())
+    labels, names = load_roi_labels(mask_path)
+    assert names == ["roi_7", "roi_200"]
+    assert labels.shape == (40, 50)
+    assert np.bincount(labels.ravel()).tolist() == [40 * 50 - 150 - 300, 150, 300]
+
+
+def test_grayscale_mask_saved_as_colour_png(tmp_path):
+    mask_path = str(tmp_path / "mask.png")
+    cv2.imwrite(mask_path, cv2.cvtColor(label_mask(), cv2.COLOR_GRAY2BGR))
+    labels, names = load_roi_labels(mask_path)
+    assert names == ["roi_7", "roi_200"]
+    assert labels.shape == (40, 50)
+
+
+def test_colour_png_is_rejected(tmp_path):
+    mask = cv2.cvtColor(label_mask(), cv2.COLOR_GRAY2BGR)
+    mask[5:15, 5:20, 2] = 255
+    mask_path = str(tmp_path / "mask.png")
+    cv2.imwrite(mask_path, mask)
+    with pytest.raises(ValueError):
+        load_roi_labels(mask_path)
+
+
+def contrast_frames(num_frames=20, shape=(40, 50), seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (num_frames,) + shape, dtype=np.uint8)
+
+
+def masked_series(frames, labels, num_labels, window_size):
+    # Per-ROI statistics from boolean masks of the full-frame baseline K maps
+    half_window = window_size // 2
+    stack = frames.astype(np.float64)
+    rows = []
+    for t in range(half_window, len(frames) - half_window):
+        window = stack[t - half_window:t + half_window + 1]
+        K = np.std(window, axis=0) / (np.mean(window, axis=0) + EPSILON)
+        flow_index = 1 / np.maximum(K, EPSILON) ** 2
+        masks = [labels == label for label in range(1, num_labels + 1)]
+        rows.append([[K[mask].mean() for mask in masks], [np.median(K[mask]) for mask in masks],
+                     [flow_index[mask].mean() for mask in masks]])
+    rows = np.array(rows)
+    return rows[:, 0], rows[:, 1], rows[:, 2]
+
+
+def test_label_series_matches_boolean_masks():
+    labels = np.zeros((40, 50), dtype=np.int32)
+    labels[5:15, 5:20] = 1
+    cv2.circle(labels, (35, 25), 8, 2, thickness=-1)
+    labels[30:38, 2:9] = 3
+    frames = contrast_frames()
+
+    series = calculate_label_contrast_series(iter(frames), labels, ["a", "b", "c"], window_size=5, dtype=np.float64)
+    mean_k, median_k, flow_index = masked_series(frames, labels, 3, 5)
+    assert series["rois"] == ["a", "b", "c"]
+    np.testing.assert_allclose(series["mean_k"], mean_k, rtol=1e-6)
+    np.testing.assert_allclose(series["median_k"], median_k, rtol=1e-6)
+    np.testing.assert_allclose(series["flow_index"], flow_index, rtol=1e-5)
+    np.testing.assert_array_equal(series["timestamps"], np.arange(2, 18))
+
+
+def test_label_series_rejects_mismatched_labels():
+    frames = contrast_frames(8)
+    with pytest.raises(ValueError, match="no ROI pixels"):
+        calculate_label_contrast_series(frames, np.zeros((40, 50), dtype=np.int32), ["a"])
+
+    labels = np.zeros((40, 50), dtype=np.int32)
+    labels[5:15, 5:20] = 3
+    with pytest.raises(ValueError, match="1 ROI names"):
+        calculate_label_contrast_series(frames, labels, ["a"])
+
+    labels[5:15, 5:20] = 1
+    labels[20:30, 20:30] = 3
+    with pytest.raises(ValueError, match="without pixels"):
+        calculate_label_contrast_series(frames, labels, ["a", "b", "c"])
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from numpy.lib.stride_tricks import sliding_window_view
+
+from lsci_engine import EPSILON
+from spatial_lsci import (calculate_spatial_lsci, calculate_spatial_lsci_stack, calculate_spatiotemporal_lsci,
+                          iter_spatiotemporal_lsci_maps)
+
+
+def random_frames(num_frames, shape=(20, 26), seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (num_frames,) + shape, dtype=np.uint8)
+
+
+def direct_spatial_lsci(frame, kernel_size):
+    # np.std / np.mean over every N x N window; the border is mirrored like cv2.BORDER_REFLECT
+    padded = np.pad(frame.astype(np.float64), kernel_size // 2, mode="symmetric")
+    windows = sliding_window_view(padded, (kernel_size, kernel_size))
+    return windows.std(axis=(-2, -1)) / (windows.mean(axis=(-2, -1)) + EPSILON)
+
+
+@pytest.mark.parametrize("kernel_size", [3, 5, 7])
+def test_interior_matches_the_direct_window_statistics(kernel_size):
+    frame = random_frames(1)[0]
+    lsci_map = calculate_spatial_lsci(frame, kernel_size)
+    assert lsci_map.shape == frame.shape and lsci_map.dtype == np.float32
+
+    half = kernel_size // 2
+    windows = sliding_window_view(frame.astype(np.float64), (kernel_size, kernel_size))
+    interior = windows.std(axis=(-2, -1)) / (windows.mean(axis=(-2, -1)) + EPSILON)
+    np.testing.assert_allclose(lsci_map[half:-half, half:-half], interior, rtol=1e-4, atol=1e-5)
+
+
+@pytest.mark.parametrize("kernel_size", [3, 7])
+def test_border_is_mirrored(kernel_size):
+    frame = random_frames(1, seed=1)[0]
+    np.testing.assert_allclose(calculate_spatial_lsci(frame, kernel_size), direct_spatial_lsci(frame, kernel_size),
+                               rtol=1e-4, atol=1e-5)
+
+
+def test_stack_maps_and_average():
+    stack = random_frames(6, seed=2)
+    expected = np.array([direct_spatial_lsci(frame, 5) for frame in stack])
+    out = np.empty(stack.shape[1:], dtype=np.float32)
+    assert calculate_spatial_lsci(stack[0], 5, out=out) is out
+
+    lsci_maps = calculate_spatial_lsci_stack(stack, 5, average=False)
+    assert lsci_maps.shape == stack.shape and lsci_maps.dtype == np.float32
+    np.testing.assert_allclose(lsci_maps, expected, rtol=1e-4, atol=1e-5)
+    np.testing.assert_allclose(calculate_spatial_lsci_stack(stack, 5), expected.mean(axis=0), rtol=1e-4, atol=1e-5)
+
+
+def direct_spatiotemporal_lsci_maps(frames, kernel_size, window_size):
+    # np.std / np.mean over every N x N x W box of voxels, mirrored at the spatial border
+    half_window = window_size // 2
+    half = kernel_size // 2
+    padded = np.pad(frames.astype(np.float64), ((0, 0), (half, half), (half, half)), mode="symmetric")
+    maps = []
+    for t in range(half_window, len(frames) - half_window):
+        boxes = sliding_window_view(padded[t - half_window:t + half_window + 1], (kernel_size, kernel_size),
+                                    axis=(1, 2))
+        maps.append(boxes.std(axis=(0, -2, -1)) / (boxes.mean(axis=(0, -2, -1)) + EPSILON))
+    return np.array(maps)
+
+
+@pytest.mark.parametrize("kernel_size, window_size", [(3, 3), (5, 5), (3, 4), (1, 5)])
+def test_spatiotemporal_matches_brute_force(kernel_size, window_size):
+    frames = random_frames(12, seed=3)
+    expected = direct_spatiotemporal_lsci_maps(frames, kernel_size, window_size)
+    maps = np.array([K.copy() for K in iter_spatiotemporal_lsci_maps(iter(frames), kernel_size, window_size)])
+    assert maps.shape == expected.shape
+    np.testing.assert_allclose(maps, expected, rtol=1e-6, atol=1e-8)
+    np.testing.assert_allclose(calculate_spatiotemporal_lsci(frames, kernel_size, window_size), expected.mean(axis=0),
+                               rtol=1e-6, atol=1e-8)
+
+
+def test_spatiotemporal_shorter_than_the_window():
+    with pytest.raises(ValueError):
+        calculate_spatiotemporal_lsci(random_frames(4), 5, 5)